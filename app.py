@@ -1,12 +1,76 @@
 # Importing packages
+import json
+import numpy as np
 import pandas as pd
+from src.exception import CustomException
 from src.components.create_custom_data import CreateCustomData
+from src.components.create_custom_data import CreateBatchData
 from src.components.make_predictions import MakePredictions
-from flask import Flask, request, render_template, jsonify
+from src.components.config_entity import BatchPredictionConfig
+from src.components.config_entity import MicroBatchConfig
+from src.components.config_entity import PredictionCacheConfig
+from src.components.micro_batch import get_micro_batch_predictor
+from src.components.prediction_cache import get_prediction_cache
+from src.components.forecast import ForecastGenerator
+from src.components.metrics import registry as metrics_registry
+from src.components.metrics import CACHE_REQUESTS
+from src.components.metrics import record_stage
+from src.components.metrics import start_request
+from src.components.metrics import finish_request
+from src.lag_features import get_segment_history
+from flask import Flask, Response, g, request, render_template, jsonify
 
 # Creating the Flask app
 app = Flask(__name__)
 
+# Reading the configuration for the batch prediction endpoint, and for the
+# micro-batching and the cache of the prediction API
+batch_config = BatchPredictionConfig()
+micro_batch_config = MicroBatchConfig()
+prediction_cache_config = PredictionCacheConfig()
+
+# Starting the trace of every request
+@app.before_request
+def start_request_metrics():
+    '''
+    This function starts the trace in which the latency of the stages of the request
+    is recorded.
+    '''
+    start_request()
+
+# Keeping the status of every response for the metrics
+@app.after_request
+def keep_response_status(response):
+    '''
+    This function keeps the status of the response, which is recorded with the latency
+    of the request once the request ends.
+    '''
+    g.response_status = response.status_code
+    return response
+
+# Recording the latency of every request, also of the requests which fail
+@app.teardown_request
+def finish_request_metrics(error=None):
+    '''
+    This function records the latency of the request and of its stages under the route
+    of the request, and counts the request as an error if it raised an exception or
+    returned an error status.
+    '''
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    status = 500 if error is not None else g.get('response_status', 500)
+    finish_request(route, request.method, status, type(error).__name__ if error is not None else None)
+
+# Copying the hits and misses of the prediction cache into the metrics
+@metrics_registry.add_collector
+def collect_prediction_cache_metrics():
+    '''
+    This function copies the number of hits and misses of the prediction cache of this
+    process into the cache metrics.
+    '''
+    cache = get_prediction_cache()
+    CACHE_REQUESTS.set(cache.hits, 'prediction_cache', 'hit')
+    CACHE_REQUESTS.set(cache.misses, 'prediction_cache', 'miss')
+
 # Creating the home page
 @app.route('/')
 def index():
@@ -27,22 +91,24 @@ def predict_datapoint():
         return render_template('predict.html')
     # If the method is "POST", then run the prediction
     elif request.method == 'POST':
-        # Capturing the data entered by the user on the web app
-        data = CreateCustomData(
-            x = int(request.form.get('x')),
-            y = int(request.form.get('y')),
-            direction = str(request.form.get('direction'))
-        )
-        
-        # Creating a dataframe from the user entered data
-        df = data.create_dataframe()
+        with record_stage('parse'):
+            # Capturing the data entered by the user on the web app
+            data = CreateCustomData(
+                x = int(request.form.get('x')),
+                y = int(request.form.get('y')),
+                direction = str(request.form.get('direction'))
+            )
+            
+            # Creating a dataframe from the user entered data
+            df = data.create_dataframe()
         
         # Instantiating the prediction class and making the prediction
         prediction = MakePredictions()
         preds = prediction.predict(df)
         
         # Returning the prediction to the web app
-        return render_template('predict.html', results=preds, pred_df=df)
+        with record_stage('serialize'):
+            return render_template('predict.html', results=preds, pred_df=df)
 
 # Creating a function to return the prediction as an API call
 @app.route('/api/predict', methods=['POST'])
@@ -58,26 +124,174 @@ def fetch_prediction_api():
     ===================================================================================
     '''
     if request.method == 'POST':
-        # Capturing the data entered by the user on the web app
-        data = CreateCustomData(
-            x = int(request.form.get('x')),
-            y = int(request.form.get('y')),
+        with record_stage('parse'):
+            x = int(request.form.get('x'))
+            y = int(request.form.get('y'))
             direction = str(request.form.get('direction'))
-        )
         
-        # Creating a dataframe from the user entered data
-        df = data.create_dataframe()
-        
-        # Instantiating the prediction class and making the prediction
+        # Looking up the prediction in the precomputed prediction table, and
+        # falling back to the live model for segments that are not in the table
         prediction = MakePredictions()
-        preds = prediction.predict(df)
-        
+        with record_stage('lookup'):
+            preds = prediction.lookup_prediction(x, y, direction)
+        CACHE_REQUESTS.inc('prediction_table', 'miss' if preds is None else 'hit')
+        if preds is None:
+            def compute():
+                if micro_batch_config.enabled:
+                    # Scoring the request in a batch with the concurrent requests. The
+                    # features are built and scored by the thread of the micro-batcher.
+                    with record_stage('predict'):
+                        return [get_micro_batch_predictor().predict(x, y, direction)]
+                # Making the prediction directly from the data entered by the user,
+                # without creating a dataframe
+                return prediction.predict_single(x=x, y=y, direction=direction)
+            
+            # Serving the prediction from the prediction cache, unless the model uses
+            # lag features, whose values change within the hour
+            bundle, plan = prediction.load_inference_plan()
+            if prediction_cache_config.enabled and not plan.lag_features:
+                preds = get_prediction_cache().get_or_compute(bundle.cache_key, x, y, direction, compute)
+            else:
+                preds = compute()
+
         # Creating a dictionary for the preds
-        preds_dict = {
-            'prediction': preds
-        }
-        
-        return jsonify(preds_dict)
+        with record_stage('serialize'):
+            preds_dict = {
+                'prediction': np.asarray(preds, dtype=float).tolist()
+            }
+            
+            return jsonify(preds_dict)
+    
+# Creating a function to return the forecast of every segment as an API call
+@app.route('/api/forecast', methods=['GET'])
+def fetch_forecast_api():
+    '''
+    This function returns the forecast of every roadway segment for every 20-minute time
+    slot of the day given by the "date" query parameter (YYYY-MM-DD), or of the next 24
+    hours if no date is given. Repeated queries are served from the forecast cache.
+    ==================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    forecast : json - The slot times and the predictions of each segment.
+    ===================================================================================
+    '''
+    date = request.args.get('date')
+    generator = ForecastGenerator()
+    try:
+        forecast = generator.forecast_day(date) if date else generator.forecast_next()
+    except CustomException as e:
+        return jsonify({'error': str(e.args[0])}), 400
+    
+    return jsonify(forecast.to_dict())
+
+# Creating a function to record the observed congestion of roadway segments
+@app.route('/api/observe', methods=['POST'])
+def record_observation_api():
+    '''
+    This function records the congestion observed for roadway segments in the segment
+    history, which is kept by this process or shared in redis, and from which the lag
+    and rolling mean features are read when the model uses them. It takes the "x", "y", "direction", "congestion" and an optional
+    "time" of one observation as form fields, or a JSON list of such records.
+    ==================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    observed : json - The number of observations recorded.
+    ===================================================================================
+    '''
+    # Reading the observations from the request body or the form fields
+    payload = request.get_json(silent=True)
+    records = payload if payload is not None else [request.form.to_dict()]
+    records = [records] if isinstance(records, dict) else records
+    try:
+        df = pd.DataFrame(records, columns=['time', 'x', 'y', 'direction', 'congestion'])
+        df['time'] = pd.to_datetime(df['time']).fillna(pd.Timestamp.now())
+        df = df.astype({'x': int, 'y': int, 'direction': str, 'congestion': float})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid observations: {e}'}), 400
+    
+    # Recording the observations in the segment history
+    observed = get_segment_history().update(df)
+    
+    return jsonify({'observed': observed})
+
+# Creating a function to return the batch sizes achieved by the micro-batching
+@app.route('/api/predict/batching', methods=['GET'])
+def fetch_micro_batch_metrics():
+    '''
+    This function returns the number of micro-batches scored by this process, and the
+    distribution of their sizes.
+    '''
+    return jsonify({'enabled': micro_batch_config.enabled, **get_micro_batch_predictor().get_metrics()})
+
+# Creating a function to return the hits and misses of the prediction cache
+@app.route('/api/predict/cache', methods=['GET'])
+def fetch_prediction_cache_metrics():
+    '''
+    This function returns the number of hits and misses of the prediction cache of this
+    process, and its number of entries.
+    '''
+    return jsonify({'enabled': prediction_cache_config.enabled, **get_prediction_cache().get_metrics()})
+
+# Creating a function to return the metrics of the web app
+@app.route('/metrics', methods=['GET'])
+def fetch_metrics():
+    '''
+    This function returns the latency histograms of the requests and of their stages,
+    the errors, the hits of the prediction caches and the model version, in the
+    Prometheus text format. Under gunicorn, the metrics of every worker are combined.
+    '''
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Creating a function to return the predictions for a batch of records as an API call
+@app.route('/api/predict/batch', methods=['POST'])
+def fetch_batch_prediction_api():
+    '''
+    This function takes a JSON list of records, each with an "x", "y", "direction" and an
+    optional "time", and returns the predictions in the same order as the records. All the
+    records are transformed and scored as a single dataframe. Large responses are streamed
+    in chunks.
+    ==================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    predictions : json - This is the list of predictions in a JSON format.
+    ===================================================================================
+    '''
+    # Reading the records from the request body. Both a plain list and an object
+    # with a "records" key are accepted.
+    payload = request.get_json(silent=True)
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    
+    # Rejecting batches that are too large
+    if isinstance(records, list) and len(records) > batch_config.max_batch_size:
+        return jsonify({'error': f'A batch can contain at most {batch_config.max_batch_size} records.'}), 413
+    
+    # Creating a single dataframe from the records
+    try:
+        df = CreateBatchData(records).create_dataframe()
+    except CustomException as e:
+        return jsonify({'error': str(e.args[0])}), 400
+    
+    # Making the predictions for all the records at once
+    prediction = MakePredictions()
+    preds = np.asarray(prediction.predict(df), dtype=float).ravel()
+    
+    # Returning small batches in a single response
+    if len(preds) <= batch_config.stream_chunk_size:
+        return jsonify({'predictions': preds.tolist()})
+    
+    # Streaming large batches in chunks
+    def generate_chunks():
+        yield '{"predictions": ['
+        for start in range(0, len(preds), batch_config.stream_chunk_size):
+            chunk = preds[start:start + batch_config.stream_chunk_size].tolist()
+            separator = ', ' if start > 0 else ''
+            yield separator + json.dumps(chunk)[1:-1]
+        yield ']}'
+    
+    return Response(generate_chunks(), mimetype='application/json')
     
 # Running the Flask app
 if __name__ == '__main__':
@@ -85,5 +299,3 @@ if __name__ == '__main__':
         app.run(debug=True)
     except Exception as e:
         print(f"Failed to run the Flask app: {e}")
-    
-    
\ No newline at end of file
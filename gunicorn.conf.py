@@ -0,0 +1,145 @@
+# Importing packages
+import os
+import gc
+import time
+import signal
+import tempfile
+import threading
+from src.logger import logging
+from src.components.config_entity import ServingConfig
+from src.components.make_predictions import MakePredictions
+from src.components.metrics import registry as metrics_registry
+from src.components.metrics import start_snapshot_thread
+from src.lag_features import check_segment_history
+
+# Reading the configuration of the production web server
+serving_config = ServingConfig()
+
+# Setting the address, the number of workers and threads, and the timeouts
+bind = serving_config.bind
+workers = serving_config.workers
+threads = serving_config.threads
+timeout = serving_config.timeout
+graceful_timeout = serving_config.graceful_timeout
+
+# Refusing to start several workers which would each keep their own segment history
+check_segment_history(workers)
+
+# Combining the metrics of the workers in a folder of snapshots, which defaults to a
+# temporary folder of the master process
+if not metrics_registry.multiprocess_dir:
+    metrics_registry.multiprocess_dir = os.path.join(tempfile.gettempdir(), f'congestion_metrics_{os.getpid()}')
+
+# Loading the application in the master process before the workers are forked, so that
+# the workers share the memory of the preprocessor object and the model copy-on-write
+preload_app = True
+
+
+# Creating a function to load the model in the master process
+def load_model():
+    '''
+    This function loads the preprocessor object, the model and the inference plan into
+    the process-wide model cache, and returns the cache key of the loaded model. The
+    objects are then moved to the permanent generation of the garbage collector, so
+    that the collections run by the workers do not write to the shared memory pages.
+    It is called once per model, before the workers which serve it are forked.
+    '''
+    bundle, _ = MakePredictions().load_inference_plan()
+    gc.freeze()
+    return bundle.cache_key
+
+
+# Creating a function to read the cache key of the model on disk
+def read_cache_key():
+    '''
+    This function returns the cache key of the model and preprocessor object which the
+    run parameters point at, without loading them.
+    '''
+    model_cache = MakePredictions.model_cache
+    return model_cache.get_cache_key(model_cache.read_run_params())
+
+
+# Creating a function to reload the workers when the model changes
+def watch_model(server, cache_key):
+    '''
+    This function runs in a background thread of the master process. It checks the run
+    parameters and the preprocessor object at a regular interval, without loading them,
+    and only when they point at a new model, it loads the new model in the master
+    process and sends a SIGHUP to the master, which gracefully replaces the workers
+    with new workers forked from the updated master.
+    '''
+    while True:
+        time.sleep(serving_config.reload_check_interval)
+        try:
+            if read_cache_key() == cache_key:
+                continue
+            new_cache_key = load_model()
+        except Exception as e:
+            server.log.error(f'Failed to reload the model: {e}')
+            continue
+        if new_cache_key != cache_key:
+            server.log.info('The model changed. Reloading the workers.')
+            logging.info(f'Model changed to {new_cache_key}. Reloading the workers.')
+            cache_key = new_cache_key
+            os.kill(os.getpid(), signal.SIGHUP)
+
+
+# Creating a server hook which removes the snapshots of the metrics of earlier runs
+def on_starting(server):
+    '''
+    This hook runs in the master process before the workers are forked. It removes the
+    snapshots of the metrics left by an earlier run of the server.
+    '''
+    metrics_registry.clear_snapshots()
+
+
+# Creating a server hook which starts writing the snapshots of the metrics of a worker
+def post_fork(server, worker):
+    '''
+    This hook runs in each worker after it is forked. It starts the thread which writes
+    the snapshots of the metrics of the worker.
+    '''
+    start_snapshot_thread()
+
+
+# Creating a server hook which writes the last snapshot of the metrics of a worker
+def worker_exit(server, worker):
+    '''
+    This hook runs in each worker when it exits. It writes the last snapshot of the
+    metrics of the worker, so that the requests since the previous snapshot are kept.
+    '''
+    try:
+        metrics_registry.write_snapshot()
+    except Exception as e:
+        server.log.error(f'Failed to write the snapshot of the metrics: {e}')
+
+
+# Creating a server hook which folds the metrics of an exited worker
+def child_exit(server, worker):
+    '''
+    This hook runs in the master process when a worker has exited. It folds the
+    counters and histograms of the worker into the snapshot of the exited workers and
+    drops its gauges.
+    '''
+    try:
+        metrics_registry.mark_process_dead(worker.pid)
+    except Exception as e:
+        server.log.error(f'Failed to fold the metrics of worker {worker.pid}: {e}')
+
+
+# Creating a server hook which loads the model before the workers are forked
+def when_ready(server):
+    '''
+    This hook runs in the master process once the server is ready, before the workers
+    are forked. It loads the model, checks that the workers share the segment history if
+    the model uses the lag features, and starts the thread which watches for a new model.
+    '''
+    try:
+        cache_key = load_model()
+        server.log.info(f'Model preloaded in the master process: {cache_key}')
+    except Exception as e:
+        cache_key = None
+        server.log.error(f'Failed to preload the model, the workers will load it: {e}')
+    else:
+        check_segment_history(workers, MakePredictions().load_inference_plan()[1].lag_features)
+    threading.Thread(target=watch_model, args=(server, cache_key), daemon=True).start()
@@ -1,7 +1,3 @@
-# Importing comman packages for the module
-import os
-import pandas as pd
-import pytest
-import sklearn
-from sklearn import set_config
-set_config(transform_output='pandas')
\ No newline at end of file
+# The package does not import its dependencies, so that importing a single module, such
+# as the serving path of the web app, only loads the packages that module needs. The
+# modules which use sklearn set its pandas output themselves.
@@ -0,0 +1,169 @@
+# Importing packages
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime, timedelta
+from src.components.make_predictions import MakePredictions
+from src.components.model_store import LocalModelStore
+from src.components.native_booster import NativeBoosterModel
+
+# Creating a function to build feature vectors for random requests
+def create_features(plan, n_rows, seed=42):
+    '''
+    This function builds the feature vectors of random requests for the segments of an
+    inference plan, at random times of a week, as a (n_rows, n_features) float32 array.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    plan : InferencePlan - The inference plan of the model.
+    n_rows : int - The number of feature vectors.
+    seed : int - The seed used to draw the segments and times.
+
+    ---------------------
+    Returns:
+    ---------------------
+    features : np.ndarray - The feature vectors.
+    ========================================================================================
+    '''
+    rng = np.random.default_rng(seed)
+    segments = sorted(plan.segment_means)
+    start_time = datetime(2024, 1, 1)
+    rows = []
+    for index in rng.integers(len(segments), size=n_rows):
+        x, y, direction = segments[index].split('_')
+        request_time = start_time + timedelta(minutes=int(rng.integers(7 * 24 * 60)))
+        rows.append(plan.build_features(int(x), int(y), direction, request_time)[0])
+    return np.array(rows, dtype=np.float32)
+
+# Creating a function to load the model with each inference backend
+def load_backends(model_path=None, model_sha256=None):
+    '''
+    This function loads the latest model of the local model store with each inference
+    backend. The pyfunc model is saved with the xgboost flavor of mlflow into a temporary
+    folder and loaded back, which is how the training pipeline logs it to the registry.
+    ========================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    backends : dict - The models, keyed by "pyfunc", "sklearn" and "native".
+    ========================================================================================
+    '''
+    import mlflow.pyfunc
+    import mlflow.xgboost
+    model_store = LocalModelStore()
+    model = model_store.load_model(model_path, model_sha256)
+    model_dir = tempfile.mkdtemp()
+    mlflow.xgboost.save_model(model, f'{model_dir}/model')
+    return {
+        'pyfunc': mlflow.pyfunc.load_model(f'{model_dir}/model'),
+        'sklearn': model,
+        'native': model_store.load_booster(model_path, model_sha256)
+    }
+
+# Creating a function to time the predictions of one backend
+def time_backend(model, features, n_single, batch_size, repeat):
+    '''
+    This function times the predictions of a model for single feature vectors, as made
+    by the prediction API, and for batches of feature vectors.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    model : object - The model, with a predict method.
+    features : np.ndarray - The feature vectors.
+    n_single : int - The number of single feature vectors to time.
+    batch_size : int - The number of feature vectors in a batch.
+    repeat : int - The number of times the batch is timed.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The p50 and p99 latencies of a single prediction in microseconds, and
+    the median latency of a batch in milliseconds.
+    ========================================================================================
+    '''
+    # Warming up the model
+    model.predict(features[:1])
+
+    single_latencies = []
+    for row in range(n_single):
+        start_time = time.perf_counter()
+        model.predict(features[row % len(features)][None, :])
+        single_latencies.append(time.perf_counter() - start_time)
+
+    batch = np.resize(features, (batch_size, features.shape[1]))
+    batch_latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        model.predict(batch)
+        batch_latencies.append(time.perf_counter() - start_time)
+
+    single_latencies = np.array(single_latencies) * 1e6
+    return {
+        'single_p50_us': round(float(np.percentile(single_latencies, 50)), 1),
+        'single_p99_us': round(float(np.percentile(single_latencies, 99)), 1),
+        'batch_ms': round(float(np.median(batch_latencies)) * 1000, 2)
+    }
+
+# Creating a function to compare the inference backends
+def run_benchmark(n_rows=2000, n_single=2000, batch_size=100000, repeat=5, tolerance=1e-4):
+    '''
+    This function compares the latency of the inference backends on the feature vectors
+    of the cached model, and checks that they make the same predictions.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    n_rows : int - The number of distinct feature vectors.
+    n_single : int - The number of single feature vectors to time.
+    batch_size : int - The number of feature vectors in a batch.
+    repeat : int - The number of times the batch is timed.
+    tolerance : float - The largest absolute difference allowed between the predictions
+    of the backends.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The latencies of each backend and the largest difference between the
+    predictions of each backend and the pyfunc model.
+    ========================================================================================
+    '''
+    _, plan = MakePredictions().load_inference_plan()
+    features = create_features(plan, n_rows)
+    backends = load_backends()
+
+    # Checking that the backends make the same predictions
+    expected = np.asarray(backends['pyfunc'].predict(features), dtype=np.float64).ravel()
+    parity = {}
+    for name, model in backends.items():
+        actual = np.asarray(model.predict(features), dtype=np.float64).ravel()
+        parity[name] = float(np.max(np.abs(actual - expected)))
+    if max(parity.values()) > tolerance:
+        raise AssertionError(f'The backends do not make the same predictions: {parity}.')
+
+    return {
+        'rows': n_rows,
+        'batch_size': batch_size,
+        'max_abs_difference': parity,
+        'latency': {
+            name: time_backend(model, features, n_single, batch_size, repeat)
+            for name, model in backends.items()
+        }
+    }
+
+# Running the benchmark
+if __name__ == '__main__':
+
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Compare the latency of the inference backends.')
+    parser.add_argument('--rows', type=int, default=2000, help='The number of distinct feature vectors.')
+    parser.add_argument('--single', type=int, default=2000, help='The number of single predictions timed.')
+    parser.add_argument('--batch-size', type=int, default=100000, help='The number of rows in a batch.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of times each batch is timed.')
+    args = parser.parse_args()
+
+    # Running the benchmark and printing the report
+    print(json.dumps(run_benchmark(args.rows, args.single, args.batch_size, args.repeat), indent=2))
@@ -0,0 +1,115 @@
+# Importing packages
+import json
+import time
+import random
+import argparse
+import http.client
+import numpy as np
+from urllib.parse import urlparse, urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+# Defining the roadway directions the requests are drawn from
+DIRECTIONS = ['EB', 'NB', 'SB', 'WB', 'NE', 'SW', 'NW', 'SE']
+
+# Creating a function to send the requests of one client
+def run_client(url, n_requests, seed):
+    '''
+    This function sends requests to the prediction API over a single keep-alive
+    connection, and returns the latency of each request in seconds and the number of
+    failed requests.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    url : str - The url of the prediction API.
+    n_requests : int - The number of requests to send.
+    seed : int - The seed used to draw the roadway segments.
+
+    ---------------------
+    Returns:
+    ---------------------
+    latencies : list - The latency of each successful request in seconds.
+    errors : int - The number of failed requests.
+    ========================================================================================
+    '''
+    parsed_url = urlparse(url)
+    rng = random.Random(seed)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port or 80, timeout=30)
+    latencies = []
+    errors = 0
+    for _ in range(n_requests):
+        body = urlencode({'x': rng.randint(0, 2), 'y': rng.randint(0, 3), 'direction': rng.choice(DIRECTIONS)})
+        start_time = time.perf_counter()
+        try:
+            connection.request('POST', parsed_url.path or '/', body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - start_time)
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(parsed_url.hostname, parsed_url.port or 80, timeout=30)
+    connection.close()
+    return latencies, errors
+
+# Creating a function to run the load test
+def run_load_test(url, concurrency, n_requests):
+    '''
+    This function sends requests to the prediction API from concurrent clients and
+    reports the throughput and the latency percentiles.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    url : str - The url of the prediction API.
+    concurrency : int - The number of concurrent clients.
+    n_requests : int - The total number of requests.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The requests per second and the p50, p90 and p99 latencies in
+    milliseconds.
+    ========================================================================================
+    '''
+    requests_per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run_client, [url] * concurrency, requests_per_client, range(concurrency)))
+    wall_time = time.perf_counter() - start_time
+
+    latencies = np.array([latency for client_latencies, _ in results for latency in client_latencies]) * 1000
+    errors = sum(client_errors for _, client_errors in results)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': int(len(latencies)),
+        'errors': int(errors),
+        'wall_time_s': round(wall_time, 3),
+        'requests_per_second': round(len(latencies) / wall_time, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+        'p90_ms': round(float(np.percentile(latencies, 90)), 2) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None
+    }
+
+# Running the load test
+if __name__ == '__main__':
+
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Load test the prediction API.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/predict', help='The url of the prediction API.')
+    parser.add_argument('--concurrency', type=int, default=16, help='The number of concurrent clients.')
+    parser.add_argument('--requests', type=int, default=2000, help='The total number of requests.')
+    parser.add_argument('--warmup', type=int, default=50, help='The number of requests sent before measuring.')
+    args = parser.parse_args()
+
+    # Warming up the server, so that the model is loaded in every worker
+    if args.warmup > 0:
+        run_load_test(args.url, min(args.concurrency, args.warmup), args.warmup)
+
+    # Running the load test and printing the report
+    print(json.dumps(run_load_test(args.url, args.concurrency, args.requests), indent=2))
@@ -0,0 +1,118 @@
+# Importing packages
+import sys
+import json
+import argparse
+import subprocess
+
+# Defining the script run in a fresh interpreter to time the first prediction. The
+# prediction is made through the prediction API of the web app, so that the time
+# includes loading the model and compiling the inference plan.
+FIRST_PREDICTION_SCRIPT = '''
+import json
+import time
+start_time = time.perf_counter()
+import app
+import_time = time.perf_counter() - start_time
+response = app.app.test_client().post('/api/predict', data={'x': 1, 'y': 2, 'direction': 'NB'})
+first_prediction_time = time.perf_counter() - start_time
+print(json.dumps({
+    'status': response.status_code,
+    'import_s': import_time,
+    'first_prediction_s': first_prediction_time
+}))
+'''
+
+# Creating a function to time the import of every module loaded by a module
+def measure_import_times(module='app', top=15):
+    '''
+    This function imports a module in a fresh interpreter with the importtime option of
+    Python, and returns the modules with the longest cumulative import times.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    module : str - The module to import.
+    top : int - The number of modules to report.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The total import time of the module in milliseconds, the number of
+    modules it loaded, and the self and cumulative import times of the slowest modules.
+    ========================================================================================
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True
+    )
+
+    # Parsing the "import time: self | cumulative | module" lines of the output
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': name.strip(),
+            'self_ms': round(int(self_us) / 1000, 1),
+            'cumulative_ms': round(int(cumulative_us) / 1000, 1)
+        })
+    total_ms = next((entry['cumulative_ms'] for entry in modules if entry['module'] == module), None)
+    return {
+        'module': module,
+        'total_ms': total_ms,
+        'modules_loaded': len(modules),
+        'slowest_modules': sorted(modules, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top]
+    }
+
+# Creating a function to time the first prediction of a fresh process
+def measure_first_prediction(repeat=3):
+    '''
+    This function starts fresh interpreters which import the web app and make one
+    prediction, and reports the median import time and time to first prediction. The
+    model, run parameters and artifacts are read from the current working directory.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    repeat : int - The number of interpreters to start.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The median time to import the web app and the median time from the
+    start of the import to the first prediction, in seconds.
+    ========================================================================================
+    '''
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', FIRST_PREDICTION_SCRIPT], capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    if any(run['status'] != 200 for run in runs):
+        raise RuntimeError('The prediction API did not return a prediction.')
+    import_times = sorted(run['import_s'] for run in runs)
+    first_prediction_times = sorted(run['first_prediction_s'] for run in runs)
+    return {
+        'runs': repeat,
+        'import_s': round(import_times[len(runs) // 2], 3),
+        'first_prediction_s': round(first_prediction_times[len(runs) // 2], 3)
+    }
+
+# Running the startup benchmark
+if __name__ == '__main__':
+
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Measure the startup time of the web app.')
+    parser.add_argument('--module', default='app', help='The module whose imports are timed.')
+    parser.add_argument('--top', type=int, default=15, help='The number of slowest modules to report.')
+    parser.add_argument('--repeat', type=int, default=3, help='The number of fresh processes timed.')
+    parser.add_argument('--skip-prediction', action='store_true', help='Only time the imports.')
+    args = parser.parse_args()
+
+    # Timing the imports and the first prediction, and printing the report
+    report = {'imports': measure_import_times(args.module, args.top)}
+    if not args.skip_prediction:
+        report['first_prediction'] = measure_first_prediction(args.repeat)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,377 @@
+# Importing packages
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime
+
+# Adding the root of the repository to the path, since the suite runs each dataset in
+# its own working directory
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.benchmarks.synthetic_data import DIRECTIONS
+from src.benchmarks.synthetic_data import generate_congestion_data
+from src.components.config_entity import BenchmarkConfig
+from src.components.config_entity import DataIngestionConfig
+from src.components.config_entity import StoreFeatureConfig
+from src.components.config_entity import StreamingConfig
+
+# Defining the hyperparameters searched by the training benchmark
+SEARCH_PARAMS = {'learning_rate': [0.1], 'n_estimators': [50], 'max_depth': [3, 5]}
+
+# Creating a function to read the peak memory of the process
+def get_peak_rss_mb():
+    '''
+    This function returns the peak resident memory of the process in megabytes.
+    '''
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+
+# Creating a context manager to time a stage of the benchmark
+@contextmanager
+def measure(results, stage):
+    '''
+    This context manager records the wall time and the CPU time of a stage, and the peak
+    memory of the process once the stage is done, under the name of the stage. Extra
+    measurements can be added to the dictionary it yields.
+    '''
+    result = {}
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    yield result
+    result['seconds'] = round(time.perf_counter() - start_time, 4)
+    result['cpu_seconds'] = round(time.process_time() - start_cpu, 4)
+    result['peak_rss_mb'] = round(get_peak_rss_mb(), 1)
+    results[stage] = result
+
+# Creating a function to summarize latencies
+def summarize_latencies(latencies):
+    '''
+    This function returns the p50 and p99 of latencies given in seconds, in milliseconds.
+    '''
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'requests': int(len(latencies)),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3)
+    }
+
+# Creating a function to write a synthetic dataset into a working directory
+def prepare_workspace(n_rows, test_size=0.3):
+    '''
+    This function generates a synthetic dataset, splits it into the train and test
+    datasets of the data ingestion, and writes them into the artifacts folder of the
+    current working directory, along with the folders of the model store and the run
+    parameters.
+    '''
+    data_ingestion_config = DataIngestionConfig()
+    os.makedirs(os.path.dirname(data_ingestion_config.train_data_path), exist_ok=True)
+    os.makedirs('run_config', exist_ok=True)
+    df = generate_congestion_data(n_rows)
+    n_test = int(n_rows * test_size)
+    df.iloc[n_test:].to_parquet(data_ingestion_config.train_data_path, index=False)
+    df.iloc[:n_test].to_parquet(data_ingestion_config.test_data_path, index=False)
+
+# Creating a function to time the feature pipeline
+def run_feature_stages(results, n_rows, benchmark_config):
+    '''
+    This function times the feature engineering of the train data, the data
+    transformation and the creation of the feature store. Above "streaming_above" rows,
+    the streaming data transformation is used, in which the train and test data are
+    transformed while the feature store is written.
+    '''
+    from src.components.data_transformation import DataTransformation
+    from src.components.store_features import FeatureStoreCreation
+    data_ingestion_config = DataIngestionConfig()
+    streaming = n_rows > benchmark_config.streaming_above
+
+    # Timing the feature engineering on the train data, one batch at a time when the
+    # data does not fit in memory
+    data_transformation = DataTransformation()
+    with measure(results, 'generate_features') as result:
+        if streaming:
+            result['rows'] = sum(
+                len(data_transformation.generate_features(batch_df))
+                for batch_df in data_transformation.read_batches(data_ingestion_config.train_data_path)
+            )
+        else:
+            train_df = pd.read_parquet(data_ingestion_config.train_data_path)
+            result['rows'] = len(data_transformation.generate_features(train_df))
+            del train_df
+
+    # Timing the data transformation and the creation of the feature store
+    data_transformation = DataTransformation()
+    feature_store = FeatureStoreCreation()
+    with measure(results, 'initiate_data_transformation') as result:
+        result['mode'] = 'streaming' if streaming else 'in_memory'
+        if streaming:
+            train_set, test_set = data_transformation.initiate_streaming_data_transformation(
+                data_ingestion_config.train_data_path, data_ingestion_config.test_data_path
+            )
+        else:
+            train_set, test_set = data_transformation.initiate_data_transformation(
+                data_ingestion_config.train_data_path, data_ingestion_config.test_data_path
+            )
+    with measure(results, 'create_feature_store') as result:
+        result['mode'] = 'streaming' if streaming else 'in_memory'
+        if streaming:
+            feature_store.create_streaming_feature_store(train_set, test_set)
+        else:
+            feature_store.create_feature_store(train_set, test_set)
+
+# Creating a function to time the hyperparameter search
+def run_training_stage(results, benchmark_config):
+    '''
+    This function times the hyperparameter search on a random sample of at most
+    "search_rows" rows of the transformed train data, sorted by time, and saves the best
+    model into the local model store, with the run parameters that the serving path
+    reads.
+    '''
+    import pyarrow.dataset as ds
+    from xgboost import XGBRegressor
+    from src.run_utils import save_run_params
+    from src.components.find_best_model import FindBestModel
+    from src.components.time_split import TimeSplit
+    from src.components.model_store import LocalModelStore
+    feature_store_config = StoreFeatureConfig()
+
+    # Sampling the rows of the search from the feature store
+    dataset = ds.dataset(feature_store_config.xform_train_path, format='parquet', partitioning='hive')
+    n_rows = dataset.count_rows()
+    rng = np.random.default_rng(42)
+    indices = np.sort(rng.choice(n_rows, size=min(n_rows, benchmark_config.search_rows), replace=False))
+    train_df = dataset.take(indices).to_pandas()
+    if 'time' in train_df.columns:
+        train_df = TimeSplit().sort_by_time(train_df)
+    key_columns = ['congestion'] + feature_store_config.key_columns
+    X_train = train_df.drop(labels=key_columns, axis=1, errors='ignore')
+    y_train = train_df['congestion']
+
+    # Timing the search
+    estimator = XGBRegressor(objective='reg:squarederror', random_state=42, n_jobs=1)
+    with measure(results, 'find_best_model') as result:
+        result['rows'] = len(X_train)
+        result['candidates'] = int(np.prod([len(values) for values in SEARCH_PARAMS.values()]))
+        best_model, _ = FindBestModel().find_best_model(
+            estimator=estimator, params=SEARCH_PARAMS, train_set=X_train, target_set=y_train, cv=3, n_jobs=1
+        )
+
+    # Saving the best model for the serving benchmarks
+    manifest = LocalModelStore().save_model(best_model, {'model_uri': 'benchmark'})
+    save_run_params(manifest)
+
+# Creating a function to time the predictions and the Flask endpoints
+def run_serving_stages(results, benchmark_config):
+    '''
+    This function times single and batch predictions made with MakePredictions, and
+    requests to the prediction, batch prediction and forecast endpoints of the web app,
+    through the Flask test client.
+    '''
+    import app
+    from src.components.make_predictions import MakePredictions
+    MakePredictions.model_cache.clear()
+    prediction = MakePredictions()
+    rng = np.random.default_rng(7)
+    records = [
+        {'x': int(rng.integers(3)), 'y': int(rng.integers(4)), 'direction': DIRECTIONS[rng.integers(len(DIRECTIONS))]}
+        for _ in range(max(benchmark_config.n_requests, benchmark_config.batch_rows))
+    ]
+
+    # Timing the first prediction, which loads the model
+    with measure(results, 'load_model') as result:
+        prediction.predict_single(**records[0])
+
+    # Timing single predictions made without and with a dataframe
+    with measure(results, 'predict_single') as result:
+        latencies = []
+        for record in records[:benchmark_config.n_requests]:
+            start_time = time.perf_counter()
+            prediction.predict_single(**record)
+            latencies.append(time.perf_counter() - start_time)
+        result.update(summarize_latencies(latencies))
+    with measure(results, 'predict') as result:
+        latencies = []
+        for record in records[:benchmark_config.n_requests]:
+            df = pd.DataFrame([{**record, 'time': pd.Timestamp.now().floor('s')}])
+            start_time = time.perf_counter()
+            prediction.predict(df)
+            latencies.append(time.perf_counter() - start_time)
+        result.update(summarize_latencies(latencies))
+
+    # Timing a batch prediction
+    batch_df = pd.DataFrame(records[:benchmark_config.batch_rows])
+    batch_df['time'] = pd.Timestamp.now().floor('s')
+    with measure(results, 'predict_batch') as result:
+        result['rows'] = len(batch_df)
+        prediction.predict(batch_df)
+
+    # Timing the endpoints of the web app
+    client = app.app.test_client()
+    with measure(results, 'api_predict') as result:
+        latencies = []
+        for record in records[:benchmark_config.n_requests]:
+            start_time = time.perf_counter()
+            response = client.post('/api/predict', data=record)
+            latencies.append(time.perf_counter() - start_time)
+        result.update(summarize_latencies(latencies))
+        result['status'] = response.status_code
+    with measure(results, 'api_predict_batch') as result:
+        batch_records = records[:min(benchmark_config.batch_rows, app.batch_config.max_batch_size)]
+        response = client.post('/api/predict/batch', json=batch_records)
+        response.get_data()
+        result['rows'] = len(batch_records)
+        result['status'] = response.status_code
+    with measure(results, 'api_forecast_cold') as result:
+        result['status'] = client.get('/api/forecast?date=2024-01-01').status_code
+    with measure(results, 'api_forecast_cached') as result:
+        result['status'] = client.get('/api/forecast?date=2024-01-01').status_code
+
+# Creating a function to read the commit of the repository
+def get_commit():
+    '''
+    This function returns the commit of the repository, or None outside a git checkout.
+    '''
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Creating a function to run the benchmark suite
+def run_suite(sizes=None, benchmark_config=None, output_path=None):
+    '''
+    This function runs the benchmark suite on synthetic datasets of each size, each in a
+    temporary working directory, and saves the results as a json file.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    sizes : list - The numbers of rows of the synthetic datasets. Defaults to the sizes
+    of the benchmark configuration.
+    benchmark_config : BenchmarkConfig - The configuration of the suite.
+    output_path : str - The path of the json file. Defaults to a file named after the
+    time and the commit in the results folder.
+
+    ---------------------
+    Returns:
+    ---------------------
+    report : dict - The commit, the environment and the measurements of each stage for
+    each size.
+    ========================================================================================
+    '''
+    benchmark_config = benchmark_config or BenchmarkConfig()
+    sizes = sizes or benchmark_config.sizes
+    commit = get_commit()
+    created_at = datetime.now()
+    report = {
+        'commit': commit,
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'streaming_batch_size': StreamingConfig().batch_size,
+        'results': {}
+    }
+    if output_path is None:
+        file_name = f"{created_at.strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json"
+        output_path = os.path.join(ROOT_DIR, benchmark_config.results_dir, file_name)
+    output_path = os.path.abspath(output_path)
+
+    start_dir = os.getcwd()
+    for n_rows in sizes:
+        results = {}
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                with measure(results, 'generate_data'):
+                    prepare_workspace(n_rows)
+                run_feature_stages(results, n_rows, benchmark_config)
+                run_training_stage(results, benchmark_config)
+                run_serving_stages(results, benchmark_config)
+            finally:
+                os.chdir(start_dir)
+        report['results'][str(n_rows)] = results
+        print(f'{n_rows} rows: ' + ', '.join(f"{stage} {result['seconds']}s" for stage, result in results.items()))
+
+    # Saving the results
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as file_obj:
+        json.dump(report, file_obj, indent=2)
+    print(f'Results saved to {output_path}.')
+    return report
+
+# Creating a function to compare two runs of the suite
+def compare_results(baseline, current, threshold=1.2):
+    '''
+    This function compares the wall times of the stages of two runs of the suite, and
+    returns the stages which are slower than the baseline by more than the threshold.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    baseline : str or dict - The json file or the report of the baseline run.
+    current : str or dict - The json file or the report of the current run.
+    threshold : float - The ratio of the current to the baseline time above which a
+    stage is reported.
+
+    ---------------------
+    Returns:
+    ---------------------
+    regressions : list - The size, stage, baseline and current times and the ratio of
+    each slower stage.
+    ========================================================================================
+    '''
+    reports = []
+    for report in (baseline, current):
+        if not isinstance(report, dict):
+            with open(report, 'r') as file_obj:
+                report = json.load(file_obj)
+        reports.append(report)
+    baseline, current = reports
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, result in stages.items():
+            baseline_result = baseline['results'].get(size, {}).get(stage)
+            if baseline_result is None or baseline_result['seconds'] <= 0:
+                continue
+            ratio = result['seconds'] / baseline_result['seconds']
+            if ratio > threshold:
+                regressions.append({
+                    'size': size,
+                    'stage': stage,
+                    'baseline_seconds': baseline_result['seconds'],
+                    'current_seconds': result['seconds'],
+                    'ratio': round(ratio, 2)
+                })
+    return regressions
+
+# Running the benchmark suite
+if __name__ == '__main__':
+
+    # Parsing the command line arguments
+    benchmark_config = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite on synthetic data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=benchmark_config.sizes, help='The numbers of rows.')
+    parser.add_argument('--search-rows', type=int, default=benchmark_config.search_rows, help='The rows sampled for the search.')
+    parser.add_argument('--requests', type=int, default=benchmark_config.n_requests, help='The number of single requests.')
+    parser.add_argument('--output', default=None, help='The path of the json file of the results.')
+    parser.add_argument('--compare', default=None, help='The json file of a baseline run to compare with.')
+    args = parser.parse_args()
+    benchmark_config.search_rows = args.search_rows
+    benchmark_config.n_requests = args.requests
+
+    # Running the suite, and reporting the stages slower than the baseline
+    report = run_suite(args.sizes, benchmark_config, args.output)
+    if args.compare is not None:
+        print(json.dumps(compare_results(args.compare, report), indent=2))
@@ -0,0 +1,59 @@
+# Importing packages
+import numpy as np
+import pandas as pd
+
+# Defining the roadway directions of the synthetic segments
+DIRECTIONS = ['EB', 'NB', 'SB', 'WB', 'NE', 'SW', 'NW', 'SE']
+
+# Creating a function to generate a synthetic congestion dataset
+def generate_congestion_data(n_rows, n_x=3, n_y=4, start_date='1991-04-01', slot_minutes=20, seed=42):
+    '''
+    This function generates a synthetic congestion dataset with the schema of the raw
+    data ("time", "x", "y", "direction" and "congestion"). Every roadway segment is
+    observed in every time slot from the start date until n_rows rows are generated. The
+    congestion is the level of the segment plus a morning and an evening peak, which
+    are lower on weekends, and noise, clipped to integers between 0 and 100. The rows are
+    returned in a random order, like the raw data.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    n_rows : int - The number of rows.
+    n_x : int - The number of x coordinates of the roadway segments.
+    n_y : int - The number of y coordinates of the roadway segments.
+    start_date : str - The day of the first time slot.
+    slot_minutes : int - The length of a time slot in minutes.
+    seed : int - The seed of the random number generator.
+
+    ---------------------
+    Returns:
+    ---------------------
+    df : pandas dataframe - The synthetic dataset, with the time as a string.
+    ========================================================================================
+    '''
+    rng = np.random.default_rng(seed)
+    n_segments = n_x * n_y * len(DIRECTIONS)
+    row = rng.permutation(n_rows)
+    slot = row // n_segments
+    segment = row % n_segments
+    x, y, direction = np.unravel_index(segment, (n_x, n_y, len(DIRECTIONS)))
+
+    # Formatting each distinct time slot once, and gathering the strings of the rows
+    slot_times = pd.Timestamp(start_date) + pd.to_timedelta(np.arange(slot.max() + 1) * slot_minutes, unit='m')
+    time_labels = np.asarray(slot_times.strftime('%Y-%m-%d %H:%M:%S'), dtype=object)
+
+    # Creating the daily profile of the congestion
+    hours = np.asarray(slot_times.hour + slot_times.minute / 60)
+    weekend = np.asarray(slot_times.dayofweek > 4)
+    peaks = 20 * np.exp(-((hours - 8) ** 2) / 2) + 25 * np.exp(-((hours - 17.5) ** 2) / 3)
+    profile = np.where(weekend, 0.4, 1.0) * peaks
+    segment_level = rng.uniform(25, 55, n_segments)
+    congestion = segment_level[segment] + profile[slot] + rng.normal(0, 8, n_rows)
+
+    return pd.DataFrame({
+        'time': time_labels[slot],
+        'x': x.astype(np.int64),
+        'y': y.astype(np.int64),
+        'direction': np.asarray(DIRECTIONS, dtype=object)[direction],
+        'congestion': np.clip(np.rint(congestion), 0, 100).astype(np.int64)
+    })
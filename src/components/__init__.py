@@ -1,3 +1,3 @@
-# Importing packages
-from sklearn import set_config
-set_config(transform_output='pandas')
+# The components do not share imports, so that the serving components can be imported
+# without loading sklearn. The components which use sklearn set its pandas output
+# themselves.
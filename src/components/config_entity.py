@@ -1,23 +1,28 @@
 # Importing packages
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 # Creating the config class for data ingestion
 @dataclass
 class DataIngestionConfig():
     '''
-    This class defines the path for the train and test datasets.
+    This class defines the path for the train and test datasets, and the columns of the
+    raw data.
     '''
     train_data_path: str = os.path.join('artifacts', 'train_data.parquet')
     test_data_path: str = os.path.join('artifacts', 'test_data.parquet')
+    raw_columns: list = field(default_factory=lambda: ['time', 'x', 'y', 'direction', 'congestion'])
 
 # Creating a config class for data transformation
 @dataclass
 class DataTransformationConfig():
     '''
-    This class defines the path in which the transformed data will be stored.
+    This class defines the path in which the preprocessor object, the inference plan
+    compiled from it and the dictionary of the roadway segments will be stored.
     '''
     preprocessor_obj_path: str = os.path.join('artifacts', 'preprocessor.joblib')
+    inference_plan_path: str = os.path.join('artifacts', 'inference_plan.json')
+    segment_dictionary_path: str = os.path.join('artifacts', 'segment_dictionary.json')
 
 # Creating a config class to create the feature store to store the transformed
 # datasets.
@@ -25,15 +30,270 @@ class DataTransformationConfig():
 class StoreFeatureConfig():
     '''
     This class defines the path in which the transformed datasets will be 
-    stored.
+    stored, and the path to the metadata of the feature store. Each transformed
+    dataset is a parquet dataset partitioned by month. Within a month, the rows are
+    sorted by roadway segment, so that the row group statistics let readers skip
+    the row groups of other segments. The key columns are not features: the time of
+    each row orders the rows of the cross-validation folds. The Arrow paths hold an
+    uncompressed copy of the transformed datasets, with the training rows in time
+    order, which is memory-mapped when the model is trained.
     '''
     xform_train_path: str = os.path.join('feature_store', 'xform_train_set.parquet')
     xform_test_path: str = os.path.join('feature_store', 'xform_test_set.parquet')
+    metadata_path: str = os.path.join('feature_store', 'feature_store_metadata.json')
+    key_columns: list = field(default_factory=lambda: ['month', 'segment', 'time'])
+    partition_cols: list = field(default_factory=lambda: ['month'])
+    sort_cols: list = field(default_factory=lambda: ['segment'])
+    compression: str = 'zstd'
+    row_group_size: int = 65536
+    xform_train_arrow_path: str = os.path.join('feature_store', 'xform_train_set.arrow')
+    xform_test_arrow_path: str = os.path.join('feature_store', 'xform_test_set.arrow')
 
 # Creating a config class to save the model in the artifacts folder
 @dataclass
 class ModelTrainerConfig():
     '''
-    This class defines the path in which the model will be stored.
+    This class defines the path in which the model will be stored, whether the
+    training data is read from the memory-mapped Arrow copy of the feature store, and
+    the strategy used to search the hyperparameters.
     '''
-    model_path: str = os.path.join('artifacts', 'model.joblib')
\ No newline at end of file
+    model_path: str = os.path.join('artifacts', 'model.joblib')
+    use_memory_map: bool = False
+    search_strategy: str = 'grid'
+
+# Creating a config class for the process-wide model cache
+@dataclass
+class ModelCacheConfig():
+    '''
+    This class defines the folder holding the run parameters, how often (in seconds)
+    the model cache checks whether the model or the preprocessor object has changed, and
+    the inference backend of the model. The "pyfunc" backend loads the XGBRegressor of
+    the local model store or the mlflow pyfunc model of the registry, and the "native"
+    backend loads the raw XGBoost booster of either.
+    '''
+    run_config_dir: str = 'run_config'
+    check_interval: float = 5.0
+    inference_backend: str = os.environ.get('INFERENCE_BACKEND', 'pyfunc').lower()
+
+
+# Creating a config class for the local model store
+@dataclass
+class ModelStoreConfig():
+    '''
+    This class defines the folder in which the trained models are stored locally, the
+    manifest file which points to the latest stored model, and whether the training
+    pipeline also syncs the model to the remote model registry, which is off by default
+    so that training does not need the network.
+    '''
+    model_store_dir: str = 'model_store'
+    manifest_path: str = os.path.join('model_store', 'latest.json')
+    model_file_name: str = 'model.ubj'
+    sync_registry: bool = os.environ.get('SYNC_REGISTRY', 'false').lower() in ('1', 'true', 'yes')
+
+
+# Creating a config class for the batch prediction endpoint
+@dataclass
+class BatchPredictionConfig():
+    '''
+    This class defines the maximum number of records accepted in one batch prediction
+    request, and the number of records above which the response is streamed in chunks.
+    '''
+    max_batch_size: int = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+    stream_chunk_size: int = 1000
+
+
+# Creating a config class for the streaming feature pipeline
+@dataclass
+class StreamingConfig():
+    '''
+    This class defines the number of rows read, transformed and written at a time by the
+    streaming feature pipeline. The streamed rows are split into the train and test sets
+    with the settings of TimeSplitConfig, like the rows of the in-memory pipeline.
+    '''
+    batch_size: int = 100000
+
+
+# Creating a config class for the training resource scheduler
+@dataclass
+class ResourceSchedulerConfig():
+    '''
+    This class defines the number of cores available for training (0 uses every core
+    available to the process), the smallest number of rows worth giving to one XGBoost
+    thread, and how the OpenMP threads of the search workers are bound to their cores.
+    '''
+    n_cores: int = int(os.environ.get('TRAINING_CORES', 0))
+    min_rows_per_thread: int = 100000
+    proc_bind: str = 'close'
+
+
+# Creating a config class for the production web server
+@dataclass
+class ServingConfig():
+    '''
+    This class defines the address of the production web server, the number of worker
+    processes and of threads per worker, the request timeouts, and how often (in
+    seconds) the master process checks whether the run parameters point at a new model.
+    '''
+    bind: str = os.environ.get('BIND', '0.0.0.0:8000')
+    workers: int = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+    threads: int = int(os.environ.get('GUNICORN_THREADS', 4))
+    timeout: int = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+    graceful_timeout: int = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+    reload_check_interval: float = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+
+
+# Creating a config class for the micro-batching of the prediction API
+@dataclass
+class MicroBatchConfig():
+    '''
+    This class defines whether the prediction API groups concurrent requests into
+    batches, the largest number of requests in a batch, the longest time (in
+    milliseconds) that a request waits for other requests to join its batch, and the
+    longest time (in seconds) that a request waits for its prediction.
+    '''
+    enabled: bool = os.environ.get('MICRO_BATCHING', 'false').lower() in ('1', 'true', 'yes')
+    max_batch_size: int = int(os.environ.get('MICRO_BATCH_SIZE', 64))
+    max_linger_ms: float = float(os.environ.get('MICRO_BATCH_LINGER_MS', 2.0))
+    timeout: float = 5.0
+
+
+# Creating a config class for the precomputed prediction tables
+@dataclass
+class PredictionTableConfig():
+    '''
+    This class defines the folder in which the prediction tables are stored. Each table
+    holds the predictions of one model version for every roadway segment, hour of the
+    day and weekend flag.
+    '''
+    prediction_table_dir: str = os.path.join('artifacts', 'prediction_tables')
+
+
+# Creating a config class for the lag and rolling mean features
+@dataclass
+class LagFeatureConfig():
+    '''
+    This class defines whether the model uses the lag and rolling mean features of the
+    congestion, the length (in minutes) of a time slot, the lags and rolling windows (in
+    time slots) of the features, the raw data which warms up the segment history used to
+    build the features when serving, and the backend storing the segment history ("local"
+    for the memory of each process, or "redis" to share it) with the url and key prefix
+    of the redis backend.
+    '''
+    enabled: bool = os.environ.get('LAG_FEATURES', 'false').lower() in ('1', 'true', 'yes')
+    slot_minutes: int = 20
+    lags: dict = field(default_factory=lambda: {'lag_1': 1, 'lag_2': 2, 'lag_1d': 72, 'lag_1w': 504})
+    rolling_windows: dict = field(default_factory=lambda: {'rolling_mean_1h': 3, 'rolling_mean_1d': 72})
+    warm_start_paths: list = field(default_factory=lambda: [
+        os.path.join('artifacts', 'train_data.parquet'),
+        os.path.join('artifacts', 'test_data.parquet')
+    ])
+    history_backend: str = os.environ.get('SEGMENT_HISTORY_BACKEND', 'local')
+    redis_url: str = os.environ.get('SEGMENT_HISTORY_URL', 'redis://localhost:6379/0')
+    key_prefix: str = 'congestion:history'
+
+
+# Creating a config class for the forecasts of a whole day
+@dataclass
+class ForecastConfig():
+    '''
+    This class defines the length (in minutes) of the time slots of a forecast, the
+    number of (model cache key, date) forecasts kept in the cache of each process, and
+    the folder in which the forecast pipeline saves the forecasts.
+    '''
+    slot_minutes: int = 20
+    cache_size: int = int(os.environ.get('FORECAST_CACHE_SIZE', 8))
+    forecast_dir: str = os.path.join('artifacts', 'forecasts')
+
+
+# Creating a config class for the cache of the single-segment predictions
+@dataclass
+class PredictionCacheConfig():
+    '''
+    This class defines whether the prediction API caches the predictions of single
+    roadway segments, the backend storing the cache ("local" for the memory of each
+    process, or "redis" to share it), the largest number of entries of the local
+    backend, and the url and key prefix of the redis backend.
+    '''
+    enabled: bool = os.environ.get('PREDICTION_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    backend: str = os.environ.get('PREDICTION_CACHE_BACKEND', 'local')
+    max_size: int = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+    redis_url: str = os.environ.get('PREDICTION_CACHE_URL', 'redis://localhost:6379/0')
+    key_prefix: str = 'congestion:prediction'
+
+
+# Creating a config class for the offline benchmark suite
+@dataclass
+class BenchmarkConfig():
+    '''
+    This class defines the numbers of rows of the synthetic datasets of the benchmark
+    suite, the number of rows above which the streaming feature pipeline is used, the
+    largest number of rows sampled for the hyperparameter search, the number of single
+    requests and the size of the batches timed by the serving benchmarks, and the
+    folder in which the results are saved.
+    '''
+    sizes: list = field(default_factory=lambda: [10000, 1000000, 10000000])
+    streaming_above: int = 2000000
+    search_rows: int = 200000
+    n_requests: int = 500
+    batch_rows: int = 10000
+    results_dir: str = 'benchmark_results'
+
+
+# Creating a config class for the instrumentation of the pipeline stages
+@dataclass
+class InstrumentationConfig():
+    '''
+    This class defines whether the stages of the pipelines log their wall time, CPU
+    time, peak memory and rows as JSON records.
+    '''
+    enabled: bool = os.environ.get('INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+
+
+# Creating a config class for the request metrics of the web app
+@dataclass
+class MetricsConfig():
+    '''
+    This class defines whether the web app records the latency of its requests and of
+    their stages, which are served on the /metrics endpoint, the folder in which the
+    worker processes write the snapshots of their metrics, so that /metrics serves the
+    metrics of all the workers, and the interval (in seconds) between two snapshots.
+    Without a folder, /metrics serves the metrics of the process which answers it.
+    '''
+    enabled: bool = os.environ.get('METRICS', 'true').lower() in ('1', 'true', 'yes')
+    multiprocess_dir: str = os.environ.get('METRICS_DIR', '')
+    snapshot_interval: float = float(os.environ.get('METRICS_SNAPSHOT_INTERVAL', 5))
+
+
+# Creating a config class for the dtypes of the raw and transformed data
+@dataclass
+class DataSchemaConfig():
+    '''
+    This class defines the dtypes of the raw data, the dtype of the transformed
+    features and of the target, and the columns of the transformed data which are
+    categorical. The integer columns are checked to fit their dtype before they are
+    cast.
+    '''
+    raw_dtypes: dict = field(default_factory=lambda: {
+        'time': 'datetime64[ns]', 'x': 'uint8', 'y': 'uint8', 'direction': 'category', 'congestion': 'uint8'
+    })
+    feature_dtype: str = 'float32'
+    target_column: str = 'congestion'
+    target_dtype: str = 'uint8'
+    category_columns: list = field(default_factory=lambda: ['segment'])
+
+
+# Creating a config class for the train and test split and the cross-validation folds
+@dataclass
+class TimeSplitConfig():
+    '''
+    This class defines how the rows are split into the train and test sets and into the
+    cross-validation folds. With the "chronological" strategy, the test set holds the
+    most recent rows and the folds are rolling-origin folds over the time-sorted train
+    set, so no model is validated on rows older than the rows it was trained on. With
+    the "random" strategy, the rows are shuffled into the test set and the folds.
+    '''
+    strategy: str = os.environ.get('SPLIT_STRATEGY', 'chronological').lower()
+    test_size: float = 0.3
+    n_splits: int = 3
+    random_state: int = 42
+    time_column: str = 'time'
@@ -1,7 +1,7 @@
 # Importing packages
 import sys
 import pandas as pd
-from src.utils import get_current_time
+from src.run_utils import get_current_time
 from src.exception import CustomException
 
 # Creating a class to convert user entered data into a pandas dataframe.
@@ -58,4 +58,55 @@ class CreateCustomData():
             return df
         
         except Exception as e:
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
+
+
+# Creating a class to convert a batch of records into a pandas dataframe.
+class CreateBatchData():
+    '''
+    This class is responsible for converting a batch of records, received as JSON, into
+    a single pandas dataframe. Each record contains the "x", "y" and "direction" of a
+    roadway segment and, optionally, the "time" for which the prediction is required.
+    The rows of the dataframe are in the same order as the records.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, records:list):
+        '''
+        This is the constructor for the batch data class.
+        '''
+        self.records = records
+    
+    # Creating a method to convert the batch of records into a pandas dataframe
+    def create_dataframe(self):
+        '''
+        This method validates the batch of records and returns a dataframe. Records without
+        a "time" are stamped with the current time.
+        ========================================================================================
+        -----------------------
+        Returns:
+        -----------------------
+        df : pandas dataframe - A pandas dataframe with one row per record.
+        ========================================================================================
+        '''
+        try:
+            # Validating the records
+            if not isinstance(self.records, list) or len(self.records) == 0:
+                raise ValueError('The request must contain a non-empty list of records.')
+            for idx, record in enumerate(self.records):
+                if not isinstance(record, dict) or not {'x', 'y', 'direction'} <= record.keys():
+                    raise ValueError(f'Record {idx} must contain "x", "y" and "direction".')
+            
+            # Creating a pandas dataframe from the records
+            current_time = get_current_time()
+            df = pd.DataFrame({
+                'time': [record.get('time') or current_time for record in self.records],
+                'x': [int(record['x']) for record in self.records],
+                'y': [int(record['y']) for record in self.records],
+                'direction': [str(record['direction']) for record in self.records]
+            })
+            df['time'] = pd.to_datetime(df['time'], format='ISO8601')
+            
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -1,12 +1,23 @@
 # Importing packages
 import os
 import sys
+import shutil
+import tempfile
+import urllib.request
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sklearn import set_config
 set_config(transform_output='pandas')
 from src.exception import CustomException
 from src.logger import logging
 from src.components.config_entity import DataIngestionConfig
+from src.components.config_entity import StreamingConfig
+from src.components.config_entity import TimeSplitConfig
+from src.components.data_schema import DataSchema
+from src.components.time_split import TimeSplit
+from src.instrumentation import instrument
 from sklearn.model_selection import train_test_split
 
 
@@ -15,21 +26,29 @@ class DataIngestion():
     '''
     The DataIngestion class is responsible for reading the raw data at source, splitting the data
     into a train and test set, and then saving the train and test set in an "artifacts" folder.
-    The class contains two methods - A constructor and a method to initiate the data ingestion
-    process.
+    The class contains a constructor, a method to initiate the data ingestion process and a
+    method to initiate the data ingestion process in a streaming mode.
     '''
     def __init__(self):
         '''
         This is the constructor method for the DataIngestion class.
         '''
         self.ingestion_config = DataIngestionConfig()
+        self.streaming_config = StreamingConfig()
+        self.time_split_config = TimeSplitConfig()
+        self.data_schema = DataSchema()
+        self.data_path = 'https://github.com/abbeymaj80/my-ml-datasets/raw/refs/heads/master/project_datasets/congestion/train.parquet'
         
     # Creating a method to initiate the data ingestion process
+    @instrument()
     def initiate_data_ingestion(self):
         '''
-        This method will ingest the data from source, split the dataset into a train
-        and test dataset. The function will also create the artifacts folder and store
-        the train and test dataset in the artifacts folder.
+        This method will ingest the data from source, cast it to the dtypes of the data
+        schema, and split the dataset into a train and test dataset. With the
+        chronological split strategy, the test dataset holds the most recent rows, and
+        the train and test datasets are views of the rows sorted by time. The function
+        will also create the artifacts folder and store the train and test dataset in
+        the artifacts folder.
         ====================================================================================
         ---------------
         Returns:
@@ -44,21 +63,27 @@ class DataIngestion():
             # Creating the artifacts folder if it does not exist
             os.makedirs(os.path.dirname(self.ingestion_config.train_data_path), exist_ok=True)
             
-            # Defining the data path
-            data_path = 'https://github.com/abbeymaj80/my-ml-datasets/raw/refs/heads/master/project_datasets/congestion/train.parquet'
-            
             # Reading the data from the source
-            df = pd.read_parquet(data_path)
+            df = pd.read_parquet(self.data_path)
             
             # Dropping the "row_Id" column from the dataset
-            df.drop(columns=['row_id'], axis=1, inplace=True)
-                      
+            df.drop(columns=['row_id'], inplace=True)
+            
+            # Casting the data to the dtypes of the data schema
+            df = self.data_schema.enforce_raw(df, 'raw_data')
+            
             # Splitting the data into a train and test set
-            train_data, test_data = train_test_split(df, test_size=0.3, random_state=42)
+            if self.time_split_config.strategy == 'chronological':
+                train_data, test_data = TimeSplit(test_size=self.time_split_config.test_size).holdout_split(df)
+            else:
+                train_data, test_data = train_test_split(
+                    df, test_size=self.time_split_config.test_size, random_state=self.time_split_config.random_state
+                )
             
             # Saving the train and test data into the artifacts folder
             train_data.to_parquet(self.ingestion_config.train_data_path, index=False, compression='gzip')
             test_data.to_parquet(self.ingestion_config.test_data_path, index=False, compression='gzip')
+            self.data_schema.log_memory_report()
             
             logging.info('Data ingestion process completed.')
             
@@ -69,3 +94,105 @@ class DataIngestion():
         
         except Exception as e:
             raise CustomException(e, sys)
+    
+    # Creating a method to initiate the data ingestion process in a streaming mode
+    @instrument()
+    def initiate_streaming_data_ingestion(self, data_path=None):
+        '''
+        This method ingests the data from source one batch of rows at a time, so that the
+        memory used is bounded by the size of one batch. With the chronological split
+        strategy, the time column is read first to find the time from which the most
+        recent "test_size" fraction of the rows are in the test set. Otherwise, the test
+        rows are drawn as in initiate_data_ingestion, from the number of rows in the
+        parquet metadata. Both strategies read the split settings of TimeSplitConfig, so
+        the streaming and in-memory ingestion put the same rows in the test set. Each batch is cast to the dtypes of the data schema and
+        written to the train and test datasets as a new row group. A remote source is
+        first copied to a temporary file on disk.
+        ====================================================================================
+        ---------------
+        Parameters:
+        ---------------
+        data_path : str - The path or url of the source data. Defaults to the source used
+        by initiate_data_ingestion.
+        
+        ---------------
+        Returns:
+        ---------------
+        train file path : str - This is the path to the train dataset.
+        test file path : str - This is the path to the test dataset.
+        ====================================================================================
+        '''
+        try:
+            logging.info('Starting the streaming data ingestion process.')
+            
+            # Creating the artifacts folder if it does not exist
+            os.makedirs(os.path.dirname(self.ingestion_config.train_data_path), exist_ok=True)
+            
+            data_path = data_path or self.data_path
+            with tempfile.TemporaryDirectory() as temp_dir:
+                # Copying a remote source to the disk without loading it into memory
+                if data_path.startswith(('http://', 'https://')):
+                    local_path = os.path.join(temp_dir, 'source.parquet')
+                    with urllib.request.urlopen(data_path) as response, open(local_path, 'wb') as file_obj:
+                        shutil.copyfileobj(response, file_obj)
+                    data_path = local_path
+                
+                # Finding the time at which the chronological test set starts, or
+                # drawing the random test rows
+                parquet_file = pq.ParquetFile(data_path)
+                cutoff = None
+                test_rows = None
+                if self.time_split_config.strategy == 'chronological':
+                    time_table = self.data_schema.enforce_raw_table(parquet_file.read(columns=['time']))
+                    cutoff = TimeSplit(test_size=self.time_split_config.test_size).holdout_cutoff(time_table['time'].to_numpy())
+                    del time_table
+                else:
+                    n_rows = parquet_file.metadata.num_rows
+                    _, test_index = train_test_split(
+                        np.arange(n_rows), test_size=self.time_split_config.test_size, random_state=self.time_split_config.random_state
+                    )
+                    test_rows = np.zeros(n_rows, dtype=bool)
+                    test_rows[test_index] = True
+                    del test_index
+                
+                # Splitting and writing the data one batch at a time
+                offset = 0
+                train_writer = None
+                test_writer = None
+                try:
+                    for batch in parquet_file.iter_batches(batch_size=self.streaming_config.batch_size):
+                        table = pa.Table.from_batches([batch])
+                        
+                        # Dropping the "row_Id" column from the dataset
+                        if 'row_id' in table.column_names:
+                            table = table.drop_columns(['row_id'])
+                        
+                        # Casting the batch to the dtypes of the data schema
+                        table = self.data_schema.enforce_raw_table(table, 'raw_data')
+                        
+                        # Splitting the batch into a train and test set
+                        if cutoff is not None:
+                            is_test = table['time'].to_numpy() >= cutoff
+                        else:
+                            is_test = test_rows[offset:offset + table.num_rows]
+                        offset += table.num_rows
+                        if train_writer is None:
+                            train_writer = pq.ParquetWriter(self.ingestion_config.train_data_path, table.schema, compression='gzip')
+                            test_writer = pq.ParquetWriter(self.ingestion_config.test_data_path, table.schema, compression='gzip')
+                        train_writer.write_table(table.filter(pa.array(~is_test)))
+                        test_writer.write_table(table.filter(pa.array(is_test)))
+                finally:
+                    if train_writer is not None:
+                        train_writer.close()
+                        test_writer.close()
+            self.data_schema.log_memory_report()
+            
+            logging.info('Streaming data ingestion process completed.')
+            
+            return (
+                self.ingestion_config.train_data_path,
+                self.ingestion_config.test_data_path
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,220 @@
+# Importing packages
+import sys
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import is_float_dtype, is_integer_dtype
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import DataSchemaConfig
+
+
+# Creating a class to enforce the dtypes of the raw and transformed data
+class DataSchema():
+    '''
+    This class enforces the dtypes declared in the data schema configuration. In the
+    raw data, the coordinates and the target are uint8, the direction is categorical
+    and the time is a datetime. In the transformed data, the features are float32,
+    the target is uint8 and the roadway segment is categorical. Integer columns are
+    checked to fit their dtype, so a cast never wraps around. The memory used by each
+    stage before and after the casts is added to a report. The stage can be logged
+    as JSON records once the data has been processed.
+    '''
+    # Creating the constructor for the class
+    def __init__(self):
+        '''
+        This is the constructor for the DataSchema class.
+        '''
+        self.schema_config = DataSchemaConfig()
+        self.memory_report = {}
+    
+    # Creating a method to check that integer values fit an integer dtype
+    def check_integer_range(self, values, col, dtype):
+        '''
+        This method raises a ValueError if a column has missing values, fractional values
+        or values outside the range of an integer dtype.
+        '''
+        info = np.iinfo(dtype)
+        if len(values) == 0:
+            return
+        if values.isna().any():
+            raise ValueError(f'The column {col} has missing values, which do not fit {dtype}.')
+        if is_float_dtype(values.dtype) and not np.all(np.mod(values.to_numpy(), 1) == 0):
+            raise ValueError(f'The column {col} has fractional values, which do not fit {dtype}.')
+        if values.min() < info.min or values.max() > info.max:
+            raise ValueError(f'The column {col} has values outside the range of {dtype}.')
+    
+    # Creating a method to add the memory used by a stage to the report
+    def add_to_report(self, stage, rows, before_bytes, after_bytes):
+        '''
+        This method adds the rows and the memory used before and after the casts to the
+        totals of a stage.
+        '''
+        totals = self.memory_report.setdefault(stage, {'rows': 0, 'before_bytes': 0, 'after_bytes': 0})
+        totals['rows'] += int(rows)
+        totals['before_bytes'] += int(before_bytes)
+        totals['after_bytes'] += int(after_bytes)
+    
+    # Creating a method to enforce the dtypes of the raw data
+    def enforce_raw(self, df:pd.DataFrame, stage=None)->pd.DataFrame:
+        '''
+        This method casts the columns of a raw dataset to the dtypes of the schema.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - The raw dataset.
+        stage : str - If provided, the stage under which the memory saved is reported.
+        
+        ----------------
+        Returns:
+        ----------------
+        df : pd.DataFrame - The raw dataset with the dtypes of the schema.
+        ===================================================================================
+        '''
+        try:
+            before_bytes = df.memory_usage(deep=True).sum() if stage else 0
+            dtypes = {}
+            for col, dtype in self.schema_config.raw_dtypes.items():
+                if col not in df.columns or df[col].dtype == dtype:
+                    continue
+                if dtype == 'category':
+                    dtypes[col] = 'category'
+                elif dtype.startswith('datetime64'):
+                    df = df.assign(**{col: pd.to_datetime(df[col]).astype(dtype)})
+                else:
+                    if is_integer_dtype(np.dtype(dtype)):
+                        self.check_integer_range(df[col], col, dtype)
+                    dtypes[col] = dtype
+            if dtypes:
+                df = df.astype(dtypes)
+            if stage:
+                self.add_to_report(stage, len(df), before_bytes, df.memory_usage(deep=True).sum())
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to enforce the dtypes of the raw data on an arrow table
+    def enforce_raw_table(self, table:pa.Table, stage=None)->pa.Table:
+        '''
+        This method casts the columns of a raw arrow table to the dtypes of the schema,
+        without converting it to pandas. The categorical columns are dictionary encoded,
+        and the casts to integers fail if a value does not fit.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        table : pa.Table - The raw table.
+        stage : str - If provided, the stage under which the memory saved is reported.
+        
+        ----------------
+        Returns:
+        ----------------
+        table : pa.Table - The raw table with the dtypes of the schema.
+        ===================================================================================
+        '''
+        try:
+            before_bytes = table.nbytes
+            cast = False
+            for col, dtype in self.schema_config.raw_dtypes.items():
+                if col not in table.column_names:
+                    continue
+                column = table[col]
+                if dtype == 'category':
+                    if pa.types.is_dictionary(column.type):
+                        continue
+                    column = column.dictionary_encode()
+                else:
+                    arrow_type = pa.from_numpy_dtype(np.dtype(dtype))
+                    if column.type == arrow_type:
+                        continue
+                    column = pc.cast(column, arrow_type)
+                table = table.set_column(table.column_names.index(col), col, column)
+                cast = True
+            
+            # Dropping the pandas metadata of the source, which would convert the cast
+            # columns back to their old dtypes when the table is read into pandas
+            if cast:
+                table = table.replace_schema_metadata(None)
+            if stage:
+                self.add_to_report(stage, table.num_rows, before_bytes, table.nbytes)
+            return table
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to enforce the dtypes of the transformed data
+    def enforce_features(self, df:pd.DataFrame, stage=None)->pd.DataFrame:
+        '''
+        This method casts the float features of a transformed dataset to the feature
+        dtype, the target to the target dtype and the roadway segment to a categorical.
+        The other columns, such as the month key, are kept as they are.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - The transformed dataset.
+        stage : str - If provided, the stage under which the memory saved is reported.
+        
+        ----------------
+        Returns:
+        ----------------
+        df : pd.DataFrame - The transformed dataset with the dtypes of the schema.
+        ===================================================================================
+        '''
+        try:
+            before_bytes = df.memory_usage(deep=True).sum() if stage else 0
+            config = self.schema_config
+            dtypes = {}
+            for col, dtype in df.dtypes.items():
+                if col == config.target_column:
+                    if dtype != config.target_dtype:
+                        self.check_integer_range(df[col], col, config.target_dtype)
+                        dtypes[col] = config.target_dtype
+                elif col in config.category_columns:
+                    if not isinstance(dtype, pd.CategoricalDtype):
+                        dtypes[col] = 'category'
+                elif is_float_dtype(dtype) and dtype != config.feature_dtype:
+                    dtypes[col] = config.feature_dtype
+            if dtypes:
+                df = df.astype(dtypes)
+            if stage:
+                self.add_to_report(stage, len(df), before_bytes, df.memory_usage(deep=True).sum())
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to log the memory report
+    def log_memory_report(self):
+        '''
+        This method logs the rows and the memory used before and after the casts of each
+        stage as JSON records, and empties the report.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        report : list - The records of the stages, with the memory in megabytes and the
+        ratio of the memory before and after the casts.
+        ===================================================================================
+        '''
+        report = []
+        for stage, totals in self.memory_report.items():
+            before_mb = totals['before_bytes'] / 1024 ** 2
+            after_mb = totals['after_bytes'] / 1024 ** 2
+            record = {
+                'event': 'memory_report',
+                'stage': stage,
+                'rows': totals['rows'],
+                'before_mb': round(before_mb, 2),
+                'after_mb': round(after_mb, 2),
+                'saved_mb': round(before_mb - after_mb, 2),
+                'ratio': round(before_mb / after_mb, 2) if after_mb else None
+            }
+            logging.info(json.dumps(record))
+            report.append(record)
+        self.memory_report = {}
+        return report
@@ -1,11 +1,14 @@
 # Importing packages
+import os
 import sys
 import joblib
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 from sklearn import set_config
 set_config(transform_output='pandas')
-from feature_engine.encoding import MeanEncoder
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
@@ -17,8 +20,20 @@ from src.utils import create_am_pm_feature
 from src.utils import create_is_weekend_feature
 from src.utils import create_direction_feature
 from src.utils import drop_non_essential_features
+from src.utils import StreamingMeanEncoder
+from src.lag_features import create_lag_features
 from src.components.config_entity import DataIngestionConfig
 from src.components.config_entity import DataTransformationConfig
+from src.components.config_entity import StreamingConfig
+from src.components.config_entity import StoreFeatureConfig
+from src.components.config_entity import LagFeatureConfig
+from src.components.config_entity import TimeSplitConfig
+from src.components.inference_plan import InferencePlan
+from src.components.segment_dictionary import SegmentDictionary
+from src.components.data_schema import DataSchema
+from src.components.store_features import FeatureStoreCreation
+from src.components.time_split import TimeSplit
+from src.instrumentation import instrument
 
 
 # Creating a class to transform the data
@@ -37,8 +52,35 @@ class DataTransformation():
         '''
         self.data_ingestion_config = DataIngestionConfig()
         self.data_transformation_config = DataTransformationConfig()
+        self.streaming_config = StreamingConfig()
+        self.feature_store_config = StoreFeatureConfig()
+        self.lag_feature_config = LagFeatureConfig()
+        self.time_split_config = TimeSplitConfig()
+        self.segment_dictionary = None
+        self.data_schema = DataSchema()
+        self.staged_artifacts = []
+    
+    # Creating a method to fetch the dictionary used to encode the roadway segments
+    def load_segment_dictionary(self):
+        '''
+        This method returns the segment dictionary fitted by this instance or, if there
+        is none, the segment dictionary saved with the preprocessor object, so that the
+        train and serve paths encode the segments with the same codes. It returns None
+        when no segment dictionary has been saved, in which case the segments are
+        encoded as strings.
+        '''
+        try:
+            if self.segment_dictionary is None:
+                segment_dictionary_path = self.data_transformation_config.segment_dictionary_path
+                if os.path.exists(segment_dictionary_path):
+                    return SegmentDictionary.load(segment_dictionary_path)
+            return self.segment_dictionary
+        
+        except Exception as e:
+            raise CustomException(e, sys)
     
     # Creating a method to generate new features and drop non-essential features
+    @instrument()
     def generate_features(self, df:pd.DataFrame)->pd.DataFrame:
         '''
         This method generates new features and drops non-essential features from the
@@ -64,7 +106,7 @@ class DataTransformation():
             df = create_hour_feature(df)
             df = create_am_pm_feature(df)
             df = create_is_weekend_feature(df)
-            df = create_direction_feature(df)
+            df = create_direction_feature(df, self.load_segment_dictionary())
             
             # Dropping the non-essential features from the dataset
             df = drop_non_essential_features(df)
@@ -75,10 +117,40 @@ class DataTransformation():
             raise CustomException(e, sys)
     
     
+    # Creating a method to create the month key used to partition the feature store
+    def create_month_key(self, df:pd.DataFrame)->pd.Series:
+        '''
+        This method creates the month key, as an integer of the form YYYYMM, which is
+        used to partition the feature store. It must be called before generate_features,
+        which drops the 'time' feature.
+        ==============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - The original dataset.
+        
+        ----------------
+        Returns:
+        ----------------
+        month : pd.Series - The month key of each row.
+        ==============================================================================
+        '''
+        try:
+            if not is_datetime(df['time']):
+                df['time'] = pd.to_datetime(df['time'])
+            return df['time'].dt.year * 100 + df['time'].dt.month
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
     # Creating a method to create the preprocessor object
     def create_preprocessor_obj(self):
         '''
-        This method creates the preprocessor object.
+        This method creates the preprocessor object. The mean encoder keeps the running
+        sum and count of the target for each category, so that the preprocessor object
+        can be fitted one batch at a time and updated when new data arrives. The one hot
+        encoder uses fixed categories, so that a single batch is enough to fit it, and
+        writes float32 columns.
         =============================================================================
         ------------------
         Returns:
@@ -97,14 +169,14 @@ class DataTransformation():
             # Creating the one hot encoder pipeline
             ohe_pipeline = Pipeline(
                 steps=[
-                    ('ohe', OneHotEncoder(sparse_output=False))
+                    ('ohe', OneHotEncoder(sparse_output=False, categories=[['AM', 'PM'], [False, True]], dtype=np.float32))
                 ]
             )
             
             # Creating the mean encoder pipeline
             me_pipeline = Pipeline(
                 steps=[
-                    ('mean_encoder', MeanEncoder())
+                    ('mean_encoder', StreamingMeanEncoder())
                 ]
             )
             
@@ -124,9 +196,12 @@ class DataTransformation():
             raise CustomException(e, sys)
     
     # Creating a method to initiate the data transformation process
+    @instrument()
     def initiate_data_transformation(self, train_data_path:str, test_data_path:str, save_object=True):
         '''
-        This method performs the data transformation on the feature set.
+        This method performs the data transformation on the feature set. The raw data is
+        cast to the dtypes of the data schema when it is read, and the transformed data
+        before it is returned.
         ===============================================================================
         ----------------
         Parameters:
@@ -147,8 +222,30 @@ class DataTransformation():
             logging.info('Starting the data transformation process.')
             
             # Reading the train and test datasets
-            train_data = pd.read_parquet(self.data_ingestion_config.train_data_path)
-            test_data = pd.read_parquet(self.data_ingestion_config.test_data_path)
+            train_data = self.data_schema.enforce_raw(pd.read_parquet(self.data_ingestion_config.train_data_path), 'raw_train')
+            test_data = self.data_schema.enforce_raw(pd.read_parquet(self.data_ingestion_config.test_data_path), 'raw_test')
+            
+            # Fitting the dictionary of the roadway segments of the train and test data
+            self.segment_dictionary = SegmentDictionary().fit(
+                pd.concat([train_data[['x', 'y', 'direction']], test_data[['x', 'y', 'direction']]])
+            )
+            
+            # Creating the month keys used to partition the feature store, and keeping the
+            # time of each row, which orders the rows of the cross-validation folds
+            train_month = self.create_month_key(train_data)
+            test_month = self.create_month_key(test_data)
+            train_time = train_data['time']
+            test_time = test_data['time']
+            
+            # Creating the lag and rolling mean features from the congestion observed in
+            # both datasets, since the lags of the test rows may be observed in the train
+            # data
+            if self.lag_feature_config.enabled:
+                lag_features = create_lag_features(
+                    pd.concat([train_data, test_data], keys=['train', 'test']), self.lag_feature_config
+                )
+                train_data = train_data.join(lag_features.loc['train'])
+                test_data = test_data.join(lag_features.loc['test'])
             
             # Conducting feature engineering on the train and test data and dropping
             # any features that are not required
@@ -170,13 +267,28 @@ class DataTransformation():
             train_input_features = preprocessor.fit_transform(train_features, train_target)
             test_input_features = preprocessor.transform(test_features)
             
-            # Concatenating the train and test sets
+            # Concatenating the train and test sets, along with the month and the
+            # roadway segment used to partition the feature store, and the time
             train_data_combined = pd.concat([train_input_features, train_target], axis=1)
             test_data_combined = pd.concat([test_input_features, test_target], axis=1)
+            train_data_combined['month'] = train_month
+            train_data_combined['segment'] = train_df['x_y_direction']
+            train_data_combined['time'] = train_time
+            test_data_combined['month'] = test_month
+            test_data_combined['segment'] = test_df['x_y_direction']
+            test_data_combined['time'] = test_time
+            
+            # Casting the transformed data to the dtypes of the data schema
+            train_data_combined = self.data_schema.enforce_features(train_data_combined, 'transformed_train')
+            test_data_combined = self.data_schema.enforce_features(test_data_combined, 'transformed_test')
+            self.data_schema.log_memory_report()
             
-            # Saving the preprocessor object
+            # Saving the preprocessor object, the inference plan compiled from it and the
+            # segment dictionary
             if save_object:
                 joblib.dump(preprocessor, self.data_transformation_config.preprocessor_obj_path)
+                InferencePlan.from_preprocessor(preprocessor).save(self.data_transformation_config.inference_plan_path)
+                self.segment_dictionary.save(self.data_transformation_config.segment_dictionary_path)
             
             logging.info('Data transformation process completed and preprocessor object saved.')
             
@@ -184,6 +296,330 @@ class DataTransformation():
                 train_data_combined,
                 test_data_combined
             )  
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to find the chronological holdout cutoff after a new partition
+    def get_holdout_cutoff(self, new_data_path:str):
+        '''
+        This method returns the time from which the rows are in the test dataset once a
+        new partition is added. The cutoff selects the most recent "test_size" fraction
+        of the rows of the feature store and of the new partition, as holdout_split does,
+        but is never earlier than the first test row, so no train row becomes a test row.
+        Only the time columns are read.
+        ===============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        new_data_path : str - The path to the new partition of raw data.
+        
+        ----------------
+        Returns:
+        ----------------
+        holdout_cutoff : datetime64 - The time from which the rows are in the test
+        dataset.
+        ================================================================================
+        '''
+        try:
+            time_column = self.time_split_config.time_column
+            feature_store = FeatureStoreCreation()
+            train_times, test_times = (
+                feature_store.read_feature_store(dataset_path, columns=[time_column])[time_column].to_numpy()
+                for dataset_path in (self.feature_store_config.xform_train_path, self.feature_store_config.xform_test_path)
+            )
+            new_times = self.data_schema.enforce_raw_table(pq.read_table(new_data_path, columns=[time_column]))[time_column].to_numpy()
+            cutoff = TimeSplit(test_size=self.time_split_config.test_size).holdout_cutoff(
+                np.concatenate([train_times, test_times, new_times])
+            )
+            return max(cutoff, test_times.min())
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to replace the saved artifacts with the staged ones
+    def commit_artifacts(self):
+        '''
+        This method replaces the saved preprocessor object, inference plan and segment
+        dictionary with the ones staged by the incremental data transformation. Each file
+        is renamed, so a reader never sees a partially written artifact.
+        '''
+        try:
+            for staged_path, path in self.staged_artifacts:
+                os.replace(staged_path, path)
+            self.staged_artifacts = []
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read a parquet file one batch of rows at a time
+    def read_batches(self, data_path:str, start_time=None, end_time=None):
+        '''
+        This method reads a parquet file one batch of rows at a time. The "row_id"
+        column, if present, is not read, and the batches are cast to the dtypes of the
+        data schema. If a start or end time is given, only the rows from the start time
+        and before the end time are kept, and empty batches are skipped.
+        ===============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        data_path : str - The path to the parquet file.
+        start_time : datetime64 - The time of the first rows to keep.
+        end_time : datetime64 - The time from which the rows are not kept.
+        
+        ----------------
+        Returns:
+        ----------------
+        batches : generator - A generator of pandas dataframes.
+        ================================================================================
+        '''
+        try:
+            parquet_file = pq.ParquetFile(data_path)
+            columns = [col for col in parquet_file.schema_arrow.names if col != 'row_id']
+            for batch in parquet_file.iter_batches(batch_size=self.streaming_config.batch_size, columns=columns):
+                batch_df = self.data_schema.enforce_raw(batch.to_pandas())
+                if start_time is not None:
+                    batch_df = batch_df[batch_df['time'].to_numpy() >= start_time]
+                if end_time is not None:
+                    batch_df = batch_df[batch_df['time'].to_numpy() < end_time]
+                if len(batch_df):
+                    yield batch_df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to transform a parquet file one batch of rows at a time
+    def transform_batches(self, preprocessor, data_path:str, start_time=None, end_time=None):
+        '''
+        This method transforms a parquet file one batch of rows at a time, using a fitted
+        preprocessor object. If a start or end time is given, only the rows from the start
+        time and before the end time are transformed.
+        ===============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        preprocessor : ColumnTransformer - The fitted preprocessor object.
+        data_path : str - The path to the parquet file.
+        start_time : datetime64 - The time of the first rows to transform.
+        end_time : datetime64 - The time from which the rows are not transformed.
+        
+        ----------------
+        Returns:
+        ----------------
+        batches : generator - A generator of transformed pandas dataframes, which
+        contain the transformed features, the target, the month and roadway segment
+        used to partition the feature store and the time of each row, with the dtypes
+        of the data schema.
+        ================================================================================
+        '''
+        try:
+            # Setting the output of the preprocessor explicitly, since the batches may be
+            # consumed in a thread which does not share the global sklearn configuration
+            preprocessor.set_output(transform='pandas')
+            for batch_df in self.read_batches(data_path, start_time, end_time):
+                month = self.create_month_key(batch_df)
+                time = batch_df['time']
+                features = self.generate_features(batch_df)
+                target = features.pop('congestion')
+                transformed_batch = preprocessor.transform(features)
+                transformed_batch['congestion'] = target
+                transformed_batch['month'] = month
+                transformed_batch['segment'] = features['x_y_direction']
+                transformed_batch['time'] = time
+                yield self.data_schema.enforce_features(transformed_batch, 'transformed_batches')
+            self.data_schema.log_memory_report()
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to initiate the data transformation process in a streaming mode
+    @instrument()
+    def initiate_streaming_data_transformation(self, train_data_path:str, test_data_path:str, save_object=True):
+        '''
+        This method performs the data transformation on the feature set one batch of rows
+        at a time, so that the memory used is bounded by the size of one batch. In a first
+        pass over the train data, the preprocessor object is fitted on the first batch and
+        the mean encoder then accumulates the sum and count of the target for each
+        category from the remaining batches. The train and test data are then transformed
+        lazily, in a second pass, as the returned generators are consumed.
+        ===============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        train_data_path : str - The path in which the training data is stored.
+        test_data_path : str - The path in which the test data is stored.
+        save_object : bool - If True, the preprocessor object is saved.
+        
+        ----------------
+        Returns:
+        ----------------
+        train_batches : generator - The transformed train data, one batch at a time.
+        test_batches : generator - The transformed test data, one batch at a time.
+        ================================================================================
+        '''
+        try:
+            logging.info('Starting the streaming data transformation process.')
+            
+            if self.lag_feature_config.enabled:
+                raise ValueError('The lag features require the in-memory data transformation.')
+            
+            # Fitting the dictionary of the roadway segments, reading only their columns
+            self.segment_dictionary = SegmentDictionary.fit_parquet(
+                [train_data_path, test_data_path], self.streaming_config.batch_size
+            )
             
+            # Fitting the preprocessor object one batch at a time
+            preprocessor = self.create_preprocessor_obj()
+            mean_encoder = None
+            for batch_df in self.read_batches(train_data_path):
+                features = self.generate_features(batch_df)
+                target = features.pop('congestion')
+                if mean_encoder is None:
+                    preprocessor.fit(features, target)
+                    mean_encoder = preprocessor.named_transformers_['me_pipeline']['mean_encoder']
+                else:
+                    mean_encoder.partial_fit(features[mean_encoder.variables_], target)
+            
+            # Saving the preprocessor object, the inference plan compiled from it and the
+            # segment dictionary
+            if save_object:
+                joblib.dump(preprocessor, self.data_transformation_config.preprocessor_obj_path)
+                InferencePlan.from_preprocessor(preprocessor).save(self.data_transformation_config.inference_plan_path)
+                self.segment_dictionary.save(self.data_transformation_config.segment_dictionary_path)
+            
+            logging.info('Preprocessor object fitted on the streamed train data.')
+            
+            return (
+                self.transform_batches(preprocessor, train_data_path),
+                self.transform_batches(preprocessor, test_data_path)
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to update the preprocessor object with a new partition of data
+    @instrument()
+    def initiate_incremental_data_transformation(self, new_data_path:str, feature_store_metadata:dict):
+        '''
+        This method updates the saved preprocessor object with a new partition of train
+        data, without refitting it on the data it has already seen. The mean encoder adds
+        the sum and count of the target for each category in the new partition to its
+        running totals, so the update costs O(new rows). The new partition is then
+        transformed lazily, one batch at a time, as the returned generators are consumed.
+        With the chronological split strategy, the holdout cutoff is computed again over
+        the times of the feature store and of the new partition, as in holdout_split, and
+        never moves back. The rows of the new partition from the cutoff on are returned
+        as holdout rows for the test dataset, and only the rows before the cutoff, along
+        with the test rows that the cutoff moves to the train dataset, update the mean
+        encoder, so no test row is encoded with its own target.
+        The updated preprocessor object, inference plan and segment dictionary are
+        staged next to the saved ones, and only replace them when commit_artifacts is
+        called once the partition has been written, so a failed write can be retried
+        without adding the partition to the running totals twice.
+        A full rebuild of the feature store is required when the saved preprocessor
+        object does not keep running totals, or when the schema of the new partition or
+        of the transformed data differs from the feature store.
+        ===============================================================================
+        ----------------
+        Parameters:
+        ----------------
+        new_data_path : str - The path to the new partition of raw train data.
+        feature_store_metadata : dict - The metadata of the current feature store.
+        
+        ----------------
+        Returns:
+        ----------------
+        partition_name : str - The name of the new partition.
+        new_batches : generator - The transformed train rows of the new partition, one
+        batch at a time.
+        holdout_batches : generator - The transformed holdout rows of the new partition,
+        one batch at a time, or None with the random split strategy.
+        holdout_cutoff : datetime64 - The time from which the rows are in the test
+        dataset, or None with the random split strategy.
+        ================================================================================
+        '''
+        try:
+            logging.info(f'Starting the incremental data transformation of {new_data_path}.')
+            
+            if self.lag_feature_config.enabled:
+                raise ValueError('The lag features require the in-memory data transformation.')
+            
+            # Checking that the new partition has not been applied already
+            partition_name = os.path.splitext(os.path.basename(new_data_path))[0]
+            if partition_name in [partition['name'] for partition in feature_store_metadata['partitions']]:
+                raise ValueError(f'The partition {partition_name} is already in the feature store.')
+            
+            # Checking that the new partition has the same schema as the raw data
+            raw_columns = [col for col in pq.ParquetFile(new_data_path).schema_arrow.names if col != 'row_id']
+            if sorted(raw_columns) != sorted(feature_store_metadata['raw_columns']):
+                raise ValueError(
+                    f'The columns of {new_data_path} do not match the feature store. A full rebuild is required.'
+                )
+            
+            # Checking that the saved preprocessor object keeps running totals
+            preprocessor = joblib.load(self.data_transformation_config.preprocessor_obj_path)
+            mean_encoder = preprocessor.named_transformers_['me_pipeline']['mean_encoder']
+            if not hasattr(mean_encoder, 'partial_fit'):
+                raise ValueError('The saved preprocessor object cannot be updated. A full rebuild is required.')
+            expected_columns = list(preprocessor.get_feature_names_out()) + ['congestion'] + self.feature_store_config.key_columns
+            if expected_columns != feature_store_metadata['feature_columns']:
+                raise ValueError('The preprocessor object does not match the feature store. A full rebuild is required.')
+            if 'feature_dtypes' not in feature_store_metadata:
+                raise ValueError('The feature store was written without the data schema. A full rebuild is required.')
+            
+            # Adding the new roadway segments of the partition to the segment dictionary,
+            # which keeps the codes of the segments already in the feature store
+            segment_dictionary_path = self.data_transformation_config.segment_dictionary_path
+            if not os.path.exists(segment_dictionary_path):
+                raise ValueError('The segment dictionary is missing. A full rebuild is required.')
+            self.segment_dictionary = SegmentDictionary(SegmentDictionary.load(segment_dictionary_path).segments)
+            self.segment_dictionary.partial_fit_segments(
+                SegmentDictionary.fit_parquet([new_data_path], self.streaming_config.batch_size).segments
+            )
+            
+            # Finding the time from which the rows are in the test dataset
+            holdout_cutoff = None
+            if self.time_split_config.strategy == 'chronological':
+                holdout_cutoff = self.get_holdout_cutoff(new_data_path)
+            
+            # Updating the mean encoder with the train rows of the new partition
+            for batch_df in self.read_batches(new_data_path, end_time=holdout_cutoff):
+                features = self.generate_features(batch_df)
+                target = features.pop('congestion')
+                mean_encoder.partial_fit(features[mean_encoder.variables_], target)
+            
+            # Updating the mean encoder with the test rows which are moved to the train
+            # dataset. The roadway segment key of the feature store holds the same
+            # labels as the encoded feature.
+            if holdout_cutoff is not None:
+                for batch_df in FeatureStoreCreation().read_feature_store_batches(
+                    self.feature_store_config.xform_test_path,
+                    columns=['segment', 'congestion'],
+                    filter=ds.field(self.time_split_config.time_column) < holdout_cutoff
+                ):
+                    features = pd.DataFrame({'x_y_direction': batch_df['segment']})
+                    mean_encoder.partial_fit(features, batch_df['congestion'])
+            
+            # Staging the updated preprocessor object, the inference plan and the segment
+            # dictionary, which replace the saved ones once the partition is written
+            config = self.data_transformation_config
+            self.staged_artifacts = [
+                (f'{path}.staged', path)
+                for path in (config.preprocessor_obj_path, config.inference_plan_path, segment_dictionary_path)
+            ]
+            staged_paths = [staged_path for staged_path, _ in self.staged_artifacts]
+            joblib.dump(preprocessor, staged_paths[0])
+            InferencePlan.from_preprocessor(preprocessor).save(staged_paths[1])
+            self.segment_dictionary.save(staged_paths[2])
+            
+            logging.info(f'Preprocessor object updated with the partition {partition_name} and staged.')
+            
+            return (
+                partition_name,
+                self.transform_batches(preprocessor, new_data_path, end_time=holdout_cutoff),
+                None if holdout_cutoff is None else self.transform_batches(preprocessor, new_data_path, start_time=holdout_cutoff),
+                holdout_cutoff
+            )
+        
         except Exception as e:
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
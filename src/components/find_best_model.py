@@ -1,21 +1,42 @@
 # Import packages
 import sys
+import time
+import itertools
+import numpy as np
 import pandas as pd
-from sklearn import set_config 
-set_config(transform_output='pandas') 
-from src.exception import CustomException 
+import xgboost as xgb
+from sklearn import set_config
+set_config(transform_output='pandas')
+from src.exception import CustomException
 from src.logger import logging
 from src.components.config_entity import ModelTrainerConfig
+from src.components.config_entity import TimeSplitConfig
+from src.components.time_split import TimeSplit
+from src.instrumentation import instrument
+from sklearn.base import clone
 from sklearn.model_selection import train_test_split
+from sklearn.model_selection import KFold
 from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import mean_squared_error 
+from sklearn.model_selection import RandomizedSearchCV
+from sklearn.experimental import enable_halving_search_cv
+from sklearn.model_selection import HalvingGridSearchCV
+from sklearn.metrics import mean_squared_error
 
 # Creating a class to find the best model
 class FindBestModel():
     '''
-    This class contains methods to find the best model. The class contains two methods -
-    a constructor and a method to find the best model.
+    This class contains methods to find the best model. The search strategy is pluggable:
+    an exhaustive grid search, a successive halving search over rows or boosting rounds,
+    a randomized search, a search which uses the native early stopping of XGBoost on a
+    validation fold to pick the number of boosting rounds, or an exhaustive search which
+    reuses one quantile matrix per fold for every candidate. With the chronological split
+    strategy, the folds are rolling-origin folds over the rows, which must be sorted by
+    time. The wall-clock time and the number of fits of the last search are stored in
+    the search_report_ attribute.
     '''
+    # Defining the available search strategies
+    search_strategies = ('grid', 'halving', 'random', 'early_stopping', 'dmatrix')
+    
     # Creating the constructor method for the class
     def __init__(self):
         '''
@@ -23,15 +44,35 @@ class FindBestModel():
         the path to the transformed datasets.
         '''
         self.model_trainer_config = ModelTrainerConfig()
+        self.time_split_config = TimeSplitConfig()
+        self.search_report_ = None
+    
+    # Creating a method to create the cross-validation folds
+    def get_cv(self, cv):
+        '''
+        This method returns the folds of a search. A number of folds is turned into
+        rolling-origin folds with the chronological split strategy, and into k-fold
+        splits otherwise.
+        '''
+        if isinstance(cv, int) and self.time_split_config.strategy == 'chronological':
+            return TimeSplit(n_splits=cv)
+        return cv
     
     # Creating a method to find the best model
+    @instrument()
     def find_best_model(
         self,
         estimator=None,
         params=None,
         train_set=None,
         target_set=None,
-        cv=3
+        cv=3,
+        search_strategy='grid',
+        halving_resource='n_samples',
+        n_iter=10,
+        early_stopping_rounds=10,
+        random_state=42,
+        n_jobs=-1
     ):
         '''
         This method is used to find the best model, given the hyperparameters.
@@ -42,39 +83,339 @@ class FindBestModel():
         params : dict - This is the dictionary containing the hyperparameters for the model.
         train_set : pandas dataframe - This is the training dataset.
         target_set : pandas dataframe - This is the target dataset.
-        cv : int - This is the number of cross-validation folds.
+        cv : int or TimeSplit - This is the number of cross-validation folds, or the
+        rolling-origin folds.
+        search_strategy : str - One of "grid", "halving", "random", "early_stopping" or
+        "dmatrix".
+        halving_resource : str - The resource of the halving search, either "n_samples"
+        (rows) or "n_estimators" (boosting rounds).
+        n_iter : int - The number of sampled candidates of the randomized search.
+        early_stopping_rounds : int - The number of rounds without improvement on the
+        validation fold after which the early stopping search stops boosting.
+        random_state : int - The seed of the randomized search and the validation fold.
+        n_jobs : int - The number of search workers of the grid, halving and randomized
+        searches.
         
         ----------------
         Returns:
         ----------------
         best_model : xgboost model - This is the best model.
+        best_params : dict - This is the best hyperparameters for the best model.
         ==================================================================================
         '''
         try:
-            # Instantiating a Grid Search object
-            grid_search = GridSearchCV(
-                estimator=estimator,
-                param_grid=params,
-                cv=cv,
-                scoring='neg_mean_squared_error',
-                n_jobs=-1
+            if search_strategy not in self.search_strategies:
+                raise ValueError(f'Unknown search strategy {search_strategy}. Expected one of {self.search_strategies}.')
+            
+            start_time = time.perf_counter()
+            cv = self.get_cv(cv)
+            if search_strategy == 'early_stopping':
+                best_model, best_params, n_fits = self.early_stopping_search(
+                    estimator, params, train_set, target_set, cv, early_stopping_rounds, random_state
+                )
+            elif search_strategy == 'dmatrix':
+                best_model, best_params, n_fits = self.dmatrix_search(
+                    estimator, params, train_set, target_set, cv
+                )
+            else:
+                if search_strategy == 'grid':
+                    # Instantiating a Grid Search object
+                    search = GridSearchCV(
+                        estimator=estimator,
+                        param_grid=params,
+                        cv=cv,
+                        scoring='neg_mean_squared_error',
+                        n_jobs=n_jobs
+                    )
+                elif search_strategy == 'halving':
+                    # Instantiating a successive halving search object. When the boosting
+                    # rounds are the resource, they are not a grid axis.
+                    search_params = dict(params)
+                    halving_kwargs = {}
+                    if halving_resource == 'n_estimators':
+                        halving_kwargs['max_resources'] = max(search_params.pop('n_estimators', [estimator.get_params()['n_estimators'] or 100]))
+                    search = HalvingGridSearchCV(
+                        estimator=estimator,
+                        param_grid=search_params,
+                        cv=cv,
+                        scoring='neg_mean_squared_error',
+                        resource=halving_resource,
+                        factor=3,
+                        random_state=random_state,
+                        n_jobs=n_jobs,
+                        **halving_kwargs
+                    )
+                else:
+                    # Instantiating a randomized search object
+                    search = RandomizedSearchCV(
+                        estimator=estimator,
+                        param_distributions=params,
+                        n_iter=n_iter,
+                        cv=cv,
+                        scoring='neg_mean_squared_error',
+                        random_state=random_state,
+                        n_jobs=n_jobs
+                    )
+                
+                # Fitting the train and target set to the search object
+                search.fit(train_set, target_set)
+                
+                # Extracting the best model and the best parameters
+                best_model = search.best_estimator_
+                best_params = search.best_params_
+                if search_strategy == 'halving' and halving_resource == 'n_estimators':
+                    best_params = {**best_params, 'n_estimators': int(best_model.get_params()['n_estimators'])}
+                
+                # Counting the fits, including the final refit of the best model
+                if search_strategy == 'halving':
+                    n_fits = int(np.sum(search.n_candidates_)) * search.n_splits_ + 1
+                else:
+                    n_fits = len(search.cv_results_['params']) * search.n_splits_ + 1
+            
+            # Recording the wall-clock time and the number of fits of the search
+            self.search_report_ = {
+                'search_strategy': search_strategy,
+                'wall_time': time.perf_counter() - start_time,
+                'n_fits': n_fits,
+                'best_params': best_params
+            }
+            logging.info(f'Search report: {self.search_report_}')
+            
+            return (
+                best_model,
+                best_params
             )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to search the hyperparameters with early stopping
+    def early_stopping_search(
+        self,
+        estimator,
+        params,
+        train_set,
+        target_set,
+        cv=3,
+        early_stopping_rounds=10,
+        random_state=42
+    ):
+        '''
+        This method searches the hyperparameters other than the number of boosting rounds
+        exhaustively. Each candidate is fitted once, with the largest number of boosting
+        rounds in the grid, and the native early stopping of XGBoost picks the number of
+        rounds on a validation fold. With rolling-origin folds, the validation fold is the
+        most recent block of rows and the candidates are fitted on the rows before it.
+        Otherwise, it holds a random 1/cv of the training rows. The best candidate is
+        then refitted on all the rows.
+        =================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        estimator : XGBRegressor - This is the estimator to tune.
+        params : dict - This is the dictionary containing the hyperparameters for the model.
+        train_set : pandas dataframe - This is the training dataset.
+        target_set : pandas dataframe - This is the target dataset.
+        cv : int or TimeSplit - This determines the validation fold.
+        early_stopping_rounds : int - The number of rounds without improvement after which
+        boosting stops.
+        random_state : int - The seed of the validation fold.
+        
+        ----------------
+        Returns:
+        ----------------
+        best_model : xgboost model - This is the best model.
+        best_params : dict - This is the best hyperparameters for the best model.
+        n_fits : int - This is the number of fits.
+        ==================================================================================
+        '''
+        try:
+            # Splitting off the validation fold, as views of the rows with rolling-origin
+            # folds
+            if isinstance(cv, TimeSplit):
+                fit_range, val_range = cv.fold_ranges(len(train_set))[-1]
+                X_fit, X_val = TimeSplit.select(train_set, fit_range), TimeSplit.select(train_set, val_range)
+                y_fit, y_val = TimeSplit.select(target_set, fit_range), TimeSplit.select(target_set, val_range)
+            else:
+                X_fit, X_val, y_fit, y_val = train_test_split(
+                    train_set, target_set, test_size=1 / cv, random_state=random_state
+                )
             
-            # Fitting the train and target set to the grid search object
-            grid_search.fit(train_set, target_set)
+            # Removing the boosting rounds from the grid
+            search_params = dict(params)
+            max_rounds = max(search_params.pop('n_estimators', [estimator.get_params()['n_estimators'] or 100]))
+            names = list(search_params)
             
-            # Extracting the best model 
-            best_model = grid_search.best_estimator_
+            # Fitting each candidate once and reading the best number of rounds
+            best_score = None
+            best_params = None
+            n_fits = 0
+            for values in itertools.product(*search_params.values()):
+                candidate = dict(zip(names, values))
+                model = clone(estimator).set_params(
+                    n_estimators=max_rounds, early_stopping_rounds=early_stopping_rounds, **candidate
+                )
+                model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+                n_fits += 1
+                score = mean_squared_error(y_val, model.predict(X_val, iteration_range=(0, model.best_iteration + 1)))
+                if best_score is None or score < best_score:
+                    best_score = score
+                    best_params = {**candidate, 'n_estimators': int(model.best_iteration + 1)}
             
-            # Extracting the best parameters
-            best_params = grid_search.best_params_
+            # Refitting the best candidate on all the rows
+            best_model = clone(estimator).set_params(**best_params)
+            best_model.fit(train_set, target_set)
+            n_fits += 1
             
             return (
                 best_model,
-                best_params
+                best_params,
+                n_fits
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to search the hyperparameters with one quantile matrix per fold
+    def dmatrix_search(
+        self,
+        estimator,
+        params,
+        train_set,
+        target_set,
+        cv=3
+    ):
+        '''
+        This method searches the hyperparameters exhaustively, with the same folds and
+        score as the grid search, but without rebuilding the data for each candidate.
+        A QuantileDMatrix is built once per fold, with the histogram quantiles of the
+        training rows, and reused by every candidate, which is trained with xgb.train
+        and the "hist" tree method. The number of boosting rounds is not trained
+        separately: each candidate is trained once with the largest number of rounds,
+        and the smaller numbers of rounds are scored with the iteration_range of the
+        predictions. The rows of the rolling-origin folds are views of the training rows.
+        The best candidate is refitted on all the rows.
+        =================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        estimator : XGBRegressor - This is the estimator to tune.
+        params : dict - This is the dictionary containing the hyperparameters for the model.
+        train_set : pandas dataframe - This is the training dataset.
+        target_set : pandas dataframe - This is the target dataset.
+        cv : int or TimeSplit - This is the number of cross-validation folds, or the
+        rolling-origin folds.
+        
+        ----------------
+        Returns:
+        ----------------
+        best_model : xgboost model - This is the best model.
+        best_params : dict - This is the best hyperparameters for the best model.
+        n_fits : int - This is the number of fits.
+        ==================================================================================
+        '''
+        try:
+            # Reading the booster parameters of the estimator
+            base_params = {key: value for key, value in estimator.get_xgb_params().items() if value is not None}
+            base_params['tree_method'] = 'hist'
+            
+            # Removing the boosting rounds from the grid
+            search_params = dict(params)
+            rounds = sorted(search_params.pop('n_estimators', [estimator.get_params()['n_estimators'] or 100]))
+            names = list(search_params)
+            candidates = [dict(zip(names, values)) for values in itertools.product(*search_params.values())]
+            
+            # Building the quantile matrices once per fold
+            X = train_set.to_numpy(dtype=np.float32) if hasattr(train_set, 'to_numpy') else np.asarray(train_set, dtype=np.float32)
+            y = np.asarray(target_set, dtype=np.float32)
+            if isinstance(cv, TimeSplit):
+                splits = cv.fold_ranges(len(X))
+            else:
+                splits = KFold(n_splits=cv).split(X)
+            folds = []
+            for train_index, val_index in splits:
+                dtrain = xgb.QuantileDMatrix(X[train_index], y[train_index], max_bin=base_params.get('max_bin', 256))
+                dval = xgb.QuantileDMatrix(X[val_index], ref=dtrain)
+                folds.append((dtrain, dval, y[val_index]))
+            
+            # Training each candidate once per fold, and scoring every number of rounds
+            n_splits = len(folds)
+            scores = np.zeros((len(candidates), len(rounds)))
+            n_fits = 0
+            for i, candidate in enumerate(candidates):
+                for dtrain, dval, y_val in folds:
+                    booster = xgb.train({**base_params, **candidate}, dtrain, num_boost_round=rounds[-1])
+                    n_fits += 1
+                    for j, num_rounds in enumerate(rounds):
+                        y_pred = booster.predict(dval, iteration_range=(0, num_rounds))
+                        scores[i, j] += mean_squared_error(y_val, y_pred) / n_splits
+            
+            # Refitting the best candidate on all the rows
+            i, j = np.unravel_index(np.argmin(scores), scores.shape)
+            best_params = {**candidates[i], 'n_estimators': int(rounds[j])}
+            best_model = clone(estimator).set_params(tree_method='hist', **best_params)
+            best_model.fit(train_set, target_set)
+            n_fits += 1
+            
+            return (
+                best_model,
+                best_params,
+                n_fits
             )
         
         except Exception as e:
             raise CustomException(e, sys)
+    
+    # Creating a method to compare the search strategies
+    def compare_search_strategies(
+        self,
+        estimator=None,
+        params=None,
+        train_set=None,
+        target_set=None,
+        test_set=None,
+        test_target_set=None,
+        search_strategies=None,
+        **search_kwargs
+    ):
+        '''
+        This method runs the same search with each strategy, and reports the wall-clock
+        time, the number of fits, the test RMSE, and the speedup over the grid search.
+        =================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        estimator : XGBRegressor - This is the estimator to tune.
+        params : dict - This is the dictionary containing the hyperparameters for the model.
+        train_set : pandas dataframe - This is the training dataset.
+        target_set : pandas dataframe - This is the target dataset.
+        test_set : pandas dataframe - This is the test dataset.
+        test_target_set : pandas dataframe - This is the test target dataset.
+        search_strategies : list - The strategies to compare. Defaults to all of them.
         
-        
\ No newline at end of file
+        ----------------
+        Returns:
+        ----------------
+        report : pandas dataframe - One row per strategy.
+        ==================================================================================
+        '''
+        try:
+            rows = []
+            for search_strategy in search_strategies or self.search_strategies:
+                best_model, _ = self.find_best_model(
+                    estimator, params, train_set, target_set, search_strategy=search_strategy, **search_kwargs
+                )
+                report = dict(self.search_report_)
+                report['rmse'] = float(np.sqrt(mean_squared_error(test_target_set, best_model.predict(test_set))))
+                rows.append(report)
+            
+            report = pd.DataFrame(rows)
+            if 'grid' in report['search_strategy'].values:
+                grid_time = report.loc[report['search_strategy'] == 'grid', 'wall_time'].iloc[0]
+                report['speedup'] = grid_time / report['wall_time']
+            
+            return report
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
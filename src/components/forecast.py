@@ -0,0 +1,265 @@
+# Importing packages
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from datetime import datetime
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import ForecastConfig
+from src.components.make_predictions import MakePredictions
+from src.lag_features import get_lag_feature_names
+from src.lag_features import get_segment_history
+
+
+# Creating a class to hold the forecast of every segment over a grid of time slots
+class Forecast():
+    '''
+    This class holds the predictions of a model for every roadway segment of the
+    inference plan and every time slot of a grid, as a (n_segments, n_slots) array.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, model_version, segments, times, values):
+        '''
+        This is the constructor for the Forecast class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_version : str - The version of the model which made the forecast.
+        segments : list - The "x_y_direction" of each row of the forecast.
+        times : np.ndarray - The start time of each time slot, as datetime64 values.
+        values : np.ndarray - The (n_segments, n_slots) predictions.
+        ===================================================================================
+        '''
+        self.model_version = str(model_version)
+        self.segments = list(segments)
+        self.times = np.asarray(times, dtype='datetime64[ns]')
+        self.values = np.asarray(values, dtype=np.float32)
+    
+    # Creating a method to select a range of time slots
+    def slice(self, start, stop):
+        '''
+        This method returns the forecast of the time slots from start to stop.
+        '''
+        return Forecast(self.model_version, self.segments, self.times[start:stop], self.values[:, start:stop])
+    
+    # Creating a method to join the forecasts of consecutive grids
+    def concat(self, other):
+        '''
+        This method returns the forecast of this grid followed by the grid of other.
+        '''
+        return Forecast(
+            self.model_version, self.segments,
+            np.concatenate([self.times, other.times]),
+            np.hstack([self.values, other.values])
+        )
+    
+    # Creating a method to convert the forecast into a dataframe
+    def to_frame(self):
+        '''
+        This method returns the forecast as a dataframe with one row per segment and time
+        slot, and the "time", "x", "y", "direction" and "prediction" columns.
+        '''
+        x, y, direction = zip(*(segment.split('_') for segment in self.segments))
+        n_slots = len(self.times)
+        return pd.DataFrame({
+            'time': np.tile(self.times, len(self.segments)),
+            'x': np.repeat(np.array(x, dtype=np.int64), n_slots),
+            'y': np.repeat(np.array(y, dtype=np.int64), n_slots),
+            'direction': np.repeat(np.array(direction), n_slots),
+            'prediction': self.values.ravel()
+        })
+    
+    # Creating a method to convert the forecast into a json-serializable dictionary
+    def to_dict(self):
+        '''
+        This method returns the forecast as a dictionary, with the list of slot times and
+        the list of predictions of each segment.
+        '''
+        return {
+            'model_version': self.model_version,
+            'times': np.datetime_as_string(self.times, unit='m').tolist(),
+            'predictions': dict(zip(self.segments, self.values.round(4).tolist()))
+        }
+
+
+# Creating a class to forecast the congestion of every segment over a day
+class ForecastGenerator():
+    '''
+    This class forecasts the congestion of every roadway segment for every time slot of
+    a day. The time grid is generated as a NumPy array, the feature vectors of all the
+    segments and slots are gathered from the precomputed vectors of the inference plan,
+    and the model scores them in a single call. The forecasts are cached per model cache
+    key and date, so that repeated queries for the same day are not scored again, and a
+    new model or preprocessor object is never served an old forecast.
+    '''
+    # Creating the forecasts cached by all instances of the class, keyed by the cache key
+    # of the bundle, the model version and the date
+    _forecasts = OrderedDict()
+    _forecasts_lock = threading.Lock()
+    
+    # Creating the constructor for the class
+    def __init__(self):
+        '''
+        This is the constructor for the ForecastGenerator class.
+        '''
+        self.forecast_config = ForecastConfig()
+    
+    # Creating a method to replace the lock of the class in a forked process
+    @classmethod
+    def reset_lock(cls):
+        '''
+        This method replaces the lock of the forecast cache in a forked process.
+        '''
+        cls._forecasts_lock = threading.Lock()
+    
+    # Creating a method to generate the time grid of a day
+    def create_time_grid(self, date):
+        '''
+        This method returns the start time of each time slot of a day, as datetime64
+        values.
+        '''
+        slot = np.timedelta64(self.forecast_config.slot_minutes, 'm')
+        n_slots = 24 * 60 // self.forecast_config.slot_minutes
+        return np.datetime64(date, 'D').astype('datetime64[ns]') + np.arange(n_slots) * slot
+    
+    # Creating a method to score the time grid of a day
+    def score_day(self, bundle, plan, date):
+        '''
+        This method builds the feature vectors of every segment and time slot of a day,
+        and scores them with one call to the model.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        bundle : ModelBundle - The cached preprocessor object and model.
+        plan : InferencePlan - The inference plan compiled from the preprocessor object.
+        date : datetime.date - The day to forecast.
+        
+        ----------------
+        Returns:
+        ----------------
+        forecast : Forecast - The forecast of every segment and time slot of the day.
+        ===================================================================================
+        '''
+        try:
+            times = self.create_time_grid(date)
+            segments = sorted(plan.segment_means)
+            segment_means = np.array([plan.segment_means[segment] for segment in segments], dtype=np.float64)
+            
+            # Gathering the precomputed vector of the hour and weekend flag of each slot.
+            # The 1st of January 1970 was a Thursday, so Monday is day 0 of (days + 3) % 7.
+            hours = times.astype('datetime64[h]').astype(np.int64) % 24
+            weekend = ((times.astype('datetime64[D]').astype(np.int64) + 3) % 7 > 4).astype(np.int64)
+            features = np.broadcast_to(
+                plan.templates[hours, weekend], (len(segments), len(times), plan.templates.shape[-1])
+            ).copy()
+            features[..., plan.segment_index] = segment_means[:, None]
+            
+            # Reading the lag features known for each slot from the segment history
+            if plan.lag_features:
+                x, y, direction = zip(*(segment.split('_') for segment in segments))
+                lag_values = get_segment_history().get_features_batch(
+                    np.repeat(np.array(x, dtype=np.int64), len(times)),
+                    np.repeat(np.array(y, dtype=np.int64), len(times)),
+                    np.repeat(np.array(direction), len(times)),
+                    np.tile(times, len(segments))
+                )
+                lag_feature_names = get_lag_feature_names()
+                for name, index in plan.lag_features.items():
+                    position = lag_feature_names.index(name)
+                    features[..., index] = lag_values[:, position].reshape(len(segments), len(times))
+            
+            # Scoring all the feature vectors at once
+            preds = np.asarray(bundle.model.predict(features.reshape(-1, features.shape[-1])), dtype=np.float32)
+            return Forecast(bundle.model_version, segments, times, preds.reshape(len(segments), len(times)))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to fetch the forecast of a day
+    def forecast_day(self, date=None):
+        '''
+        This method returns the forecast of every segment and time slot of a day, which
+        defaults to today. The forecast is scored on the first query for a bundle and
+        date, and then served from the cache.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        date : datetime.date or str - The day to forecast.
+        
+        ----------------
+        Returns:
+        ----------------
+        forecast : Forecast - The forecast of every segment and time slot of the day.
+        ===================================================================================
+        '''
+        try:
+            date = pd.Timestamp(date or datetime.now()).date()
+            bundle, plan = MakePredictions().load_inference_plan()
+            key = (bundle.cache_key, bundle.model_version, date)
+            
+            # Serving the forecast from the cache. Forecasts which read lag features are
+            # not cached, since the segment history keeps changing.
+            with ForecastGenerator._forecasts_lock:
+                forecast = ForecastGenerator._forecasts.get(key)
+                if forecast is not None:
+                    ForecastGenerator._forecasts.move_to_end(key)
+                    return forecast
+            
+            forecast = self.score_day(bundle, plan, date)
+            if not plan.lag_features:
+                with ForecastGenerator._forecasts_lock:
+                    ForecastGenerator._forecasts[key] = forecast
+                    while len(ForecastGenerator._forecasts) > self.forecast_config.cache_size:
+                        ForecastGenerator._forecasts.popitem(last=False)
+            logging.info(f'Forecast for {date} scored with model {bundle.model_version}.')
+            return forecast
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to fetch the forecast of the next 24 hours
+    def forecast_next(self, start=None):
+        '''
+        This method returns the forecast of every segment for the time slots of the next
+        24 hours, from the slot which contains start, which defaults to the current time.
+        The forecast is assembled from the cached forecasts of the two days it spans.
+        '''
+        try:
+            start = pd.Timestamp(start or datetime.now())
+            slots_per_day = 24 * 60 // self.forecast_config.slot_minutes
+            first_slot = (start.hour * 60 + start.minute) // self.forecast_config.slot_minutes
+            today = self.forecast_day(start.date())
+            tomorrow = self.forecast_day(start.date() + pd.Timedelta(days=1))
+            return today.concat(tomorrow).slice(first_slot, first_slot + slots_per_day)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to save a forecast
+    def save(self, forecast, file_path=None):
+        '''
+        This method saves a forecast as a parquet file, with one row per segment and time
+        slot. The default path is named after the first day of the forecast.
+        '''
+        try:
+            if file_path is None:
+                first_day = np.datetime_as_string(forecast.times[0], unit='D')
+                file_path = os.path.join(self.forecast_config.forecast_dir, f'forecast_{first_day}.parquet')
+            os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+            forecast.to_frame().to_parquet(file_path, index=False)
+            logging.info(f'Forecast saved to {file_path}.')
+            return file_path
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Replacing the lock in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ForecastGenerator.reset_lock)
@@ -0,0 +1,216 @@
+# Importing packages
+import sys
+import json
+import numpy as np
+from datetime import datetime
+from src.exception import CustomException
+from src.lag_features import get_lag_feature_names
+
+
+# Creating a class to build the model features for a single request without pandas
+class InferencePlan():
+    '''
+    This class is a compiled version of the fitted preprocessor object, which is used to
+    build the feature vector for a single prediction without creating a pandas dataframe.
+    The plan holds a dictionary lookup from "x_y_direction" to its mean encoding, and a
+    precomputed feature vector for each of the 24 hours on weekdays and weekends, which
+    already contains the one hot encoded "am_pm" and "is_weekend" slots and the sine and
+    cosine of the hour. Building a feature vector is a copy of the precomputed vector and
+    a dictionary lookup. When the model uses the lag and rolling mean features of the
+    congestion, the plan also holds their positions in the vector, which are filled in
+    from the values passed with the request.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, feature_names, templates, segment_means, segment_index, unseen='ignore', lag_features=None):
+        '''
+        This is the constructor for the InferencePlan class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        feature_names : list - The names of the features output by the preprocessor.
+        templates : np.ndarray - The precomputed feature vectors, indexed by the hour and
+        the weekend flag.
+        segment_means : dict - The mean encoding for each "x_y_direction".
+        segment_index : int - The position of the mean encoded feature in the vector.
+        unseen : str - Whether to "ignore" (return NaN) or "raise" for unseen segments.
+        lag_features : dict - The position of each lag and rolling mean feature in the
+        vector, if the model uses them.
+        ===================================================================================
+        '''
+        self.feature_names = list(feature_names)
+        self.templates = np.asarray(templates, dtype=np.float64)
+        self.segment_means = dict(segment_means)
+        self.segment_index = int(segment_index)
+        self.unseen = unseen
+        self.lag_features = {name: int(index) for name, index in (lag_features or {}).items()}
+
+    # Creating a method to compile the plan from the fitted preprocessor object
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        '''
+        This method compiles the plan from the fitted preprocessor object created by
+        DataTransformation.create_preprocessor_obj.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        preprocessor : ColumnTransformer - The fitted preprocessor object.
+
+        ----------------
+        Returns:
+        ----------------
+        plan : InferencePlan - The compiled inference plan.
+        ===================================================================================
+        '''
+        try:
+            feature_names = list(preprocessor.get_feature_names_out())
+            n_features = len(feature_names)
+
+            # Creating the raw feature values for each hour and weekend flag. The sine
+            # and cosine are rounded to float32, like the features of the pandas path.
+            hours = np.arange(24)
+            raw_values = {
+                'hour_sin': np.sin(2 * np.pi * hours / 24).astype(np.float32),
+                'hour_cos': np.cos(2 * np.pi * hours / 24).astype(np.float32),
+                'am_pm': np.where(hours >= 12, 'PM', 'AM')
+            }
+
+            # Filling in the precomputed vectors column by column
+            templates = np.zeros((24, 2, n_features), dtype=np.float64)
+            segment_means = None
+            segment_index = None
+            unseen = 'ignore'
+            lag_features = {}
+            lag_feature_names = get_lag_feature_names()
+            for name, transformer, columns in preprocessor.transformers_:
+                if transformer == 'drop' or len(columns) == 0:
+                    continue
+                output_slice = preprocessor.output_indices_[name]
+                columns = [
+                    preprocessor.feature_names_in_[col] if isinstance(col, (int, np.integer)) else col
+                    for col in columns
+                ]
+                if name == 'ohe_pipeline':
+                    # Setting the one hot encoded slots for "am_pm" and "is_weekend"
+                    ohe = transformer.named_steps['ohe']
+                    position = output_slice.start
+                    for col, categories in zip(columns, ohe.categories_):
+                        for category in categories:
+                            if col == 'is_weekend':
+                                templates[:, int(bool(category)), position] = 1.0
+                            elif col == 'am_pm':
+                                templates[raw_values['am_pm'] == category, :, position] = 1.0
+                            else:
+                                raise ValueError(f'The inference plan does not support the feature {col}.')
+                            position += 1
+                elif name == 'me_pipeline':
+                    # Extracting the mean encoding of "x_y_direction"
+                    mean_encoder = transformer.named_steps['mean_encoder']
+                    segment_means = mean_encoder.encoder_dict_['x_y_direction']
+                    segment_index = output_slice.start
+                    unseen = getattr(mean_encoder, 'unseen', 'ignore')
+                elif name == 'remainder':
+                    # Setting the sine and cosine of the hour, and leaving the slots of the
+                    # lag features to be filled in for each request
+                    for offset, col in enumerate(columns):
+                        if col in lag_feature_names:
+                            lag_features[col] = output_slice.start + offset
+                            templates[:, :, output_slice.start + offset] = np.nan
+                        elif col in ('hour_sin', 'hour_cos'):
+                            templates[:, :, output_slice.start + offset] = raw_values[col][:, None]
+                        else:
+                            raise ValueError(f'The inference plan does not support the feature {col}.')
+                else:
+                    raise ValueError(f'The inference plan does not support the transformer {name}.')
+
+            if segment_means is None:
+                raise ValueError('The preprocessor object does not mean encode "x_y_direction".')
+
+            return cls(feature_names, templates, segment_means, segment_index, unseen, lag_features)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to build the feature vector for a single request
+    def build_features(self, x, y, direction, time=None, lag_values=None):
+        '''
+        This method builds the feature vector for a single request.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        lag_values : dict - The lag and rolling mean features of the request, if the model
+        uses them. Missing features are NaN.
+
+        ----------------
+        Returns:
+        ----------------
+        features : np.ndarray - A (1, n_features) array in the order of the preprocessor
+        output.
+        ===================================================================================
+        '''
+        try:
+            if time is None:
+                time = datetime.now()
+
+            # Copying the precomputed vector for the hour and weekend flag
+            features = self.templates[time.hour, int(time.weekday() > 4)].copy()
+
+            # Looking up the mean encoding of the roadway segment
+            segment = f'{int(x)}_{int(y)}_{direction}'
+            segment_mean = self.segment_means.get(segment)
+            if segment_mean is None:
+                if self.unseen == 'raise':
+                    raise ValueError(f'The roadway segment {segment} was not seen during training.')
+                segment_mean = np.nan
+            features[self.segment_index] = segment_mean
+
+            # Filling in the lag and rolling mean features
+            if self.lag_features and lag_values is not None:
+                for name, index in self.lag_features.items():
+                    features[index] = lag_values.get(name, np.nan)
+
+            return features.reshape(1, -1)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to save the plan as a json file
+    def save(self, file_path):
+        '''
+        This method saves the plan as a json file, so that it can be loaded without the
+        preprocessor object.
+        '''
+        try:
+            plan = {
+                'feature_names': self.feature_names,
+                'templates': self.templates.tolist(),
+                'segment_means': self.segment_means,
+                'segment_index': self.segment_index,
+                'unseen': self.unseen,
+                'lag_features': self.lag_features
+            }
+            with open(file_path, 'w') as file_obj:
+                json.dump(plan, file_obj)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to load the plan from a json file
+    @classmethod
+    def load(cls, file_path):
+        '''
+        This method loads a plan that was saved as a json file.
+        '''
+        try:
+            with open(file_path, 'r') as file_obj:
+                plan = json.load(file_obj)
+            return cls(**plan)
+
+        except Exception as e:
+            raise CustomException(e, sys)
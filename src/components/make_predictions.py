@@ -1,23 +1,57 @@
 # Importing packages
+import os
 import sys
+import time
+import threading
+import numpy as np
 import pandas as pd
-import mlflow
-import dagshub
-import joblib
-from sklearn import set_config
-set_config(transform_output='pandas')
-from src.utils import load_run_params
-from src.utils import read_json_file
+from src.run_utils import load_run_params
+from src.run_utils import read_json_file
 from src.exception import CustomException
+from src.logger import logging
 from src.components.config_entity import DataTransformationConfig
-from src.components.data_transformation import DataTransformation
+from src.components.model_cache import ModelCache
+from src.components.model_store import LocalModelStore
+from src.components.native_booster import NativeBoosterModel
+from src.components.inference_plan import InferencePlan
+from src.components.prediction_table import PredictionTable
+from src.components.metrics import record_stage
+from src.lag_features import get_lag_feature_names
+from src.lag_features import get_segment_history
 
 # Creating a class to make predictions based on the data provided by the user
 class MakePredictions():
     '''
     This class is responsible for making predictions on the data received from 
-    the website.
+    the website. The preprocessor object and the model are kept in a model cache that
+    is shared by every instance of the class, so they are only loaded once per process.
     '''
+    # Creating the model cache shared by all instances of the class
+    model_cache = ModelCache()
+    
+    # Creating the inference plan compiled from the cached preprocessor object. The
+    # plan is stored with the cache key of the bundle it was compiled from.
+    _inference_plan = (None, None)
+    _inference_plan_lock = threading.Lock()
+    
+    # Creating the prediction table of the cached model. The table is stored with the
+    # model version it was scored with, and the time at which it was last looked for.
+    _prediction_table = (None, None, 0.0)
+    _prediction_table_lock = threading.Lock()
+    
+    # Creating a method to replace the locks of the class in a forked process
+    @classmethod
+    def reset_locks(cls):
+        '''
+        This method replaces the locks shared by all instances of the class. It is run
+        in every process forked from a process which already loaded the model, such as
+        the workers of the production web server, so that a lock held by another thread
+        at the time of the fork does not stay locked in the worker.
+        '''
+        cls.model_cache.reset_lock()
+        cls._inference_plan_lock = threading.Lock()
+        cls._prediction_table_lock = threading.Lock()
+    
     # Creating the constructor for the class
     def __init__(self):
         '''
@@ -25,6 +59,7 @@ class MakePredictions():
         '''
         self.preprocessor_obj_path = DataTransformationConfig()
         self.model_uri = 'https://dagshub.com/abbeymaj/congestion_analysis.mlflow'
+        self.model_store = LocalModelStore()
     
     # Creating a method to retrieve the latest parameters for the trained model
     def retrieve_model_params(self):
@@ -55,27 +90,80 @@ class MakePredictions():
         except Exception as e:
             raise CustomException(e, sys)
     
+    # Creating a method to fetch the model from the local model store or the model registry
+    def retrieve_model(self, run_params=None):
+        '''
+        This method retrieves the trained model. The model is loaded from the local model
+        store when the run parameters point to a model that is present on disk. The remote
+        model registry is only used when no local copy of the model is available.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        run_params : dict - The run parameters of the model to retrieve. If not provided,
+        the latest run parameters are used.
+        
+        ----------------
+        Returns:
+        ----------------
+        model : XGBRegressor, mlflow.pyfunc.PyFuncModel or NativeBoosterModel - This is the
+        trained model, depending on the inference backend.
+        ===================================================================================
+        '''
+        try:
+            # Retrieve the latest run parameters
+            if run_params is None:
+                run_params, _ = self.retrieve_model_params()
+            
+            inference_backend = self.model_cache.cache_config.inference_backend
+            if inference_backend not in ('pyfunc', 'native'):
+                raise ValueError(f'Unknown inference backend {inference_backend}.')
+            native = inference_backend == 'native'
+            
+            # Loading the model from the local model store if it is present
+            local_model_path = run_params.get('local_model_path')
+            if local_model_path is not None and os.path.exists(local_model_path):
+                if native:
+                    return self.model_store.load_booster(local_model_path, run_params.get('model_sha256'))
+                return self.model_store.load_model(local_model_path, run_params.get('model_sha256'))
+            
+            # Fetching the model from the model registry
+            if native:
+                return self.retrieve_registry_booster(run_params['model_uri'])
+            return self.retrieve_registry_model(run_params['model_uri'])
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
     # Creating a method to fetch the model from the model registry
-    def retrieve_model(self):
+    def retrieve_registry_model(self, model_uri):
         '''
         This method retrieves the trained model from the model registry.
         ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_uri : str - The uri of the model to retrieve.
+        
         ----------------
         Returns:
         ----------------
-        model : xgboost.core.Booster - This is the trained model from the model registry.
+        model : mlflow.pyfunc.PyFuncModel - This is the trained model from the model
+        registry.
         ===================================================================================
         '''
         try:
+            # Importing the model registry clients, which are slow to import and are not
+            # needed when the model is loaded from the local model store
+            import dagshub
+            import mlflow
+            
             # Initializing the connection to the model registry
             dagshub.init(repo_owner='abbeymaj', repo_name='congestion_analysis', mlflow=True)
             
             # Setting the tracking uri
             mlflow.set_tracking_uri(self.model_uri)
             
-            # Retrieve the latest model URI
-            _, model_uri = self.retrieve_model_params()
-            
             # Fetching the model from the model registry
             model = mlflow.pyfunc.load_model(model_uri)
             
@@ -84,6 +172,59 @@ class MakePredictions():
         except Exception as e:
             raise CustomException(e, sys)
     
+    # Creating a method to fetch the native booster of the model from the model registry
+    def retrieve_registry_booster(self, model_uri):
+        '''
+        This method retrieves the XGBoost model logged by the training pipeline from the
+        model registry with the xgboost flavor of mlflow, instead of the pyfunc flavor,
+        and returns its raw booster.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_uri : str - The uri of the model to retrieve.
+        
+        ----------------
+        Returns:
+        ----------------
+        model : NativeBoosterModel - The booster of the model from the model registry.
+        ===================================================================================
+        '''
+        try:
+            # Importing the model registry clients only on this code path
+            import dagshub
+            import mlflow
+            import mlflow.xgboost
+            
+            # Initializing the connection to the model registry
+            dagshub.init(repo_owner='abbeymaj', repo_name='congestion_analysis', mlflow=True)
+            mlflow.set_tracking_uri(self.model_uri)
+            
+            # Fetching the model and taking out its booster
+            return NativeBoosterModel.from_model(mlflow.xgboost.load_model(model_uri))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to fetch the preprocessor object and model from the model cache
+    def load_model_bundle(self):
+        '''
+        This method fetches the preprocessor object and the model from the model cache.
+        The model is retrieved only when the cache is empty or the run parameters point
+        to a new model.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        bundle : ModelBundle - The cached preprocessor object and model.
+        ===================================================================================
+        '''
+        try:
+            return self.model_cache.get_bundle(self.retrieve_model)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
     # Creating a method to make predictions on the data entered by the user
     def predict(self, features, test_transformed_features=False):
         '''
@@ -103,16 +244,35 @@ class MakePredictions():
         =============================================================================================
         '''
         try:
-            # Instantiating the preprocessor object
-            preprocessor = joblib.load(self.preprocessor_obj_path.preprocessor_obj_path)
+            # Fetching the preprocessor object and the model from the model cache
+            bundle, plan = self.load_inference_plan()
+            preprocessor = bundle.preprocessor
+            model = bundle.model
             
-            # Retrieving the model from the model registry
-            model = self.retrieve_model()
+            with record_stage('feature_build'):
+                # Copying the features, since the lag features and the engineered
+                # features are added to the frame in place, and the frame belongs to
+                # the caller
+                features = features.copy()
+                
+                # Reading the lag and rolling mean features from the segment history, if
+                # the model uses them
+                if plan.lag_features:
+                    features[get_lag_feature_names()] = get_segment_history().get_features_batch(
+                        features['x'], features['y'], features['direction'], features['time']
+                    )
+                
+                # Creating the features. The feature pipeline is imported here, so that
+                # the single-segment path does not load it.
+                from sklearn import set_config
+                from src.components.data_transformation import DataTransformation
+                set_config(transform_output='pandas')
+                data_transform = DataTransformation()
+                feature_eng = data_transform.generate_features(features)
             
             # Transforming the features using the preprocessor object
-            data_transform = DataTransformation()
-            feature_eng = data_transform.generate_features(features)
-            transformed_features = preprocessor.transform(feature_eng)
+            with record_stage('transform'):
+                transformed_features = preprocessor.transform(feature_eng)
             
             # Returning the preprocessor object for unit test or running
             # the predictions
@@ -121,8 +281,159 @@ class MakePredictions():
                 return transformed_features
             else:
                 # Making predictions using the transformed dataset
-                preds = model.predict(transformed_features)
+                with record_stage('predict'):
+                    preds = model.predict(transformed_features)
                 return preds
         
         except Exception as e:
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
+    
+    # Creating a method to fetch the inference plan for the cached preprocessor object
+    def load_inference_plan(self):
+        '''
+        This method fetches the inference plan compiled from the cached preprocessor
+        object. The plan is compiled again whenever the model cache loads a new bundle.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        bundle : ModelBundle - The cached preprocessor object and model.
+        plan : InferencePlan - The inference plan compiled from the preprocessor object.
+        ===================================================================================
+        '''
+        try:
+            bundle = self.load_model_bundle()
+            cache_key, plan = MakePredictions._inference_plan
+            if cache_key != bundle.cache_key:
+                with MakePredictions._inference_plan_lock:
+                    cache_key, plan = MakePredictions._inference_plan
+                    if cache_key != bundle.cache_key:
+                        plan = InferencePlan.from_preprocessor(bundle.preprocessor)
+                        MakePredictions._inference_plan = (bundle.cache_key, plan)
+            
+            return bundle, plan
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to make a prediction for a single roadway segment
+    def predict_single(self, x, y, direction, time=None):
+        '''
+        This method makes a prediction for a single roadway segment. The feature vector is
+        built directly as a NumPy array by the inference plan, without creating a pandas
+        dataframe.
+        ============================================================================================
+        -------------------
+        Parameters:
+        -------------------
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        
+        -------------------
+        Returns:
+        -------------------
+        preds : This is the prediction for the roadway segment.
+        =============================================================================================
+        '''
+        try:
+            bundle, plan = self.load_inference_plan()
+            with record_stage('feature_build'):
+                lag_values = get_segment_history().get_features(x, y, direction, time) if plan.lag_features else None
+                features = plan.build_features(x, y, direction, time, lag_values)
+            with record_stage('predict'):
+                return bundle.model.predict(features)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    
+    # Creating a method to fetch the prediction table of the cached model
+    def load_prediction_table(self):
+        '''
+        This method fetches the prediction table scored with the cached model and
+        preprocessor object. The table is loaded again whenever the cache key of the
+        bundle changes, that is when the model cache loads a new model or a new
+        preprocessor object. If no table was
+        precomputed for the model, the folder is looked at again at most once per check
+        interval of the model cache.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        table : PredictionTable - The prediction table, or None if there is no table for
+        the cached model.
+        ===================================================================================
+        '''
+        try:
+            bundle = self.load_model_bundle()
+            cache_key, table, checked_at = MakePredictions._prediction_table
+            now = time.monotonic()
+            stale = cache_key != bundle.cache_key or (
+                table is None and now - checked_at >= self.model_cache.cache_config.check_interval
+            )
+            if stale:
+                with MakePredictions._prediction_table_lock:
+                    cache_key, table, checked_at = MakePredictions._prediction_table
+                    if cache_key != bundle.cache_key or (
+                        table is None and now - checked_at >= self.model_cache.cache_config.check_interval
+                    ):
+                        # Fetching the table scored with the model and the preprocessor
+                        # object of the bundle, so a table is never used with another
+                        # preprocessor object
+                        table_key = PredictionTable.get_table_key(bundle.model_version, bundle.preprocessor_sha256)
+                        table_path = PredictionTable.get_table_path(bundle.model_version, table_key)
+                        table = PredictionTable.load(table_path) if os.path.exists(table_path) else None
+                        if table is not None and (table.model_version, table.table_key) != (bundle.model_version, table_key):
+                            table = None
+                        
+                        # Warning once per model when the table which is precomputed for
+                        # every model without lag features is missing
+                        if table is None and cache_key != bundle.cache_key and not self.load_inference_plan()[1].lag_features:
+                            logging.warning(
+                                f'No prediction table found at {table_path} for model {bundle.model_version}. '
+                                'The model is called for every prediction until the table is precomputed.'
+                            )
+                        MakePredictions._prediction_table = (bundle.cache_key, table, now)
+            
+            return table
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to look up a prediction in the prediction table
+    def lookup_prediction(self, x, y, direction, time=None):
+        '''
+        This method looks up the prediction for a single roadway segment in the prediction
+        table of the cached model, which is an array lookup.
+        ============================================================================================
+        -------------------
+        Parameters:
+        -------------------
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        
+        -------------------
+        Returns:
+        -------------------
+        preds : The prediction for the roadway segment, or None if there is no table for
+        the cached model or the segment is not in the table.
+        =============================================================================================
+        '''
+        try:
+            table = self.load_prediction_table()
+            if table is None:
+                return None
+            pred = table.lookup(x, y, direction, time)
+            return None if pred is None else np.array([pred], dtype=np.float32)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Replacing the locks in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=MakePredictions.reset_locks)
@@ -0,0 +1,541 @@
+# Importing packages
+import os
+import glob
+import json
+import time
+import threading
+from bisect import bisect_left
+from src.components.config_entity import MetricsConfig
+from src.logger import logging
+
+# Reading the configuration of the metrics once, since it is checked on every request
+metrics_config = MetricsConfig()
+
+# Creating a class for the trace of the request handled by each thread. The class
+# attributes are the values of a thread which is not handling a request, so that
+# reading them never raises an AttributeError, which is slow to raise and catch.
+class _RequestTrace(threading.local):
+    stages = None
+    start_time = 0.0
+
+
+# Creating the trace of the request handled by each thread
+_trace = _RequestTrace()
+
+
+# Creating a function to format a label value or a sample value
+def _format_value(value):
+    '''
+    This function formats a sample value in the Prometheus text format.
+    '''
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Creating a function to format the labels of a sample
+def _format_labels(names, values):
+    '''
+    This function formats the labels of a sample in the Prometheus text format.
+    '''
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+# Creating a class for a counter
+class Counter():
+    '''
+    This class counts events per combination of label values. The counts only go up,
+    except that set can mirror a count kept elsewhere, such as the hits of a cache.
+    '''
+    metric_type = 'counter'
+    
+    # Creating the constructor for the class
+    def __init__(self, name, documentation, label_names=()):
+        '''
+        This is the constructor for the Counter class.
+        '''
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    # Creating a method to add to a count
+    def inc(self, *label_values, amount=1):
+        '''
+        This method adds amount to the count of the label values.
+        '''
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    # Creating a method to set a count
+    def set(self, value, *label_values):
+        '''
+        This method sets the count of the label values.
+        '''
+        with self._lock:
+            self._values[label_values] = value
+    
+    # Creating a method to read a count
+    def get(self, *label_values):
+        '''
+        This method returns the count of the label values.
+        '''
+        return self._values.get(label_values, 0)
+    
+    # Creating a method to copy the counts
+    def snapshot(self):
+        '''
+        This method returns a copy of the count of every combination of label values.
+        '''
+        with self._lock:
+            return dict(self._values)
+    
+    # Creating a method to combine the counts of several processes
+    @staticmethod
+    def merge(snapshots):
+        '''
+        This method adds up the counts of several processes.
+        '''
+        values = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot.items():
+                values[labels] = values.get(labels, 0) + value
+        return values
+    
+    # Creating a method to render the samples
+    def render(self, values=None):
+        '''
+        This method returns the lines of the samples in the Prometheus text format, of
+        the given counts or of the counts of the process.
+        '''
+        values = sorted((self.snapshot() if values is None else values).items())
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}' for labels, value in values]
+
+
+# Creating a class for a gauge
+class Gauge(Counter):
+    '''
+    This class holds a value per combination of label values, which can go up and down.
+    '''
+    metric_type = 'gauge'
+    
+    # Creating a method to remove every value
+    def clear(self):
+        '''
+        This method removes the values of every combination of label values.
+        '''
+        with self._lock:
+            self._values.clear()
+    
+    # Creating a method to combine the values of several processes
+    @staticmethod
+    def merge(snapshots):
+        '''
+        This method keeps the largest value of several processes, such as the time at
+        which the most recent model was loaded.
+        '''
+        values = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot.items():
+                values[labels] = max(values.get(labels, value), value)
+        return values
+
+
+# Creating a class for a histogram
+class Histogram():
+    '''
+    This class counts observations, such as latencies in seconds, in cumulative buckets
+    per combination of label values, along with their sum and count.
+    '''
+    metric_type = 'histogram'
+    
+    # Creating the constructor for the class
+    def __init__(self, name, documentation, label_names=(), buckets=()):
+        '''
+        This is the constructor for the Histogram class.
+        '''
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    # Creating a method to record an observation
+    def observe(self, value, *label_values):
+        '''
+        This method counts the value in its bucket of the label values.
+        '''
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    # Creating a method to record several observations at once
+    def observe_many(self, observations):
+        '''
+        This method counts several values, each with its label values, taking the lock
+        once for all of them.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        observations : iterable - The (value, label values) pairs to count.
+        ===================================================================================
+        '''
+        buckets, all_series = self.buckets, self._series
+        with self._lock:
+            for value, label_values in observations:
+                series = all_series.get(label_values)
+                if series is None:
+                    series = all_series[label_values] = [[0] * len(buckets), 0.0, 0]
+                series[0][bisect_left(buckets, value)] += 1
+                series[1] += value
+                series[2] += 1
+    
+    # Creating a method to read the count and sum of observations
+    def get(self, *label_values):
+        '''
+        This method returns the number and the sum of the observations of the label
+        values.
+        '''
+        series = self._series.get(label_values)
+        return (0, 0.0) if series is None else (series[2], series[1])
+    
+    # Creating a method to copy the series
+    def snapshot(self):
+        '''
+        This method returns a copy of the bucket counts, sum and count of every
+        combination of label values.
+        '''
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._series.items()}
+    
+    # Creating a method to combine the series of several processes
+    @staticmethod
+    def merge(snapshots):
+        '''
+        This method adds up the bucket counts, sums and counts of several processes.
+        '''
+        series = {}
+        for snapshot in snapshots:
+            for labels, (counts, total, count) in snapshot.items():
+                merged = series.get(labels)
+                if merged is None:
+                    series[labels] = [list(counts), total, count]
+                else:
+                    merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                    merged[1] += total
+                    merged[2] += count
+        return series
+    
+    # Creating a method to render the samples
+    def render(self, series=None):
+        '''
+        This method returns the lines of the cumulative buckets, sum and count of each
+        combination of label values in the Prometheus text format, of the given series
+        or of the series of the process.
+        '''
+        series_items = sorted((self.snapshot() if series is None else series).items())
+        lines = []
+        label_names = self.label_names + ('le',)
+        for labels, (counts, total, count) in series_items:
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_value(bucket)
+                lines.append(f'{self.name}_bucket{_format_labels(label_names, labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+# Creating a class to hold the metrics of the process
+class MetricsRegistry():
+    '''
+    This class holds the metrics of the process and renders them in the Prometheus
+    text format. Collectors are functions called before rendering, which copy values
+    kept elsewhere, such as the hits of a cache, into the metrics. If multiprocess_dir
+    is set, each process writes snapshots of its metrics to a file of the folder named
+    after its process id, and the rendered metrics combine the snapshots of every
+    process: the counters and histograms are added up, including those of the processes
+    which have exited, and the gauges keep the largest value of the running processes.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, multiprocess_dir=''):
+        '''
+        This is the constructor for the MetricsRegistry class.
+        '''
+        self.metrics = []
+        self.collectors = []
+        self.multiprocess_dir = multiprocess_dir
+    
+    # Creating a method to add a metric
+    def register(self, metric):
+        '''
+        This method adds a metric to the registry and returns it.
+        '''
+        self.metrics.append(metric)
+        return metric
+    
+    # Creating a method to add a collector
+    def add_collector(self, collector):
+        '''
+        This method adds a function which is called before the metrics are rendered.
+        '''
+        self.collectors.append(collector)
+        return collector
+    
+    # Creating a method to build the path of the snapshot of a process
+    def get_snapshot_path(self, pid=None):
+        '''
+        This method returns the path of the snapshot of a process, which defaults to the
+        current process.
+        '''
+        return os.path.join(self.multiprocess_dir, f'metrics_{os.getpid() if pid is None else pid}.json')
+    
+    # Creating a method to write the snapshot of the process
+    def write_snapshot(self):
+        '''
+        This method runs the collectors and writes the metrics of the process to its
+        snapshot. The snapshot is written to a temporary file first and then renamed,
+        so a reader never sees a partially written file.
+        '''
+        for collector in self.collectors:
+            collector()
+        snapshot = {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in self.metrics
+        }
+        self._write_json(self.get_snapshot_path(), snapshot)
+    
+    # Creating a method to write a json file atomically
+    def _write_json(self, file_path, content):
+        '''
+        This method writes a json file through a temporary file of the calling thread.
+        '''
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        temp_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as file_obj:
+            json.dump(content, file_obj)
+        os.replace(temp_path, file_path)
+    
+    # Creating a method to read a snapshot
+    def _read_snapshot(self, file_path):
+        '''
+        This method reads a snapshot, with the label values of each sample as a tuple.
+        A snapshot which cannot be read, such as the snapshot of a process which exited
+        while writing it, is empty.
+        '''
+        try:
+            with open(file_path, 'r') as file_obj:
+                snapshot = json.load(file_obj)
+        except (OSError, ValueError):
+            return {}
+        return {name: {tuple(labels): value for labels, value in samples} for name, samples in snapshot.items()}
+    
+    # Creating a method to fold the snapshot of an exited process into the snapshot of
+    # the exited processes
+    def mark_process_dead(self, pid):
+        '''
+        This method adds the counters and histograms of a process which has exited to the
+        snapshot of the exited processes, drops its gauges and removes its snapshot, so
+        that the folder holds one snapshot per running process and one for the exited
+        processes. It is called by the process which forked the exited process.
+        '''
+        snapshot_path = self.get_snapshot_path(pid)
+        if not self.multiprocess_dir or not os.path.exists(snapshot_path):
+            return
+        dead_path = os.path.join(self.multiprocess_dir, 'metrics_exited.json')
+        snapshots = [self._read_snapshot(dead_path), self._read_snapshot(snapshot_path)]
+        self._write_json(dead_path, {
+            metric.name: [
+                [list(labels), value]
+                for labels, value in metric.merge([snapshot.get(metric.name, {}) for snapshot in snapshots]).items()
+            ]
+            for metric in self.metrics if metric.metric_type != 'gauge'
+        })
+        os.remove(snapshot_path)
+    
+    # Creating a method to remove the snapshots of earlier runs
+    def clear_snapshots(self):
+        '''
+        This method removes every snapshot of the folder. It is called when the server
+        starts, before any worker writes its snapshot.
+        '''
+        for file_path in glob.glob(os.path.join(self.multiprocess_dir, 'metrics_*.json*')):
+            os.remove(file_path)
+    
+    # Creating a method to render the metrics
+    def render(self):
+        '''
+        This method returns every metric in the Prometheus text format, combining the
+        snapshots of every process if multiprocess_dir is set.
+        '''
+        if self.multiprocess_dir:
+            self.write_snapshot()
+            file_paths = glob.glob(os.path.join(self.multiprocess_dir, 'metrics_*.json'))
+            snapshots = [(self._read_snapshot(file_path), file_path.endswith('_exited.json')) for file_path in file_paths]
+        else:
+            for collector in self.collectors:
+                collector()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            if self.multiprocess_dir:
+                lines.extend(metric.render(metric.merge([
+                    snapshot.get(metric.name, {}) for snapshot, exited in snapshots
+                    if not (exited and metric.metric_type == 'gauge')
+                ])))
+            else:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Creating the metrics of the web app
+registry = MetricsRegistry(metrics_config.multiprocess_dir)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+REQUEST_LATENCY = registry.register(Histogram(
+    'congestion_request_duration_seconds', 'Latency of the requests, by route, method and status.',
+    ('route', 'method', 'status'), LATENCY_BUCKETS
+))
+STAGE_LATENCY = registry.register(Histogram(
+    'congestion_stage_duration_seconds', 'Latency of the stages of the requests, by route and stage.',
+    ('route', 'stage'), LATENCY_BUCKETS
+))
+ERRORS = registry.register(Counter(
+    'congestion_errors_total', 'Requests which failed, by route and error.', ('route', 'error')
+))
+CACHE_REQUESTS = registry.register(Counter(
+    'congestion_cache_requests_total', 'Lookups of the prediction caches, by cache and result.', ('cache', 'result')
+))
+MODEL_INFO = registry.register(Gauge(
+    'congestion_model_info', 'The model served by the process.', ('model_version', 'model_uri')
+))
+MODEL_LOADS = registry.register(Counter(
+    'congestion_model_loads_total', 'Loads of the model and preprocessor object by the process.'
+))
+MODEL_LOADED_AT = registry.register(Gauge(
+    'congestion_model_loaded_timestamp_seconds', 'The time at which the served model was loaded.'
+))
+
+
+# Creating a class to time a stage of the request of the current thread
+class StageTimer():
+    '''
+    This class times a stage of the request handled by the current thread, and adds the
+    time to the trace of the request. Outside a request, or with the metrics disabled,
+    it only checks that there is no trace.
+    '''
+    __slots__ = ('stage', 'stages', 'start_time')
+    
+    # Creating the constructor for the class
+    def __init__(self, stage):
+        '''
+        This is the constructor for the StageTimer class.
+        '''
+        self.stage = stage
+        self.stages = None
+    
+    # Starting the timer
+    def __enter__(self):
+        self.stages = _trace.stages
+        if self.stages is not None:
+            self.start_time = time.perf_counter()
+        return self
+    
+    # Stopping the timer
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.stages is not None:
+            self.stages[self.stage] = self.stages.get(self.stage, 0.0) + time.perf_counter() - self.start_time
+        return False
+
+
+# Creating the context manager which times a stage, such as "parse", "feature_build",
+# "transform", "predict" or "serialize", of the request of the current thread. It is
+# the class itself, which saves a function call on the path of every request.
+record_stage = StageTimer
+
+
+# Creating a function to start the trace of a request
+def start_request():
+    '''
+    This function starts the trace of the request handled by the current thread.
+    '''
+    if metrics_config.enabled:
+        _trace.stages = {}
+        _trace.start_time = time.perf_counter()
+
+
+# Creating a function to record the metrics of a request
+def finish_request(route, method, status, error=None):
+    '''
+    This function records the latency of the request handled by the current thread and
+    of its stages, and counts the request as an error if it failed, with the name of
+    the exception or the http status as the error.
+    '''
+    stages = _trace.stages
+    if stages is None:
+        return
+    _trace.stages = None
+    REQUEST_LATENCY.observe(time.perf_counter() - _trace.start_time, route, method, status)
+    STAGE_LATENCY.observe_many([(duration, (route, stage)) for stage, duration in stages.items()])
+    if error is not None or status >= 400:
+        ERRORS.inc(route, error or f'http_{status}')
+
+
+# Creating a function to write the snapshots of the process at a regular interval
+def start_snapshot_thread(interval=None):
+    '''
+    This function starts a background thread which writes the snapshot of the metrics
+    of the process every "interval" seconds, so that the metrics served by any process
+    include the recent requests of the others. It is called in each worker process.
+    '''
+    interval = interval or metrics_config.snapshot_interval
+    
+    def write_snapshots():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.write_snapshot()
+            except Exception as e:
+                logging.error(f'Failed to write the snapshot of the metrics: {e}')
+    
+    thread = threading.Thread(target=write_snapshots, name='metrics-snapshot', daemon=True)
+    thread.start()
+    return thread
+
+
+# Creating a function to reset the metrics in a forked process
+def _reset_after_fork():
+    '''
+    This function replaces the locks of the metrics in a forked process, so that a lock
+    held by another thread of the parent, such as the thread which reloads the model,
+    at the time of the fork does not stay locked in the child. The counters and
+    histograms of the child start from zero, so that the events of the parent are not
+    counted again by every child, while the gauges, such as the version of the model
+    loaded by the parent, are kept.
+    '''
+    for metric in registry.metrics:
+        metric._lock = threading.Lock()
+        if isinstance(metric, Histogram):
+            metric._series = {}
+        elif metric.metric_type != 'gauge':
+            metric._values = {}
+
+
+# Resetting the metrics in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
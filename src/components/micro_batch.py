@@ -0,0 +1,245 @@
+# Importing packages
+import os
+import sys
+import asyncio
+import threading
+import numpy as np
+from collections import Counter
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import MicroBatchConfig
+from src.components.make_predictions import MakePredictions
+from src.lag_features import get_segment_history
+
+
+# Creating a class to group concurrent prediction requests into batches
+class MicroBatchPredictor():
+    '''
+    This class groups concurrent single-segment prediction requests into batches. The
+    requests are put on an asyncio queue, which is drained by a batching task running on
+    an event loop in a background thread. A batch is flushed as soon as it holds
+    max_batch_size requests, or max_linger_ms after its first request arrived, whichever
+    comes first. The batch is scored with one call to the model, and each request is
+    resolved with its own prediction. The class keeps metrics on the batch sizes.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, max_batch_size=None, max_linger_ms=None):
+        '''
+        This is the constructor for the MicroBatchPredictor class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        max_batch_size : int - The largest number of requests in one batch.
+        max_linger_ms : float - The longest time, in milliseconds, that the first request
+        of a batch waits for more requests.
+        ===================================================================================
+        '''
+        self.micro_batch_config = MicroBatchConfig()
+        self.max_batch_size = max_batch_size or self.micro_batch_config.max_batch_size
+        self.max_linger_ms = self.micro_batch_config.max_linger_ms if max_linger_ms is None else max_linger_ms
+        self.batch_sizes = Counter()
+        self._metrics_lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    # Creating a method to start the event loop in a background thread
+    def start(self):
+        '''
+        This method starts the event loop and the batching task in a background thread,
+        if they are not running yet.
+        '''
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            
+            def run_loop():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                self._queue = asyncio.Queue()
+                self._loop.create_task(self._batch_requests())
+                ready.set()
+                self._loop.run_forever()
+            
+            self._thread = threading.Thread(target=run_loop, name='micro-batch-predictor', daemon=True)
+            self._thread.start()
+            ready.wait()
+            logging.info(
+                f'Micro-batch predictor started with batches of up to {self.max_batch_size} '
+                f'requests and a linger time of {self.max_linger_ms} ms.'
+            )
+    
+    # Creating a method to make a prediction from a synchronous caller
+    def predict(self, x, y, direction, time=None, timeout=None):
+        '''
+        This method queues a prediction request for a single roadway segment and waits
+        for its prediction. It is called from the threads of the web server.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        timeout : float - The longest time, in seconds, to wait for the prediction.
+        
+        ----------------
+        Returns:
+        ----------------
+        prediction : float - The prediction for the roadway segment.
+        ===================================================================================
+        '''
+        try:
+            self.start()
+            future = asyncio.run_coroutine_threadsafe(self.predict_async(x, y, direction, time), self._loop)
+            return future.result(timeout or self.micro_batch_config.timeout)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a coroutine to make a prediction from the event loop
+    async def predict_async(self, x, y, direction, time=None):
+        '''
+        This coroutine queues a prediction request for a single roadway segment and
+        waits for its prediction.
+        '''
+        future = self._loop.create_future()
+        await self._queue.put(((x, y, direction, time), future))
+        return await future
+    
+    # Creating the task which groups the queued requests into batches
+    async def _batch_requests(self):
+        '''
+        This coroutine waits for the first request of a batch, then collects requests
+        until the batch is full or the linger time is over, and scores the batch in the
+        default executor, so that the event loop keeps queueing requests meanwhile.
+        '''
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_linger_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            requests = [request for request, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                preds, errors = await self._loop.run_in_executor(None, self.predict_batch, requests)
+                for i, (future, pred) in enumerate(zip(futures, preds)):
+                    if future.done():
+                        continue
+                    if i in errors:
+                        future.set_exception(errors[i])
+                    else:
+                        future.set_result(float(pred))
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    # Creating a method to score a batch of requests
+    def predict_batch(self, requests):
+        '''
+        This method builds the feature matrix of a batch of requests with the inference
+        plan of the cached preprocessor object, and scores it with one call to the model.
+        The features of each request are built on their own, so that a request which
+        fails, such as a request for an unseen roadway segment, does not fail the other
+        requests of the batch. The failed requests are left out of the model call.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        requests : list - The (x, y, direction, time) of each request.
+        
+        ----------------
+        Returns:
+        ----------------
+        preds : np.ndarray - The prediction for each request, NaN for the failed requests.
+        errors : dict - The exception raised for each failed request, by its position in
+        the batch.
+        ===================================================================================
+        '''
+        bundle, plan = MakePredictions().load_inference_plan()
+        history = get_segment_history() if plan.lag_features else None
+        features = []
+        errors = {}
+        for i, request in enumerate(requests):
+            try:
+                if history is not None:
+                    features.append(plan.build_features(*request, lag_values=history.get_features(*request)))
+                else:
+                    features.append(plan.build_features(*request))
+            except Exception as e:
+                errors[i] = e
+        
+        preds = np.full(len(requests), np.nan)
+        if features:
+            scored = [i for i in range(len(requests)) if i not in errors]
+            preds[scored] = np.asarray(bundle.model.predict(np.vstack(features)), dtype=float).ravel()
+        with self._metrics_lock:
+            self.batch_sizes[len(requests)] += 1
+        return preds, errors
+    
+    # Creating a method to report the achieved batch sizes
+    def get_metrics(self):
+        '''
+        This method returns the number of batches and requests scored so far, the mean
+        and largest batch size, and the number of batches of each size.
+        '''
+        with self._metrics_lock:
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+        n_batches = sum(batch_sizes.values())
+        n_requests = sum(size * count for size, count in batch_sizes.items())
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_linger_ms': self.max_linger_ms,
+            'batches': n_batches,
+            'requests': n_requests,
+            'mean_batch_size': n_requests / n_batches if n_batches else 0.0,
+            'largest_batch_size': max(batch_sizes, default=0),
+            'batch_sizes': batch_sizes
+        }
+
+
+# Creating the micro-batch predictor shared by the threads of the process
+_micro_batch_predictor = None
+_micro_batch_predictor_lock = threading.Lock()
+
+
+# Creating a function to fetch the micro-batch predictor of the process
+def get_micro_batch_predictor():
+    '''
+    This function returns the micro-batch predictor shared by the threads of the process,
+    and creates it on the first call.
+    '''
+    global _micro_batch_predictor
+    if _micro_batch_predictor is None:
+        with _micro_batch_predictor_lock:
+            if _micro_batch_predictor is None:
+                _micro_batch_predictor = MicroBatchPredictor()
+    return _micro_batch_predictor
+
+
+# Creating a function to drop the micro-batch predictor in a forked process
+def _reset_after_fork():
+    '''
+    This function drops the micro-batch predictor in a forked process, since the thread
+    running its event loop is not copied by the fork.
+    '''
+    global _micro_batch_predictor, _micro_batch_predictor_lock
+    _micro_batch_predictor = None
+    _micro_batch_predictor_lock = threading.Lock()
+
+
+# Dropping the micro-batch predictor in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
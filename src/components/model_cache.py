@@ -0,0 +1,202 @@
+# Importing packages
+import io
+import os
+import sys
+import time
+import hashlib
+import threading
+import joblib
+from dataclasses import dataclass
+from src.run_utils import load_run_params
+from src.run_utils import read_json_file
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import DataTransformationConfig
+from src.components.config_entity import ModelCacheConfig
+from src.components.metrics import MODEL_INFO
+from src.components.metrics import MODEL_LOADS
+from src.components.metrics import MODEL_LOADED_AT
+from src.components.metrics import record_stage
+
+
+# Creating a class to hold a loaded preprocessor object and model
+@dataclass(frozen=True)
+class ModelBundle():
+    '''
+    This class holds the preprocessor object and the model that were loaded together,
+    along with the model version and the cache key that were used to load them, and the
+    SHA-256 hash of the preprocessor object file they were loaded from. The bundle is
+    immutable so that it can be swapped in a single assignment.
+    '''
+    preprocessor: object
+    model: object
+    model_uri: str
+    model_version: str
+    cache_key: tuple
+    preprocessor_sha256: str
+    loaded_at: float
+
+
+# Creating a class to cache the preprocessor object and the model for the whole process
+class ModelCache():
+    '''
+    This class caches the preprocessor object and the model for the lifetime of the
+    process. The cache is shared by all threads. The cached bundle is reloaded when the
+    model uri or model hash in the latest run parameters file changes, or when the modification time
+    or the size of the preprocessor object file changes. The new bundle is fully loaded
+    before it replaces the old one, so readers never see a half loaded model.
+    '''
+    # Creating the constructor for the class
+    def __init__(self):
+        '''
+        This is the constructor for the ModelCache class.
+        '''
+        self.cache_config = ModelCacheConfig()
+        self.preprocessor_config = DataTransformationConfig()
+        self._bundle = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    # Creating a method to read the latest run parameters
+    def read_run_params(self):
+        '''
+        This method reads the latest run parameters file.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        run_params : dict - The latest run parameters.
+        ===================================================================================
+        '''
+        try:
+            run_params_json = load_run_params(self.cache_config.run_config_dir)
+            return read_json_file(run_params_json)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to compute the key that identifies the current artifacts
+    def get_cache_key(self, run_params):
+        '''
+        This method computes the key that identifies the model and the preprocessor
+        object which are currently on disk.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        run_params : dict - The latest run parameters.
+
+        ----------------
+        Returns:
+        ----------------
+        cache_key : tuple - The model uri and the hash of the model in the local model
+        store, followed by the modification time and the size of the preprocessor object
+        file.
+        ===================================================================================
+        '''
+        try:
+            # Fetching the modification time and size of the preprocessor object
+            stat = os.stat(self.preprocessor_config.preprocessor_obj_path)
+
+            return (
+                run_params['model_uri'],
+                run_params.get('model_sha256'),
+                stat.st_mtime_ns,
+                stat.st_size
+            )
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to return the cached bundle, loading it if required
+    def get_bundle(self, model_loader):
+        '''
+        This method returns the cached preprocessor object and model. The artifacts on
+        disk are checked at most once every "check_interval" seconds. If they have
+        changed, the bundle is reloaded under a lock and swapped in atomically.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_loader : callable - A function that takes the run parameters and returns the
+        model.
+
+        ----------------
+        Returns:
+        ----------------
+        bundle : ModelBundle - The cached preprocessor object and model.
+        ===================================================================================
+        '''
+        try:
+            # Returning the cached bundle without touching the disk if it was
+            # checked recently
+            bundle = self._bundle
+            now = time.monotonic()
+            if bundle is not None and now - self._last_check < self.cache_config.check_interval:
+                return bundle
+
+            # Checking if the artifacts on disk have changed
+            run_params = self.read_run_params()
+            cache_key = self.get_cache_key(run_params)
+            if bundle is not None and bundle.cache_key == cache_key:
+                self._last_check = now
+                return bundle
+
+            # Loading the new bundle. Only one thread loads, the other threads wait
+            # and then pick up the bundle that was loaded.
+            with self._lock:
+                bundle = self._bundle
+                if bundle is not None and bundle.cache_key == cache_key:
+                    return bundle
+
+                logging.info(f'Loading the model and preprocessor object for {cache_key[0]}.')
+                with record_stage('model_load'):
+                    # Reading the preprocessor object file once, so that its hash is
+                    # the hash of the loaded object
+                    with open(self.preprocessor_config.preprocessor_obj_path, 'rb') as file_obj:
+                        raw_preprocessor = file_obj.read()
+                    preprocessor = joblib.load(io.BytesIO(raw_preprocessor))
+                    model = model_loader(run_params)
+                MODEL_LOADS.inc()
+                bundle = ModelBundle(
+                    preprocessor=preprocessor,
+                    model=model,
+                    model_uri=cache_key[0],
+                    model_version=cache_key[1] or cache_key[0],
+                    cache_key=cache_key,
+                    preprocessor_sha256=hashlib.sha256(raw_preprocessor).hexdigest(),
+                    loaded_at=time.time()
+                )
+
+                # Swapping in the new bundle, and labelling the metrics of the process
+                # with its model version
+                self._bundle = bundle
+                self._last_check = time.monotonic()
+                MODEL_INFO.clear()
+                MODEL_INFO.set(1, bundle.model_version, bundle.model_uri)
+                MODEL_LOADED_AT.set(bundle.loaded_at)
+                logging.info('Model and preprocessor object loaded into the model cache.')
+
+            return bundle
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to empty the cache
+    def clear(self):
+        '''
+        This method empties the cache, so that the next call reloads the model and the
+        preprocessor object.
+        '''
+        with self._lock:
+            self._bundle = None
+            self._last_check = 0.0
+
+    # Creating a method to replace the lock in a forked process
+    def reset_lock(self):
+        '''
+        This method replaces the lock with a new one. It is called in a process forked
+        from the process holding the cache, since a lock held by another thread at the
+        time of the fork would stay locked forever in the forked process.
+        '''
+        self._lock = threading.Lock()
@@ -0,0 +1,187 @@
+# Importing packages
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import ModelStoreConfig
+from src.components.native_booster import NativeBoosterModel
+
+
+# Creating a class to store the trained models on the local disk
+class LocalModelStore():
+    '''
+    This class stores the trained XGBoost models on the local disk, so that the models can
+    be served without access to the remote model registry. Each model is saved in the
+    native XGBoost UBJSON format, in a folder named after the SHA-256 hash of its content.
+    The class contains methods to save a model, read the manifest of the latest model and
+    load a model after verifying its hash.
+    '''
+    # Creating the constructor for the class
+    def __init__(self):
+        '''
+        This is the constructor for the LocalModelStore class. It initializes the path to
+        the model store folder.
+        '''
+        self.model_store_config = ModelStoreConfig()
+
+    # Creating a method to save a trained model into the model store
+    def save_model(self, model, run_params=None):
+        '''
+        This method saves the trained model into the model store and updates the manifest
+        so that it points to the saved model. The files are written to a temporary path
+        first and then renamed, so a reader never sees a partially written file.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model : XGBRegressor or xgboost.Booster - This is the trained model.
+        run_params : dict - These are the run parameters that are stored with the model.
+
+        ----------------
+        Returns:
+        ----------------
+        manifest : dict - The manifest of the saved model, containing the path to the model
+        file and its SHA-256 hash.
+        ===================================================================================
+        '''
+        try:
+            # Serializing the native booster in the UBJSON format
+            booster = model.get_booster() if hasattr(model, 'get_booster') else model
+            raw_model = bytes(booster.save_raw(raw_format='ubj'))
+            model_sha256 = hashlib.sha256(raw_model).hexdigest()
+
+            # Writing the model file into a folder named after its hash
+            model_dir = os.path.join(self.model_store_config.model_store_dir, model_sha256[:16])
+            os.makedirs(model_dir, exist_ok=True)
+            model_path = os.path.join(model_dir, self.model_store_config.model_file_name)
+            self._write_atomic(model_path, raw_model)
+
+            # Creating the manifest for the model
+            manifest = dict(run_params or {})
+            manifest['local_model_path'] = model_path
+            manifest['model_sha256'] = model_sha256
+            manifest['saved_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            manifest_bytes = json.dumps(manifest, indent=2).encode('utf-8')
+            self._write_atomic(os.path.join(model_dir, 'manifest.json'), manifest_bytes)
+            self._write_atomic(self.model_store_config.manifest_path, manifest_bytes)
+
+            logging.info(f'Model saved to the local model store at {model_path}.')
+
+            return manifest
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to read the manifest of the latest model
+    def read_manifest(self):
+        '''
+        This method reads the manifest of the latest model in the model store.
+        ===================================================================================
+        ----------------
+        Returns:
+        ----------------
+        manifest : dict - The manifest of the latest model, or None if the model store is
+        empty.
+        ===================================================================================
+        '''
+        try:
+            if not os.path.exists(self.model_store_config.manifest_path):
+                return None
+            with open(self.model_store_config.manifest_path, 'r') as file_obj:
+                return json.load(file_obj)
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to load a model from the model store
+    def load_model(self, model_path=None, model_sha256=None):
+        '''
+        This method loads a model from the model store. The hash of the model file is
+        verified before the model is loaded. If no path is provided, the latest model in
+        the manifest is loaded.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_path : str - The path to the model file.
+        model_sha256 : str - The expected SHA-256 hash of the model file.
+
+        ----------------
+        Returns:
+        ----------------
+        model : XGBRegressor - The model loaded from the model store.
+        ===================================================================================
+        '''
+        try:
+            raw_model = self._read_model(model_path, model_sha256)
+
+            # Loading the booster into a regressor. xgboost is imported here, since it
+            # loads sklearn, so that importing the model store stays fast.
+            from xgboost import XGBRegressor
+            model = XGBRegressor()
+            model.load_model(bytearray(raw_model))
+
+            return model
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to load the native booster of a model from the model store
+    def load_booster(self, model_path=None, model_sha256=None):
+        '''
+        This method loads the raw booster of a model from the model store, after verifying
+        the hash of the model file, for predictions without the sklearn wrapper. If no
+        path is provided, the latest model in the manifest is loaded.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_path : str - The path to the model file.
+        model_sha256 : str - The expected SHA-256 hash of the model file.
+
+        ----------------
+        Returns:
+        ----------------
+        model : NativeBoosterModel - The booster loaded from the model store.
+        ===================================================================================
+        '''
+        try:
+            return NativeBoosterModel.from_raw(self._read_model(model_path, model_sha256))
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    # Creating a method to read a model file and verify its hash
+    def _read_model(self, model_path=None, model_sha256=None):
+        '''
+        This method reads the bytes of a model file, or of the latest model in the manifest
+        if no path is provided, and verifies their hash.
+        '''
+        # Reading the path and hash of the latest model from the manifest
+        if model_path is None:
+            manifest = self.read_manifest()
+            if manifest is None:
+                raise FileNotFoundError('The local model store is empty.')
+            model_path = manifest['local_model_path']
+            model_sha256 = manifest['model_sha256']
+
+        # Reading the model file and verifying its hash
+        with open(model_path, 'rb') as file_obj:
+            raw_model = file_obj.read()
+        if model_sha256 is not None and hashlib.sha256(raw_model).hexdigest() != model_sha256:
+            raise ValueError(f'The hash of {model_path} does not match the expected hash.')
+        return raw_model
+
+    # Creating a method to write a file atomically
+    def _write_atomic(self, file_path, content):
+        '''
+        This method writes the content to a temporary file and renames it to the final
+        path.
+        '''
+        temp_path = f'{file_path}.tmp'
+        with open(temp_path, 'wb') as file_obj:
+            file_obj.write(content)
+        os.replace(temp_path, file_path)
@@ -7,11 +7,17 @@ from sklearn import set_config
 set_config(transform_output='pandas')
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import ParameterGrid
 from src.exception import CustomException
 from src.logger import logging
 from src.components.config_entity import StoreFeatureConfig
 from src.components.config_entity import ModelTrainerConfig
+from src.components.config_entity import TimeSplitConfig
 from src.components.find_best_model import FindBestModel
+from src.components.resource_scheduler import ResourceScheduler
+from src.components.store_features import FeatureStoreCreation
+from src.components.time_split import TimeSplit
+from src.instrumentation import instrument
 
 # Creating a class to train the model
 class ModelTrainer():
@@ -28,12 +34,30 @@ class ModelTrainer():
         '''
         self.feature_store_config = StoreFeatureConfig()
         self.model_trainer_config = ModelTrainerConfig()
+        self.time_split_config = TimeSplitConfig()
+        self.train_times_ = None
     
     # Creating a method to create the feature and target datasets
-    def create_feature_target_datasets(self):
+    def create_feature_target_datasets(self, filters=None, use_memory_map=None):
         '''
-        This method creates the feature and target datasets.
+        This method creates the feature and target datasets. The filters are pushed
+        down to the feature store, so training on one month or on a few roadway
+        segments only reads those rows. If the memory map is used, the datasets are
+        read from the uncompressed Arrow copy of the feature store, which is written
+        first if it is missing or out of date, and the features and target are
+        read-only views of the mapped files. With the chronological split strategy, the
+        training rows are sorted by time, if they are not already, so that the
+        rolling-origin folds are ranges of rows. Their times are stored in the
+        train_times_ attribute, which is None if the feature store has no time column.
         ============================================================================       
+        -------------------
+        Parameters:
+        -------------------
+        filters : list - The filters applied to the train and test datasets, for
+        example [('month', '=', 199104)] or [('segment', 'in', ['0_0_EB'])].
+        use_memory_map : bool - Whether to read the memory-mapped Arrow copy of the
+        feature store. Defaults to the model trainer configuration.
+        
         -------------------
         Returns:
         -------------------
@@ -44,17 +68,64 @@ class ModelTrainer():
         =============================================================================
         '''
         try:
-            # Reading the datasets from the feature store folder
-            train_dataset = pd.read_parquet(self.feature_store_config.xform_train_path)
-            test_dataset = pd.read_parquet(self.feature_store_config.xform_test_path)
-            
-            # Splitting the train set into a feature and target set
-            X_train = train_dataset.copy().drop(labels=['congestion'], axis=1)
-            y_train = train_dataset['congestion'].copy()
+            if use_memory_map is None:
+                use_memory_map = self.model_trainer_config.use_memory_map
+            key_columns = ['congestion'] + self.feature_store_config.key_columns
+            time_column = self.time_split_config.time_column
+            sort_by_time = self.time_split_config.strategy == 'chronological'
+            feature_store = FeatureStoreCreation()
+            self.train_times_ = None
             
-            # Splitting the test set into a feature and target set
-            X_test = test_dataset.copy().drop(labels=['congestion'], axis=1)
-            y_test = test_dataset['congestion'].copy()
+            if use_memory_map is True:
+                if filters is not None:
+                    raise ValueError('Filters are not supported with the memory-mapped feature store.')
+                
+                # Writing the Arrow copy of the feature store if it is out of date
+                if feature_store.is_arrow_stale():
+                    feature_store.materialize_arrow_feature_store()
+                
+                # Reading the features and the target as views of the mapped files
+                datasets = []
+                for arrow_path in (
+                    self.feature_store_config.xform_train_arrow_path,
+                    self.feature_store_config.xform_test_arrow_path
+                ):
+                    feature_columns = [
+                        col for col in feature_store.read_arrow_columns(arrow_path) if col not in key_columns
+                    ]
+                    datasets.append(feature_store.read_arrow_feature_store(arrow_path, columns=feature_columns))
+                    datasets.append(feature_store.read_arrow_feature_store(arrow_path, columns=['congestion'])['congestion'])
+                X_train, y_train, X_test, y_test = datasets
+                
+                # Sorting the training rows by time, which copies them out of the mapped
+                # file only if they are not already sorted
+                train_arrow_path = self.feature_store_config.xform_train_arrow_path
+                if sort_by_time and time_column in feature_store.read_arrow_columns(train_arrow_path):
+                    train_times = feature_store.read_arrow_feature_store(train_arrow_path, columns=[time_column])[time_column]
+                    order = TimeSplit.sort_order(train_times.to_numpy())
+                    if order is not None:
+                        X_train = X_train.take(order)
+                        y_train = y_train.take(order)
+                        train_times = train_times.take(order)
+                    self.train_times_ = train_times.to_numpy()
+            else:
+                # Reading the datasets from the feature store folder
+                train_dataset = feature_store.read_feature_store(self.feature_store_config.xform_train_path, filters=filters)
+                test_dataset = feature_store.read_feature_store(self.feature_store_config.xform_test_path, filters=filters)
+                
+                # Sorting the training rows by time
+                if sort_by_time and time_column in train_dataset.columns:
+                    train_dataset = TimeSplit().sort_by_time(train_dataset, time_column)
+                    self.train_times_ = train_dataset[time_column].to_numpy()
+                
+                # Splitting the train set into a feature and target set. The month, the
+                # roadway segment and the time are keys, not features.
+                X_train = train_dataset.drop(labels=key_columns, axis=1, errors='ignore')
+                y_train = train_dataset['congestion']
+                
+                # Splitting the test set into a feature and target set
+                X_test = test_dataset.drop(labels=key_columns, axis=1, errors='ignore')
+                y_test = test_dataset['congestion']
             
             return (
                 X_train,
@@ -67,10 +138,12 @@ class ModelTrainer():
             raise CustomException(e, sys)
     
     # Creating a method to train the model
+    @instrument()
     def initiate_model_training(self, save_model=True, make_prediction=True):
         '''
         This method trains the model and then saves the trained model to the artifacts
-        folder.
+        folder. The hyperparameters are validated on rolling-origin folds with the
+        chronological split strategy, and on k-fold splits otherwise.
         ===================================================================================
         ------------------------
         Parameters:
@@ -90,14 +163,6 @@ class ModelTrainer():
             # Fetching the datasets
             X_train, y_train, X_test, y_test = self.create_feature_target_datasets()
             
-            # Instantiating the XGBoost regressor 
-            xgb = XGBRegressor(
-                objective='reg:squarederror',
-                booster='gbtree',
-                grow_policy='depthwise', 
-                random_state=42
-                )
-            
             # Defining the hyperparameters to tune
             params = {
                 'learning_rate': [0.001, 0.01, 0.1],
@@ -105,14 +170,49 @@ class ModelTrainer():
                 'max_depth': [3, 5, 7]
             }
             
+            # Creating the cross-validation folds. The rolling-origin folds are moved to
+            # the boundaries between times, unless the feature store has no time column,
+            # in which case they follow the order of the rows.
+            n_splits = self.time_split_config.n_splits
+            if self.time_split_config.strategy == 'chronological':
+                if self.train_times_ is None:
+                    logging.info('The feature store has no time column. The folds follow the order of the rows.')
+                cv = TimeSplit(n_splits=n_splits, times=self.train_times_)
+            else:
+                cv = n_splits
+            
+            # Splitting the cores between the search workers and the XGBoost threads
+            search_strategy = self.model_trainer_config.search_strategy
+            scheduler = ResourceScheduler()
+            plan = scheduler.plan(
+                n_rows=len(X_train),
+                n_candidates=len(ParameterGrid(params)),
+                cv=n_splits,
+                search_strategy=search_strategy
+            )
+            
+            # Instantiating the XGBoost regressor 
+            xgb = XGBRegressor(
+                objective='reg:squarederror',
+                booster='gbtree',
+                grow_policy='depthwise', 
+                random_state=42,
+                n_jobs=plan['inner_threads']
+                )
+            
             # Finding the best model 
             bst = FindBestModel()
-            best_model, best_params = bst.find_best_model(
-                estimator=xgb,
-                params=params,
-                train_set=X_train,
-                target_set=y_train
-            )
+            with scheduler.pin_threads(plan), scheduler.track_utilization(plan) as resource_report:
+                best_model, best_params = bst.find_best_model(
+                    estimator=xgb,
+                    params=params,
+                    train_set=X_train,
+                    target_set=y_train,
+                    cv=cv,
+                    search_strategy=search_strategy,
+                    n_jobs=plan['outer_jobs']
+                )
+            self.resource_report_ = resource_report
             
             # Saving the model if save_model is True
             if save_model is True:
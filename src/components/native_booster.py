@@ -0,0 +1,88 @@
+# Importing packages
+import sys
+import numpy as np
+from src.exception import CustomException
+
+
+# Creating a class to make predictions with the native XGBoost booster
+class NativeBoosterModel():
+    '''
+    This class makes predictions with the raw xgboost.Booster of a trained model, without
+    the schema enforcement and pandas conversions of the mlflow pyfunc wrapper or the
+    input checks of the sklearn wrapper. The features are passed to inplace_predict as a
+    contiguous float32 array, which XGBoost reads without making a copy. Like the sklearn
+    wrapper, the predictions stop at the best iteration of a model trained with early
+    stopping.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, booster):
+        '''
+        This is the constructor for the NativeBoosterModel class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        booster : xgboost.Booster - The trained booster.
+        ===================================================================================
+        '''
+        self.booster = booster
+        self.n_features = booster.num_features()
+        best_iteration = booster.attr('best_iteration')
+        self.iteration_range = (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+    
+    # Creating a method to load the booster from the raw bytes of a saved model
+    @classmethod
+    def from_raw(cls, raw_model):
+        '''
+        This method loads the booster from the bytes of a model saved in the UBJSON or
+        JSON format of XGBoost.
+        '''
+        try:
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(bytearray(raw_model))
+            return cls(booster)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to take the booster out of a trained model
+    @classmethod
+    def from_model(cls, model):
+        '''
+        This method takes the booster out of an XGBRegressor, or wraps a booster.
+        '''
+        return cls(model.get_booster() if hasattr(model, 'get_booster') else model)
+    
+    # Creating a method to make predictions
+    def predict(self, features):
+        '''
+        This method makes predictions for a 2D array or dataframe of transformed features,
+        or for a single feature vector.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        features : np.ndarray or pd.DataFrame - The transformed features, in the order of
+        the columns the model was trained on.
+        
+        ----------------
+        Returns:
+        ----------------
+        preds : np.ndarray - The float32 predictions.
+        ===================================================================================
+        '''
+        try:
+            if hasattr(features, 'to_numpy'):
+                features = features.to_numpy(dtype=np.float32)
+            features = np.ascontiguousarray(features, dtype=np.float32)
+            if features.ndim == 1:
+                features = features.reshape(1, -1)
+            if features.shape[1] != self.n_features:
+                raise ValueError(f'Expected {self.n_features} features, got {features.shape[1]}.')
+            return self.booster.inplace_predict(
+                features, iteration_range=self.iteration_range, validate_features=False
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,298 @@
+# Importing packages
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import PredictionCacheConfig
+
+
+# Creating a class to store the cached predictions in the memory of the process
+class LocalCacheBackend():
+    '''
+    This class stores the cached predictions in an ordered dictionary of the process,
+    which evicts the least recently used entry once it holds max_size entries. Each
+    entry is stored with the time at which it expires.
+    '''
+    # The entries are only seen by this process
+    shared = False
+    
+    # Creating the constructor for the class
+    def __init__(self, max_size=4096):
+        '''
+        This is the constructor for the LocalCacheBackend class.
+        '''
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    # Creating a method to read an entry
+    def get(self, key, now):
+        '''
+        This method returns the value of an entry, or None if there is no entry for the
+        key or the entry expired at or before now.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    # Creating a method to write an entry
+    def set(self, key, value, expires_at, now):
+        '''
+        This method writes an entry which expires at expires_at, and evicts the least
+        recently used entries beyond max_size.
+        '''
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    # Creating a method to remove every entry
+    def clear(self):
+        '''
+        This method removes every entry.
+        '''
+        with self._lock:
+            self._entries.clear()
+    
+    # Creating a method to count the entries
+    def __len__(self):
+        return len(self._entries)
+
+
+# Creating a class to store the cached predictions in redis
+class RedisCacheBackend():
+    '''
+    This class stores the cached predictions in redis, so that they are shared by every
+    worker and server. The redis client is only imported when this backend is used.
+    Each entry is written with a time to live that ends when the entry expires, and
+    all the keys share a prefix, so that they can be removed together. The entries of
+    the backend are not counted, since counting them scans the whole keyspace.
+    '''
+    # The entries are shared by every worker and server
+    shared = True
+    
+    # Creating the constructor for the class
+    def __init__(self, url, key_prefix='congestion:prediction', client=None, batch_size=1000):
+        '''
+        This is the constructor for the RedisCacheBackend class.
+        '''
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError('The redis prediction cache backend requires the redis package.') from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.batch_size = batch_size
+        self.evictions = 0
+    
+    # Creating a method to read an entry
+    def get(self, key, now):
+        '''
+        This method returns the value of an entry, or None if there is no entry for the
+        key. Expired entries have already been removed by redis.
+        '''
+        value = self.client.get(f'{self.key_prefix}:{key}')
+        return None if value is None else json.loads(value)
+    
+    # Creating a method to write an entry
+    def set(self, key, value, expires_at, now):
+        '''
+        This method writes an entry with a time to live that ends at expires_at.
+        '''
+        ttl_ms = max(int((expires_at - now).total_seconds() * 1000), 1)
+        self.client.psetex(f'{self.key_prefix}:{key}', ttl_ms, json.dumps(value))
+    
+    # Creating a method to remove every entry
+    def clear(self):
+        '''
+        This method removes every entry with the key prefix of the cache, unlinking the
+        keys in batches of batch_size, so that the memory is freed by redis in the
+        background and each batch is a single round trip.
+        '''
+        keys = []
+        for key in self.client.scan_iter(match=f'{self.key_prefix}:*', count=self.batch_size):
+            keys.append(key)
+            if len(keys) >= self.batch_size:
+                self.client.unlink(*keys)
+                keys = []
+        if keys:
+            self.client.unlink(*keys)
+
+
+# Creating a class to cache the predictions of single-segment requests
+class PredictionCache():
+    '''
+    This class caches the predictions of single-segment requests. Two requests for the
+    same roadway segment in the same hour of a weekday, or of a weekend day, get the same
+    feature vector, so the cache key is the model version, the segment, the hour and the
+    weekend flag. An entry expires at the end of the hour in which it was written. A
+    cache kept by the process is cleared when the model changes, while the entries of a
+    shared cache, whose keys also hold the model version, are left to expire, so that
+    the workers do not clear the entries of each other. The class counts the hits and
+    misses of the cache.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, backend=None, clock=datetime.now):
+        '''
+        This is the constructor for the PredictionCache class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        backend : object - The backend storing the entries, with the get, set and clear
+        methods of LocalCacheBackend. Defaults to the backend of PredictionCacheConfig.
+        clock : callable - The function returning the current time.
+        ===================================================================================
+        '''
+        self.cache_config = PredictionCacheConfig()
+        self.backend = backend if backend is not None else self.create_backend()
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.clears = 0
+        self.model_version = None
+        self._lock = threading.Lock()
+    
+    # Creating a method to create the backend of the configuration
+    def create_backend(self):
+        '''
+        This method creates the "local" or "redis" backend of the configuration.
+        '''
+        if self.cache_config.backend == 'redis':
+            return RedisCacheBackend(self.cache_config.redis_url, self.cache_config.key_prefix)
+        if self.cache_config.backend != 'local':
+            raise ValueError(f'Unknown prediction cache backend {self.cache_config.backend}.')
+        return LocalCacheBackend(self.cache_config.max_size)
+    
+    # Creating a method to summarize the identity of a model in a short string
+    @staticmethod
+    def get_model_version(cache_key):
+        '''
+        This method returns a short hash of the cache key of a model bundle, which changes
+        whenever the model or the preprocessor object changes.
+        '''
+        return hashlib.sha1(repr(cache_key).encode()).hexdigest()[:12]
+    
+    # Creating a method to fetch a prediction, computing it on a miss
+    def get_or_compute(self, cache_key, x, y, direction, compute, time=None):
+        '''
+        This method returns the cached prediction for a request, or computes it with
+        compute and caches it until the end of the current hour.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        cache_key : tuple - The cache key of the model bundle which makes the prediction.
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        compute : callable - The function which makes the prediction on a miss.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        
+        ----------------
+        Returns:
+        ----------------
+        preds : list - The prediction for the roadway segment.
+        ===================================================================================
+        '''
+        try:
+            now = self.clock()
+            time = time or now
+            model_version = self.get_model_version(cache_key)
+            
+            # Clearing the cache of the process when the model changes
+            if model_version != self.model_version:
+                with self._lock:
+                    if model_version != self.model_version:
+                        if self.model_version is not None and not getattr(self.backend, 'shared', False):
+                            self.backend.clear()
+                            self.clears += 1
+                            logging.info('Model changed. Prediction cache cleared.')
+                        self.model_version = model_version
+            
+            key = f'{model_version}:{int(x)}_{int(y)}_{direction}:{time.hour}:{int(time.weekday() > 4)}'
+            preds = self.backend.get(key, now)
+            if preds is not None:
+                with self._lock:
+                    self.hits += 1
+                return preds
+            
+            with self._lock:
+                self.misses += 1
+            preds = [float(pred) for pred in compute()]
+            expires_at = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            self.backend.set(key, preds, expires_at, now)
+            return preds
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to report the hits and misses
+    def get_metrics(self):
+        '''
+        This method returns the number of hits, misses, evictions and clears of the
+        cache, its hit rate and its number of entries, which is None for a shared cache.
+        '''
+        with self._lock:
+            hits, misses, clears = self.hits, self.misses, self.clears
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'evictions': getattr(self.backend, 'evictions', 0),
+            'clears': clears,
+            'size': None if getattr(self.backend, 'shared', False) else len(self.backend)
+        }
+
+
+# Creating the prediction cache shared by the threads of the process
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+
+# Creating a function to fetch the prediction cache of the process
+def get_prediction_cache():
+    '''
+    This function returns the prediction cache shared by the threads of the process,
+    and creates it on the first call.
+    '''
+    global _prediction_cache
+    if _prediction_cache is None:
+        with _prediction_cache_lock:
+            if _prediction_cache is None:
+                _prediction_cache = PredictionCache()
+    return _prediction_cache
+
+
+# Creating a function to drop the prediction cache in a forked process
+def _reset_after_fork():
+    '''
+    This function drops the prediction cache in a forked process, so that the locks
+    and the redis connection of the parent process are not shared with the child.
+    '''
+    global _prediction_cache, _prediction_cache_lock
+    _prediction_cache = None
+    _prediction_cache_lock = threading.Lock()
+
+
+# Dropping the prediction cache in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
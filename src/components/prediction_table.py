@@ -0,0 +1,182 @@
+# Importing packages
+import os
+import sys
+import hashlib
+import numpy as np
+from datetime import datetime
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import PredictionTableConfig
+
+
+# Creating a class to hold the predictions for every segment and time bucket
+class PredictionTable():
+    '''
+    This class holds the prediction of a model for every roadway segment seen during
+    training, every hour of the day and both values of the weekend flag. These are all
+    the inputs the model can receive from the prediction API, so a prediction becomes an
+    array lookup. The table is saved as a compressed NumPy archive named after the model
+    version it was scored with and a key derived from the hashes of the model and of the
+    content of the preprocessor object, so a table is never used with another
+    preprocessor object.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, model_version, segments, values, table_key=''):
+        '''
+        This is the constructor for the PredictionTable class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        model_version : str - The version of the model which scored the table.
+        segments : list - The "x_y_direction" of each row of the table.
+        values : np.ndarray - The (n_segments, 24, 2) predictions, indexed by the segment,
+        the hour and the weekend flag.
+        table_key : str - The digest of the hashes of the model and the preprocessor object
+        which scored the table.
+        ===================================================================================
+        '''
+        self.model_version = str(model_version)
+        self.table_key = str(table_key)
+        self.segments = [str(segment) for segment in segments]
+        self.values = np.asarray(values, dtype=np.float32)
+        self.segment_index = {segment: i for i, segment in enumerate(self.segments)}
+    
+    # Creating a method to score the table with a model
+    @classmethod
+    def build(cls, plan, model, model_version, preprocessor_sha256=None):
+        '''
+        This method scores every roadway segment of the inference plan, at every hour of
+        the day and for both values of the weekend flag, with a single call to the model.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        plan : InferencePlan - The inference plan of the preprocessor object.
+        model : XGBRegressor - The trained model.
+        model_version : str - The version of the model.
+        preprocessor_sha256 : str - The SHA-256 hash of the preprocessor object file the
+        inference plan was compiled from.
+        
+        ----------------
+        Returns:
+        ----------------
+        table : PredictionTable - The scored table.
+        ===================================================================================
+        '''
+        try:
+            if plan.lag_features:
+                raise ValueError('The predictions of a model which uses lag features cannot be precomputed.')
+            segments = sorted(plan.segment_means)
+            segment_means = np.array([plan.segment_means[segment] for segment in segments], dtype=np.float64)
+            
+            # Creating the feature vectors of every segment, hour and weekend flag
+            features = np.broadcast_to(
+                plan.templates, (len(segments),) + plan.templates.shape
+            ).copy()
+            features[..., plan.segment_index] = segment_means[:, None, None]
+            
+            # Scoring all the feature vectors at once
+            preds = np.asarray(model.predict(features.reshape(-1, features.shape[-1])), dtype=np.float32)
+            values = preds.reshape(features.shape[:-1])
+            
+            return cls(model_version, segments, values, cls.get_table_key(model_version, preprocessor_sha256))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to look up a prediction
+    def lookup(self, x, y, direction, time=None):
+        '''
+        This method looks up the prediction for a roadway segment at a given time.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        x : int - The x coordinate of the roadway segment.
+        y : int - The y coordinate of the roadway segment.
+        direction : str - The direction of travel.
+        time : datetime - The time of the prediction. Defaults to the current time.
+        
+        ----------------
+        Returns:
+        ----------------
+        prediction : float - The prediction, or None if the segment is not in the table.
+        ===================================================================================
+        '''
+        row = self.segment_index.get(f'{int(x)}_{int(y)}_{direction}')
+        if row is None:
+            return None
+        if time is None:
+            time = datetime.now()
+        return self.values[row, time.hour, int(time.weekday() > 4)]
+    
+    # Creating a method to compute the key of the table of a model and preprocessor object
+    @staticmethod
+    def get_table_key(model_sha256, preprocessor_sha256):
+        '''
+        This method returns a short digest of the hash of the model and the hash of the
+        content of the preprocessor object file. It only changes when the model or the
+        content of the preprocessor object changes, and not when the preprocessor object
+        file is copied or touched.
+        '''
+        if preprocessor_sha256 is None:
+            return ''
+        return hashlib.sha256(f'{model_sha256}:{preprocessor_sha256}'.encode()).hexdigest()[:16]
+    
+    # Creating a method to build the path of the table of a model version
+    @staticmethod
+    def get_table_path(model_version, table_key='', table_dir=None):
+        '''
+        This method returns the path of the table scored with a model version and the
+        preprocessor object whose table key is given.
+        '''
+        table_dir = table_dir or PredictionTableConfig().prediction_table_dir
+        file_name = ''.join(char if char.isalnum() else '_' for char in str(model_version))[-64:]
+        if table_key:
+            file_name = f'{file_name}_{table_key}'
+        return os.path.join(table_dir, f'prediction_table_{file_name}.npz')
+    
+    # Creating a method to save the table
+    def save(self, file_path=None):
+        '''
+        This method saves the table as a compressed NumPy archive. The archive is written
+        to a temporary file first and then renamed, so a reader never sees a partially
+        written file.
+        '''
+        try:
+            file_path = file_path or self.get_table_path(self.model_version, self.table_key)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            temp_path = f'{file_path}.tmp'
+            with open(temp_path, 'wb') as file_obj:
+                np.savez_compressed(
+                    file_obj,
+                    model_version=np.array(self.model_version),
+                    table_key=np.array(self.table_key),
+                    segments=np.array(self.segments),
+                    values=self.values
+                )
+            os.replace(temp_path, file_path)
+            logging.info(f'Prediction table saved to {file_path}.')
+            return file_path
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to load a table
+    @classmethod
+    def load(cls, file_path):
+        '''
+        This method loads a table saved as a compressed NumPy archive.
+        '''
+        try:
+            with np.load(file_path, allow_pickle=False) as archive:
+                return cls(
+                    model_version=archive['model_version'].item(),
+                    segments=archive['segments'].tolist(),
+                    values=archive['values'],
+                    table_key=archive['table_key'].item() if 'table_key' in archive else ''
+                )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,284 @@
+# Importing packages
+import os
+import sys
+import time
+import resource
+import tempfile
+from contextlib import contextmanager
+from joblib import parallel_config
+from joblib.externals.loky import get_reusable_executor
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import ResourceSchedulerConfig
+
+
+# Creating a class to split the cores between the search and XGBoost
+class ResourceScheduler():
+    '''
+    This class splits a budget of cores between the outer parallelism of the hyperparameter
+    search (the number of joblib workers) and the inner parallelism of XGBoost (the number
+    of OpenMP threads of each fit), so that the workers times the threads never exceed the
+    budget. The class also pins the OpenMP threads of each search worker to its own
+    cores, and measures the CPU utilization achieved by the search.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, n_cores=None):
+        '''
+        This is the constructor for the ResourceScheduler class. It initializes the
+        number of cores available for training.
+        '''
+        self.scheduler_config = ResourceSchedulerConfig()
+        self.n_cores = n_cores or self.scheduler_config.n_cores or self.get_available_cores()
+    
+    # Creating a method to count the cores available to the process
+    @staticmethod
+    def get_available_cores():
+        '''
+        This method returns the number of cores the process is allowed to run on.
+        '''
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+    
+    # Creating a method to plan the split of the cores
+    def plan(self, n_rows, n_candidates, cv=3, search_strategy='grid'):
+        '''
+        This method chooses the number of search workers and the number of XGBoost threads
+        per worker. Small datasets do not benefit from many threads per fit, so the cores
+        go to the search workers, up to one worker per fit. Large datasets get more threads
+        per fit, and fewer workers, which also means fewer copies of the data in memory.
+        Searches which fit the candidates one after the other get every core for XGBoost.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        n_rows : int - The number of training rows.
+        n_candidates : int - The number of candidates in the search.
+        cv : int - The number of cross-validation folds.
+        search_strategy : str - The search strategy used by FindBestModel.
+        
+        ----------------
+        Returns:
+        ----------------
+        plan : dict - The number of cores, search workers and XGBoost threads per worker.
+        ===================================================================================
+        '''
+        try:
+            n_cores = max(int(self.n_cores), 1)
+            n_tasks = max(int(n_candidates) * int(cv), 1)
+            
+            if search_strategy in ('early_stopping', 'dmatrix'):
+                outer_jobs, inner_threads = 1, n_cores
+            else:
+                # Giving each fit as many threads as its rows can keep busy
+                inner_threads = min(max(int(n_rows) // self.scheduler_config.min_rows_per_thread, 1), n_cores)
+                # Giving the remaining cores to the search workers
+                outer_jobs = max(min(n_tasks, n_cores // inner_threads), 1)
+                # Giving the cores left over by a small search back to the fits
+                inner_threads = max(n_cores // outer_jobs, 1)
+            
+            return {
+                'n_cores': n_cores,
+                'outer_jobs': outer_jobs,
+                'inner_threads': inner_threads,
+                'n_tasks': n_tasks
+            }
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to split the cores between the search workers
+    def get_worker_places(self, plan, cores=None):
+        '''
+        This method gives each search worker its own cores, as many as its XGBoost
+        threads. The cores are taken in order, so the cores of a worker are next to each
+        other, and are reused from the start if the plan has more cores than the process.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        plan : dict - The plan returned by the plan method.
+        cores : list - The cores to split. Defaults to the cores available to the process.
+        
+        ----------------
+        Returns:
+        ----------------
+        places : list - The list of cores of each search worker.
+        ===================================================================================
+        '''
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+        inner_threads = plan['inner_threads']
+        return [
+            [cores[(worker * inner_threads + thread) % len(cores)] for thread in range(inner_threads)]
+            for worker in range(plan['outer_jobs'])
+        ]
+    
+    # Creating a context manager to pin the OpenMP threads to the cores
+    @contextmanager
+    def pin_threads(self, plan, cores=None):
+        '''
+        This method pins the OpenMP threads of the search to the cores. OpenMP places the
+        threads of every process from the first place, so the search workers cannot share
+        one list of places. While the context is active, the joblib workers that are
+        started run an initializer which claims the cores of one worker, sets its
+        OpenMP places to them and binds the worker to them. With a single worker, the
+        search runs in this process, whose OpenMP runtime was loaded with xgboost and no
+        longer reads its environment variables, so every thread of the process is bound
+        to the cores instead, and the previous binding is restored when the context
+        exits.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        plan : dict - The plan returned by the plan method.
+        cores : list - The cores to split between the workers. Defaults to the cores
+        available to the process.
+        ===================================================================================
+        '''
+        if plan['outer_jobs'] <= 1:
+            previous_affinity = bind_process_threads(self.get_worker_places(plan, cores)[0])
+            try:
+                yield
+            finally:
+                restore_process_threads(previous_affinity)
+            return
+        
+        # Letting each worker claim the cores of one slot, so no two workers get the
+        # same cores
+        with tempfile.TemporaryDirectory() as slot_dir:
+            with parallel_config(
+                backend='loky',
+                initializer=pin_worker_threads,
+                initargs=(slot_dir, self.get_worker_places(plan, cores), self.scheduler_config.proc_bind)
+            ):
+                yield
+    
+    # Creating a context manager to measure the CPU utilization of the search
+    @contextmanager
+    def track_utilization(self, plan):
+        '''
+        This method measures the wall-clock time and the CPU time of the process and its
+        workers while the search runs, and logs the split and the CPU utilization, which
+        is the CPU time divided by the wall-clock time of the cores in the plan. The
+        CPU time of the search workers is only counted once they have exited, so the
+        reusable joblib executor is shut down at the end of the search.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        plan : dict - The plan returned by the plan method.
+        
+        ----------------
+        Returns:
+        ----------------
+        report : dict - The plan, updated with the wall-clock time, the CPU time and the
+        CPU utilization when the search is done.
+        ===================================================================================
+        '''
+        report = dict(plan)
+        logging.info(
+            f"Training on {plan['n_cores']} cores: {plan['outer_jobs']} search workers "
+            f"x {plan['inner_threads']} XGBoost threads."
+        )
+        start_wall = time.perf_counter()
+        start_cpu = self.get_cpu_time()
+        try:
+            yield report
+        finally:
+            # Shutting down the workers, so that their CPU time is counted
+            get_reusable_executor().shutdown(wait=True)
+            
+            wall_time = time.perf_counter() - start_wall
+            cpu_time = self.get_cpu_time() - start_cpu
+            used_cores = plan['outer_jobs'] * plan['inner_threads']
+            report['wall_time'] = wall_time
+            report['cpu_time'] = cpu_time
+            report['cpu_utilization'] = cpu_time / (wall_time * used_cores) if wall_time > 0 else 0.0
+            logging.info(f'Training resource report: {report}')
+    
+    # Creating a method to read the CPU time of the process and its children
+    @staticmethod
+    def get_cpu_time():
+        '''
+        This method returns the user and system CPU time of the process and of its
+        children which have exited.
+        '''
+        total = 0.0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            usage = resource.getrusage(who)
+            total += usage.ru_utime + usage.ru_stime
+        return total
+
+
+# Creating a function to pin the OpenMP threads of a search worker to its cores
+def pin_worker_threads(slot_dir, places, proc_bind):
+    '''
+    This function runs when a search worker starts. It claims the first slot that no
+    other worker has claimed, by creating its file, and pins the worker to the cores of
+    the slot. It runs before XGBoost is loaded in the worker, so the OpenMP runtime reads
+    the places of the worker. A worker started after every slot is claimed is not pinned.
+    '''
+    for slot, cores in enumerate(places):
+        try:
+            os.close(os.open(os.path.join(slot_dir, str(slot)), os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            continue
+        os.environ['OMP_PROC_BIND'] = proc_bind
+        os.environ['OMP_PLACES'] = ','.join(f'{{{core}}}' for core in cores)
+        if hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError:
+                logging.info(f'The worker could not be bound to the cores {cores}.')
+        return
+
+
+# Creating a function to list the threads of the process
+def get_thread_ids():
+    '''
+    This function returns the ids of the threads of the process, or an empty list if
+    they cannot be listed.
+    '''
+    try:
+        return [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        return []
+
+
+# Creating a function to bind every thread of the process to a list of cores
+def bind_process_threads(cores):
+    '''
+    This function binds every thread of the process, including the OpenMP threads which
+    are already running, to a list of cores. The threads started afterwards inherit the
+    binding of the thread which starts them. It returns the previous binding of each
+    thread, to be passed to restore_process_threads.
+    '''
+    if not hasattr(os, 'sched_setaffinity'):
+        logging.info('The threads cannot be bound to cores on this platform.')
+        return {}
+    previous_affinity = {0: os.sched_getaffinity(0)}
+    for tid in get_thread_ids():
+        try:
+            previous_affinity[tid] = os.sched_getaffinity(tid)
+            os.sched_setaffinity(tid, cores)
+        except OSError:
+            # Skipping the threads which have exited
+            continue
+    logging.info(f'The threads of the process were bound to the cores {sorted(set(cores))}.')
+    return previous_affinity
+
+
+# Creating a function to restore the binding of the threads of the process
+def restore_process_threads(previous_affinity):
+    '''
+    This function restores the binding returned by bind_process_threads. The threads
+    started while the threads were bound get the previous binding of the process.
+    '''
+    if not previous_affinity:
+        return
+    for tid in get_thread_ids():
+        try:
+            os.sched_setaffinity(tid, previous_affinity.get(tid, previous_affinity[0]))
+        except OSError:
+            continue
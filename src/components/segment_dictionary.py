@@ -0,0 +1,290 @@
+# Importing packages
+import os
+import sys
+import json
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src.exception import CustomException
+from src.logger import logging
+
+
+# Creating a class to encode the roadway segments as integer codes
+class SegmentDictionary():
+    '''
+    This class maps each roadway segment, which is a combination of the "x" and "y"
+    coordinates and the direction of travel, to a compact integer code. The codes are
+    looked up with a NumPy gather on a dense (x, y, direction) array, so encoding a
+    dataset never builds a string per row. The encoded segments are returned as a pandas
+    categorical, whose categories are the "x_y_direction" labels used by the mean
+    encoder, the inference plan and the feature store. Segments that are not in the
+    dictionary get the code -1, which pandas reads as a missing category. The
+    dictionary is saved as a json file, which is shared by the train and serve paths.
+    '''
+    # Creating the code given to the segments which are not in the dictionary
+    UNKNOWN = -1
+    
+    # Creating the memo of the dictionaries loaded from a file, keyed by the path and
+    # the modification time of the file
+    _loaded = {}
+    _loaded_lock = threading.Lock()
+    
+    # Creating the constructor for the class
+    def __init__(self, segments=None):
+        '''
+        This is the constructor for the SegmentDictionary class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        segments : list - The (x, y, direction) of each segment, in the order of their
+        codes.
+        ===================================================================================
+        '''
+        self.segments = []
+        self.partial_fit_segments(segments or [])
+    
+    # Creating a method to fit the dictionary on a dataset
+    def fit(self, df:pd.DataFrame):
+        '''
+        This method replaces the dictionary with the segments of a dataset. The segments
+        are sorted, so that the order of the codes is the order of the labels, and a
+        feature store sorted by the codes is also sorted by the labels.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - A dataset with the "x", "y" and "direction" features.
+        
+        ----------------
+        Returns:
+        ----------------
+        The fitted dictionary.
+        ===================================================================================
+        '''
+        try:
+            segments = self.get_unique_segments(df)
+            self.segments = []
+            return self.partial_fit_segments(sorted(segments, key=self.get_label))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to add the new segments of a dataset to the dictionary
+    def partial_fit(self, df:pd.DataFrame):
+        '''
+        This method adds the segments of a dataset which are not in the dictionary yet.
+        The new segments get the next codes, so that the codes of the known segments
+        never change.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - A dataset with the "x", "y" and "direction" features.
+        
+        ----------------
+        Returns:
+        ----------------
+        The updated dictionary.
+        ===================================================================================
+        '''
+        try:
+            codes = self.encode_codes(df['x'], df['y'], df['direction'])
+            new_segments = self.get_unique_segments(df[codes == self.UNKNOWN])
+            return self.partial_fit_segments(sorted(new_segments, key=self.get_label))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to fit the dictionary on parquet files without loading them
+    @classmethod
+    def fit_parquet(cls, data_paths, batch_size=1000000):
+        '''
+        This method fits the dictionary on parquet files one batch of rows at a time,
+        reading only the "x", "y" and "direction" columns.
+        '''
+        try:
+            segments = set()
+            for data_path in data_paths:
+                parquet_file = pq.ParquetFile(data_path)
+                for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['x', 'y', 'direction']):
+                    segments.update(cls.get_unique_segments(batch.to_pandas()))
+            return cls(sorted(segments, key=cls.get_label))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to list the distinct segments of a dataset
+    @staticmethod
+    def get_unique_segments(df:pd.DataFrame):
+        '''
+        This method returns the distinct (x, y, direction) of a dataset.
+        '''
+        unique = df[['x', 'y', 'direction']].drop_duplicates()
+        return {
+            (int(x), int(y), str(direction))
+            for x, y, direction in zip(unique['x'], unique['y'], unique['direction'])
+        }
+    
+    # Creating a method to build the label of a segment
+    @staticmethod
+    def get_label(segment):
+        '''
+        This method returns the "x_y_direction" label of a segment.
+        '''
+        x, y, direction = segment
+        return f'{int(x)}_{int(y)}_{direction}'
+    
+    # Creating a method to append segments and rebuild the lookup array
+    def partial_fit_segments(self, segments):
+        '''
+        This method appends segments to the dictionary, and rebuilds the dense lookup
+        array, which holds the code of each (x, y, direction) and -1 elsewhere.
+        '''
+        known = set(self.segments)
+        for x, y, direction in segments:
+            segment = (int(x), int(y), str(direction))
+            if segment not in known:
+                self.segments.append(segment)
+                known.add(segment)
+        
+        self.labels = [self.get_label(segment) for segment in self.segments]
+        self.directions = sorted({direction for _, _, direction in self.segments})
+        self.dtype = pd.CategoricalDtype(self.labels)
+        self.code_index = {segment: code for code, segment in enumerate(self.segments)}
+        
+        shape = (
+            max((x for x, _, _ in self.segments), default=-1) + 1,
+            max((y for _, y, _ in self.segments), default=-1) + 1,
+            len(self.directions)
+        )
+        direction_index = {direction: i for i, direction in enumerate(self.directions)}
+        self.lookup_array = np.full(shape, self.UNKNOWN, dtype=np.int32)
+        for code, (x, y, direction) in enumerate(self.segments):
+            if x >= 0 and y >= 0:
+                self.lookup_array[x, y, direction_index[direction]] = code
+        return self
+    
+    # Creating a method to encode the segments of a dataset as integer codes
+    def encode_codes(self, x, y, direction):
+        '''
+        This method returns the code of each segment, or -1 for the segments which are
+        not in the dictionary.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        x : array-like - The x coordinate of each roadway segment.
+        y : array-like - The y coordinate of each roadway segment.
+        direction : array-like - The direction of travel of each roadway segment.
+        
+        ----------------
+        Returns:
+        ----------------
+        codes : np.ndarray - The code of each segment, as 32-bit integers.
+        ===================================================================================
+        '''
+        x = np.asarray(x, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64)
+        
+        # Factorizing the directions, and mapping the distinct directions to their
+        # position in the lookup array. Missing directions gather the trailing -1.
+        direction_codes, directions = pd.factorize(pd.Series(direction, copy=False))
+        direction_map = np.append(pd.Index(self.directions).get_indexer(directions), self.UNKNOWN)
+        direction_codes = direction_map[direction_codes]
+        
+        # Gathering the codes of the segments which fall inside the lookup array
+        codes = np.full(len(x), self.UNKNOWN, dtype=np.int32)
+        valid = (
+            (x >= 0) & (x < self.lookup_array.shape[0])
+            & (y >= 0) & (y < self.lookup_array.shape[1])
+            & (direction_codes >= 0)
+        )
+        codes[valid] = self.lookup_array[x[valid], y[valid], direction_codes[valid]]
+        return codes
+    
+    # Creating a method to encode the segments of a dataset as a categorical
+    def encode(self, x, y, direction):
+        '''
+        This method returns the segments as a pandas categorical, whose categories are the
+        "x_y_direction" labels of the dictionary. Unknown segments are missing values, and
+        a warning with their number is logged.
+        '''
+        try:
+            codes = self.encode_codes(x, y, direction)
+            n_unknown = int(np.count_nonzero(codes == self.UNKNOWN))
+            if n_unknown:
+                logging.warning(f'{n_unknown} rows have a roadway segment which is not in the segment dictionary.')
+            return pd.Categorical.from_codes(codes, dtype=self.dtype)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to look up the code of a single segment
+    def lookup(self, x, y, direction):
+        '''
+        This method returns the code of a single segment, or -1 if it is not in the
+        dictionary.
+        '''
+        return self.code_index.get((int(x), int(y), str(direction)), self.UNKNOWN)
+    
+    # Creating a method to return the number of segments
+    def __len__(self):
+        return len(self.segments)
+    
+    # Creating a method to save the dictionary as a json file
+    def save(self, file_path):
+        '''
+        This method saves the dictionary as a json file. The file is written to a
+        temporary file first and then renamed, so a reader never sees a partially
+        written file.
+        '''
+        try:
+            temp_path = f'{file_path}.tmp'
+            with open(temp_path, 'w') as file_obj:
+                json.dump({'segments': [list(segment) for segment in self.segments]}, file_obj)
+            os.replace(temp_path, file_path)
+            logging.info(f'Segment dictionary with {len(self)} segments saved to {file_path}.')
+            return file_path
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to load the dictionary from a json file
+    @classmethod
+    def load(cls, file_path):
+        '''
+        This method loads a dictionary saved as a json file. The loaded dictionaries are
+        kept until their file changes, so that the serve path only reads the file once.
+        '''
+        try:
+            key = (os.path.abspath(file_path), os.path.getmtime(file_path))
+            dictionary = cls._loaded.get(key)
+            if dictionary is None:
+                with open(file_path, 'r') as file_obj:
+                    dictionary = cls(json.load(file_obj)['segments'])
+                with cls._loaded_lock:
+                    cls._loaded = {
+                        path: loaded for path, loaded in cls._loaded.items() if path[0] != key[0]
+                    }
+                    cls._loaded[key] = dictionary
+            return dictionary
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Creating a function to replace the lock of the loaded dictionaries in a forked process
+def _reset_after_fork():
+    '''
+    This function replaces the lock of the loaded dictionaries in a forked process, so
+    that a lock held by another thread of the parent at the time of the fork does not
+    stay locked in the child. The dictionaries loaded before the fork are kept.
+    '''
+    SegmentDictionary._loaded_lock = threading.Lock()
+
+
+# Replacing the lock in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,17 +1,35 @@
 # Importing packages
 import sys
 import os
+import json
+import shutil
+import glob
+import itertools
+from datetime import datetime
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from src.logger import logging
 from src.exception import CustomException
 from src.components.config_entity import StoreFeatureConfig
+from src.components.config_entity import DataIngestionConfig
+from src.components.config_entity import TimeSplitConfig
+from src.components.data_schema import DataSchema
+from src.components.time_split import TimeSplit
+from src.instrumentation import instrument
 
 # Creating a class to store the transformed datasets.
 class FeatureStoreCreation():
     '''
-    This class contains methods to store the transformed datasets. The class
-    contains two methods - a constructor and a method to store the transformed
-    datasets.
+    This class contains methods to store the transformed datasets. Each transformed
+    dataset is stored as a parquet dataset partitioned by month, compressed with zstd.
+    The class contains methods to store the transformed datasets, either at once or
+    one batch at a time, to append new partitions to the transformed train dataset,
+    to read the transformed datasets with column projection and filter pushdown, to
+    write and memory-map an uncompressed Arrow copy of the transformed datasets, and
+    to read and write the metadata of the feature store. The transformed datasets are
+    cast to the dtypes of the data schema when they are written and read.
     '''
     # Creating the class constructor
     def __init__(self):
@@ -20,9 +38,12 @@ class FeatureStoreCreation():
         the path in which the transformed datasets will be stored.
         '''
         self.feature_store_config = StoreFeatureConfig()
+        self.data_ingestion_config = DataIngestionConfig()
+        self.data_schema = DataSchema()
     
-    # Creating the method to store the transformed datasets and also create the 
+    # Creating the method to store the transformed datasets and also create the
     # feature store folder.
+    @instrument()
     def create_feature_store(self, train_set, test_set):
         '''
         This method stores the transformed datasets in the feature store folder.
@@ -33,6 +54,33 @@ class FeatureStoreCreation():
         train_path : pandas dataframe - This is the train dataset.
         test_path : pandas dataframe - This is the test dataset.
         
+        ----------------
+        Returns:
+        ----------------
+        transformed train data path : str - Returns the path to the transformed train dataset.
+        transformed test data path : str - Returns the path to the transformed test dataset.
+        ===========================================================================
+        '''
+        try:
+            return self.create_streaming_feature_store([train_set], [test_set])
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to store the transformed datasets one batch at a time
+    @instrument()
+    def create_streaming_feature_store(self, train_batches, test_batches):
+        '''
+        This method stores the transformed datasets in the feature store folder, one batch
+        at a time, so only one batch is held in memory at a time. The existing transformed
+        datasets are replaced.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        train_batches : iterable - The transformed train dataset as pandas dataframes.
+        test_batches : iterable - The transformed test dataset as pandas dataframes.
+        
         ----------------
         Returns:
         ----------------
@@ -45,15 +93,525 @@ class FeatureStoreCreation():
             dir_name = os.path.dirname(self.feature_store_config.xform_train_path)
             os.makedirs(dir_name, exist_ok=True)
             
-            # Saving the transformed datasets
-            train_set.to_parquet(self.feature_store_config.xform_train_path, index=False, compression='gzip')
-            test_set.to_parquet(self.feature_store_config.xform_test_path, index=False, compression='gzip')
+            # Saving the transformed datasets one batch at a time
+            feature_schema = None
+            for batches, dataset_path in (
+                (train_batches, self.feature_store_config.xform_train_path),
+                (test_batches, self.feature_store_config.xform_test_path)
+            ):
+                self.remove_dataset(dataset_path)
+                schema = self.write_dataset(batches, dataset_path, 'part-{i}.parquet')
+                feature_schema = feature_schema or schema
+            
+            # Resetting the metadata, since the feature store was fully rebuilt
+            self.reset_metadata(feature_schema.names, self.get_dtypes(feature_schema))
             
             return (
                 self.feature_store_config.xform_train_path,
                 self.feature_store_config.xform_test_path
             )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to write batches into a partitioned parquet dataset
+    def write_dataset(self, batches, dataset_path, basename_template, expected_columns=None, expected_dtypes=None, allow_empty=False):
+        '''
+        This method writes batches of a transformed dataset into a parquet dataset,
+        partitioned by month. The batches are cast to the dtypes of the data schema,
+        and the rows of each batch are sorted by roadway segment before they are
+        written.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        batches : iterable - The transformed dataset as pandas dataframes.
+        dataset_path : str - The root folder of the parquet dataset.
+        basename_template : str - The template of the names of the written files.
+        expected_columns : list - If provided, the columns that the batches must have.
+        expected_dtypes : dict - If provided, the dtypes that the batches must have, as
+        returned by get_dtypes.
+        allow_empty : bool - Whether to write nothing, instead of raising an error, when
+        there are no batches.
+        
+        ----------------
+        Returns:
+        ----------------
+        schema : pa.Schema - The arrow schema of the written dataset, or None if nothing
+        was written.
+        ===========================================================================
+        '''
+        try:
+            config = self.feature_store_config
+            
+            # Converting the batches into arrow record batches
+            def to_table(batch):
+                batch = self.data_schema.enforce_features(batch).sort_values(config.sort_cols, kind='stable')
+                return pa.Table.from_pandas(batch, preserve_index=False)
+            
+            batches = iter(batches)
+            first_batch = next(batches, None)
+            if first_batch is None:
+                if allow_empty:
+                    return None
+                raise ValueError(f'There is no data to write to {dataset_path}.')
+            first_table = to_table(first_batch)
+            schema = first_table.schema
+            if expected_columns is not None and list(schema.names) != list(expected_columns):
+                raise ValueError(f'The columns of the batch do not match {dataset_path}.')
+            if expected_dtypes is not None and self.get_dtypes(schema) != expected_dtypes:
+                raise ValueError(f'The dtypes of the batch do not match {dataset_path}. A full rebuild is required.')
+            
+            def record_batches():
+                yield from first_table.to_batches()
+                for batch in batches:
+                    table = to_table(batch)
+                    if not table.schema.equals(schema):
+                        raise ValueError(f'The columns of the batch do not match {dataset_path}.')
+                    yield from table.to_batches()
+            
+            # Writing the dataset, partitioned by month
+            ds.write_dataset(
+                record_batches(),
+                dataset_path,
+                schema=schema,
+                format='parquet',
+                partitioning=config.partition_cols,
+                partitioning_flavor='hive',
+                file_options=ds.ParquetFileFormat().make_write_options(compression=config.compression),
+                basename_template=basename_template,
+                min_rows_per_group=config.row_group_size,
+                max_rows_per_group=config.row_group_size,
+                existing_data_behavior='overwrite_or_ignore'
+            )
+            
+            return schema
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to describe the dtypes of an arrow schema
+    @staticmethod
+    def get_dtypes(schema):
+        '''
+        This method returns the dtype of each column of an arrow schema, as recorded in
+        the metadata. The width of the codes of a categorical column is left out, since
+        it grows with the number of categories.
+        '''
+        return {
+            field.name: f'dictionary<{field.type.value_type}>' if pa.types.is_dictionary(field.type) else str(field.type)
+            for field in schema
+        }
+    
+    # Creating a method to remove a transformed dataset
+    def remove_dataset(self, dataset_path):
+        '''
+        This method removes a transformed dataset, which is either a single parquet
+        file or a folder.
+        '''
+        try:
+            if os.path.isdir(dataset_path):
+                shutil.rmtree(dataset_path)
+            elif os.path.exists(dataset_path):
+                os.remove(dataset_path)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read a transformed dataset
+    def read_feature_store(self, dataset_path=None, columns=None, filters=None):
+        '''
+        This method reads a transformed dataset from the feature store. Only the
+        requested columns are read, and the filters are pushed down, so partitions
+        and row groups that do not match the filters are skipped. The datasets written
+        before the data schema are cast to its dtypes.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        dataset_path : str - The path to the transformed dataset. Defaults to the
+        transformed train dataset.
+        columns : list - The columns to read. Defaults to all the columns.
+        filters : list - The filters to push down, for example
+        [('month', '=', 199104), ('segment', 'in', ['0_0_EB', '0_0_NB'])].
+        
+        ----------------
+        Returns:
+        ----------------
+        df : pandas dataframe - The transformed dataset.
+        ===========================================================================
+        '''
+        try:
+            dataset_path = dataset_path or self.feature_store_config.xform_train_path
+            table = pq.read_table(dataset_path, columns=columns, filters=filters)
+            df = self.data_schema.enforce_features(table.to_pandas())
+            if 'month' in df.columns:
+                df['month'] = df['month'].astype('int64')
+            return df
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read a transformed dataset one batch of rows at a time
+    def read_feature_store_batches(self, dataset_path=None, columns=None, filter=None):
+        '''
+        This method reads a transformed dataset from the feature store one batch of rows
+        at a time, so only one batch is held in memory at a time. The filter is pushed
+        down, and the batches are cast to the dtypes of the data schema.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        dataset_path : str - The path to the transformed dataset. Defaults to the
+        transformed train dataset.
+        columns : list - The columns to read. Defaults to all the columns.
+        filter : pyarrow.compute.Expression - The filter to push down, for example
+        pyarrow.dataset.field('time') < cutoff.
+        
+        ----------------
+        Returns:
+        ----------------
+        batches : generator - A generator of pandas dataframes.
+        ===========================================================================
+        '''
+        try:
+            dataset_path = dataset_path or self.feature_store_config.xform_train_path
+            dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+            for batch in dataset.to_batches(columns=columns, filter=filter):
+                if batch.num_rows == 0:
+                    continue
+                yield self.data_schema.enforce_features(batch.to_pandas())
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to write an uncompressed Arrow copy of the transformed datasets
+    def materialize_arrow_feature_store(self):
+        '''
+        This method writes the transformed datasets as uncompressed Arrow IPC (Feather)
+        files, with each column in a single contiguous buffer, so that they can be
+        memory-mapped and read without decompressing or copying the data. The training
+        rows are written in time order. The state of the feature store at the time of
+        writing is recorded in the metadata.
+        ==========================================================================
+        ----------------
+        Returns:
+        ----------------
+        transformed train arrow path : str - Returns the path to the train Arrow file.
+        transformed test arrow path : str - Returns the path to the test Arrow file.
+        ===========================================================================
+        '''
+        try:
+            config = self.feature_store_config
+            time_column = TimeSplitConfig().time_column
+            for dataset_path, arrow_path in (
+                (config.xform_train_path, config.xform_train_arrow_path),
+                (config.xform_test_path, config.xform_test_arrow_path)
+            ):
+                table = pq.read_table(dataset_path)
+                if 'month' in table.column_names:
+                    month_index = table.column_names.index('month')
+                    table = table.set_column(month_index, 'month', table['month'].cast(pa.int64()))
+                
+                # Writing the training rows in time order, so that the chronological
+                # split and folds select views of the mapped file instead of copies
+                if arrow_path == config.xform_train_arrow_path and time_column in table.column_names:
+                    order = TimeSplit.sort_order(table[time_column].to_numpy())
+                    if order is not None:
+                        table = table.take(order)
+                table = table.combine_chunks()
+                
+                # Writing the table to a temporary file and renaming it
+                temp_path = f'{arrow_path}.tmp'
+                with pa.OSFile(temp_path, 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+                os.replace(temp_path, arrow_path)
+            
+            # Recording the state of the feature store that was materialized
+            metadata = self.read_metadata()
+            if metadata is not None:
+                metadata['arrow_materialized'] = self.get_arrow_signature(metadata)
+                self.write_metadata(metadata)
+            
+            logging.info('Arrow copy of the feature store materialized.')
+            
+            return (
+                config.xform_train_arrow_path,
+                config.xform_test_arrow_path
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to describe the state of the feature store
+    def get_arrow_signature(self, metadata):
+        '''
+        This method returns the time of the last full rebuild and the list of appended
+        partitions, which together identify the contents of the feature store.
+        '''
+        return {
+            'rebuilt_at': metadata.get('rebuilt_at'),
+            'partitions': [partition['name'] for partition in metadata.get('partitions', [])]
+        }
+    
+    # Creating a method to check whether the Arrow copy is out of date
+    def is_arrow_stale(self):
+        '''
+        This method checks whether the Arrow copy of the feature store is missing or
+        older than the parquet datasets.
+        ==========================================================================
+        ----------------
+        Returns:
+        ----------------
+        stale : bool - True if the Arrow copy needs to be materialized again.
+        ===========================================================================
+        '''
+        try:
+            config = self.feature_store_config
+            if not (os.path.exists(config.xform_train_arrow_path) and os.path.exists(config.xform_test_arrow_path)):
+                return True
+            metadata = self.read_metadata()
+            if metadata is None:
+                return True
+            return metadata.get('arrow_materialized') != self.get_arrow_signature(metadata)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read the memory-mapped Arrow copy of a transformed dataset
+    def read_arrow_feature_store(self, arrow_path=None, columns=None):
+        '''
+        This method memory-maps the Arrow copy of a transformed dataset. The columns of
+        the returned dataframe are read-only views of the mapped file, so no data is
+        copied, and processes that read the same file share the same pages.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        arrow_path : str - The path to the Arrow file. Defaults to the transformed
+        train dataset.
+        columns : list - The columns to read. Defaults to all the columns.
+        
+        ----------------
+        Returns:
+        ----------------
+        df : pandas dataframe - The transformed dataset.
+        ===========================================================================
+        '''
+        try:
+            arrow_path = arrow_path or self.feature_store_config.xform_train_arrow_path
+            source = pa.memory_map(arrow_path, 'r')
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(columns)
+            return table.to_pandas(split_blocks=True)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read the column names of the Arrow copy of a transformed dataset
+    def read_arrow_columns(self, arrow_path=None):
+        '''
+        This method reads the column names of the Arrow copy of a transformed dataset,
+        without reading the data.
+        '''
+        try:
+            arrow_path = arrow_path or self.feature_store_config.xform_train_arrow_path
+            with pa.memory_map(arrow_path, 'r') as source:
+                return list(pa.ipc.open_file(source).schema.names)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read the metadata of the feature store
+    def read_metadata(self):
+        '''
+        This method reads the metadata of the feature store.
+        ==========================================================================
+        ----------------
+        Returns:
+        ----------------
+        metadata : dict - The columns of the raw and transformed data, and the list of
+        partitions appended to the transformed train dataset. None is returned if the
+        feature store has no metadata.
+        ===========================================================================
+        '''
+        try:
+            if not os.path.exists(self.feature_store_config.metadata_path):
+                return None
+            with open(self.feature_store_config.metadata_path, 'r') as file_obj:
+                return json.load(file_obj)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to write the metadata of the feature store
+    def write_metadata(self, metadata):
+        '''
+        This method writes the metadata of the feature store to a temporary file and
+        then renames it, so a reader never sees a partially written file.
+        '''
+        try:
+            temp_path = f'{self.feature_store_config.metadata_path}.tmp'
+            with open(temp_path, 'w') as file_obj:
+                json.dump(metadata, file_obj, indent=2)
+            os.replace(temp_path, self.feature_store_config.metadata_path)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to reset the metadata after a full rebuild
+    def reset_metadata(self, feature_columns, feature_dtypes):
+        '''
+        This method resets the metadata of the feature store after a full rebuild.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        feature_columns : list - The columns of the transformed datasets.
+        feature_dtypes : dict - The dtypes of the columns of the transformed datasets.
+        ===========================================================================
+        '''
+        try:
+            self.write_metadata({
+                'raw_columns': self.data_ingestion_config.raw_columns,
+                'feature_columns': list(feature_columns),
+                'feature_dtypes': feature_dtypes,
+                'partitions': [],
+                'rebuilt_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to append a new partition to the transformed train dataset
+    @instrument()
+    def append_feature_store_partition(self, partition_name, new_batches, commit_artifacts=None, holdout_batches=None, holdout_cutoff=None):
+        '''
+        This method writes a new partition of the transformed train dataset into the
+        feature store, one batch at a time, and records it in the metadata. The new
+        files are added to the month folders of the train dataset, and the existing
+        files are not rewritten. With a holdout cutoff, the chronological holdout is
+        kept: the test rows older than the cutoff are moved to the train dataset, and
+        the test dataset is rewritten with the test rows from the cutoff on and the
+        holdout rows of the new partition. Once the partition is written, the artifacts
+        updated with it are committed, and the metadata is written last. If the write
+        fails, the files of the partition are removed, so that it can be appended again.
+        ==========================================================================
+        ----------------
+        Parameters:
+        ----------------
+        partition_name : str - The name of the new partition.
+        new_batches : iterable - The transformed train rows of the new partition as
+        pandas dataframes.
+        commit_artifacts : callable - If provided, called once the partition is
+        written, to replace the saved artifacts with the ones updated with it.
+        holdout_batches : iterable - The transformed rows of the new partition from the
+        holdout cutoff on, as pandas dataframes.
+        holdout_cutoff : datetime64 - The time from which the rows are in the test
+        dataset. If None, the test dataset is not changed.
+        
+        ----------------
+        Returns:
+        ----------------
+        transformed train data path : str - Returns the path to the transformed train dataset.
+        ===========================================================================
+        '''
+        try:
+            config = self.feature_store_config
+            metadata = self.read_metadata()
+            if metadata is None or not os.path.isdir(config.xform_train_path):
+                raise ValueError('The feature store has no metadata. A full rebuild is required.')
+            if partition_name in [partition['name'] for partition in metadata['partitions']]:
+                raise ValueError(f'The partition {partition_name} is already in the feature store.')
+            feature_columns = metadata['feature_columns']
+            feature_dtypes = metadata.get('feature_dtypes')
+            staged_test_path = f'{config.xform_test_path}.staged'
+            
+            # Counting the rows of the new partition as they are written
+            counts = {'train': 0, 'holdout': 0, 'moved': 0}
+            def counted_batches(batches, key):
+                for batch in batches:
+                    counts[key] += len(batch)
+                    yield batch[feature_columns]
+            
+            # Writing the new partition one batch at a time, and removing its files if
+            # the write fails
+            try:
+                self.write_dataset(
+                    counted_batches(new_batches, 'train'),
+                    config.xform_train_path,
+                    f'{partition_name}-{{i}}.parquet',
+                    expected_columns=feature_columns,
+                    expected_dtypes=feature_dtypes,
+                    allow_empty=holdout_cutoff is not None
+                )
+                
+                if holdout_cutoff is not None:
+                    time_column = TimeSplitConfig().time_column
+                    cutoff = pa.scalar(holdout_cutoff)
+                    
+                    # Moving the test rows older than the cutoff to the train dataset
+                    self.write_dataset(
+                        counted_batches(
+                            self.read_feature_store_batches(config.xform_test_path, filter=ds.field(time_column) < cutoff), 'moved'
+                        ),
+                        config.xform_train_path,
+                        f'{partition_name}-moved-{{i}}.parquet',
+                        expected_columns=feature_columns,
+                        expected_dtypes=feature_dtypes,
+                        allow_empty=True
+                    )
+                    
+                    # Writing the test rows from the cutoff on and the holdout rows of the
+                    # new partition as the new test dataset
+                    self.remove_dataset(staged_test_path)
+                    self.write_dataset(
+                        itertools.chain(
+                            (batch[feature_columns] for batch in self.read_feature_store_batches(
+                                config.xform_test_path, filter=ds.field(time_column) >= cutoff
+                            )),
+                            counted_batches(holdout_batches or [], 'holdout')
+                        ),
+                        staged_test_path,
+                        'part-{i}.parquet',
+                        expected_columns=feature_columns,
+                        expected_dtypes=feature_dtypes
+                    )
+                    
+                    # Replacing the test dataset with the new one
+                    old_test_path = f'{config.xform_test_path}.old'
+                    self.remove_dataset(old_test_path)
+                    os.replace(config.xform_test_path, old_test_path)
+                    os.replace(staged_test_path, config.xform_test_path)
+                    self.remove_dataset(old_test_path)
+            except Exception:
+                for path in glob.glob(os.path.join(config.xform_train_path, '*', f'{partition_name}-*.parquet')):
+                    os.remove(path)
+                self.remove_dataset(staged_test_path)
+                raise
+            
+            # Committing the artifacts updated with the new partition
+            if commit_artifacts is not None:
+                commit_artifacts()
+            
+            # Recording the new partition in the metadata
+            partition = {
+                'name': partition_name,
+                'num_rows': counts['train'],
+                'appended_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            if holdout_cutoff is not None:
+                partition['holdout_cutoff'] = str(holdout_cutoff)
+                partition['num_holdout_rows'] = counts['holdout']
+                partition['num_moved_rows'] = counts['moved']
+            metadata['partitions'].append(partition)
+            self.write_metadata(metadata)
+            
+            logging.info(f'Partition {partition_name} appended to the feature store.')
             
+            return self.feature_store_config.xform_train_path
         
         except Exception as e:
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
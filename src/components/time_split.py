@@ -0,0 +1,215 @@
+# Importing packages
+import sys
+import numpy as np
+import pandas as pd
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import TimeSplitConfig
+
+
+# Creating a class to split time-sorted rows into a holdout and rolling-origin folds
+class TimeSplit():
+    '''
+    This class splits rows which are sorted by time into ranges of positions. The
+    holdout is the most recent "test_size" fraction of the rows. The cross-validation
+    folds are rolling-origin folds: the rows are cut into n_splits + 1 blocks, and the
+    k-th fold is trained on the first k blocks and validated on the next one. Each
+    boundary is moved back to the first row of its time, so the rows of one time are
+    never split between a training and a validation range. Since every range is
+    contiguous, it selects a view of a dataframe or an array rather than a copy. The
+    class has the splitter interface of scikit-learn, whose searches are given the
+    ranges as arrays of indices.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, n_splits=None, test_size=None, times=None):
+        '''
+        This is the constructor for the TimeSplit class.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        n_splits : int - The number of cross-validation folds. Defaults to the split
+        configuration.
+        test_size : float - The fraction of the rows in the holdout. Defaults to the split
+        configuration.
+        times : array - The sorted times of the rows split into folds. If it is not
+        provided, the boundaries of the folds are not moved.
+        ===================================================================================
+        '''
+        self.split_config = TimeSplitConfig()
+        self.n_splits = n_splits or self.split_config.n_splits
+        self.test_size = self.split_config.test_size if test_size is None else test_size
+        self.times = None if times is None else np.asarray(times)
+    
+    # Creating a method to find the order which sorts the rows by time
+    @staticmethod
+    def sort_order(times):
+        '''
+        This method returns the positions of the rows in time order, or None if the rows
+        are already sorted. The sort is stable, so the rows of one time keep their order.
+        '''
+        times = np.asarray(times)
+        if len(times) < 2 or not (times[1:] < times[:-1]).any():
+            return None
+        return np.argsort(times, kind='stable')
+    
+    # Creating a method to select a range of rows
+    @staticmethod
+    def select(data, rows):
+        '''
+        This method selects a range or an array of rows of a dataframe, a series or an
+        array. A range selects a view of the rows.
+        '''
+        return data.iloc[rows] if hasattr(data, 'iloc') else data[rows]
+    
+    # Creating a method to move a boundary back to the first row of its time
+    def snap(self, times, position):
+        '''
+        This method moves a boundary back to the first row with the same time as the row
+        at the boundary.
+        '''
+        if times is None or position >= len(times):
+            return position
+        return int(np.searchsorted(times, times[position], side='left'))
+    
+    # Creating a method to sort a dataset by time
+    def sort_by_time(self, df:pd.DataFrame, time_column=None)->pd.DataFrame:
+        '''
+        This method sorts a dataset by time. The dataset is returned as it is, without a
+        copy, if its rows are already sorted.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - The dataset.
+        time_column : str - The column with the time of each row. Defaults to the split
+        configuration.
+        
+        ----------------
+        Returns:
+        ----------------
+        df : pd.DataFrame - The dataset sorted by time.
+        ===================================================================================
+        '''
+        try:
+            order = self.sort_order(df[time_column or self.split_config.time_column].to_numpy())
+            if order is None:
+                return df
+            logging.info('Sorting the rows by time.')
+            return df.take(order)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to split a dataset into a train set and a chronological holdout
+    def holdout_split(self, df:pd.DataFrame, time_column=None):
+        '''
+        This method splits a dataset into a train set and a test set which holds the most
+        recent "test_size" fraction of the rows. The dataset is sorted by time first, if
+        it is not already, and the train and test sets are views of its rows.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        df : pd.DataFrame - The dataset.
+        time_column : str - The column with the time of each row. Defaults to the split
+        configuration.
+        
+        ----------------
+        Returns:
+        ----------------
+        train_set : pd.DataFrame - The rows before the holdout.
+        test_set : pd.DataFrame - The rows of the holdout.
+        ===================================================================================
+        '''
+        try:
+            time_column = time_column or self.split_config.time_column
+            df = self.sort_by_time(df, time_column)
+            start = self.holdout_start(df[time_column].to_numpy())
+            return (
+                df.iloc[:start],
+                df.iloc[start:]
+            )
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to find the first row of the holdout
+    def holdout_start(self, times):
+        '''
+        This method returns the position of the first row of the holdout in the sorted
+        times of the rows.
+        '''
+        start = self.snap(times, int(round(len(times) * (1 - self.test_size))))
+        if start <= 0 or start >= len(times):
+            raise ValueError(f'The rows span too few times for a holdout of {self.test_size} of the rows.')
+        return start
+    
+    # Creating a method to find the time at which the holdout starts
+    def holdout_cutoff(self, times):
+        '''
+        This method returns the time from which the rows are in the holdout, given the
+        times of the rows in any order. It selects the same rows as holdout_split, without
+        sorting the rows themselves, so the holdout can be split one batch at a time.
+        '''
+        try:
+            times = np.asarray(times)
+            position = int(round(len(times) * (1 - self.test_size)))
+            if position <= 0 or position >= len(times):
+                raise ValueError(f'The rows span too few times for a holdout of {self.test_size} of the rows.')
+            cutoff = np.partition(times, position)[position]
+            if not (times < cutoff).any():
+                raise ValueError(f'The rows span too few times for a holdout of {self.test_size} of the rows.')
+            return cutoff
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to create the ranges of the rolling-origin folds
+    def fold_ranges(self, n_rows):
+        '''
+        This method creates the training and validation ranges of the rolling-origin
+        folds of the sorted rows.
+        ===================================================================================
+        ----------------
+        Parameters:
+        ----------------
+        n_rows : int - The number of rows.
+        
+        ----------------
+        Returns:
+        ----------------
+        folds : list - The (training, validation) slices of each fold.
+        ===================================================================================
+        '''
+        try:
+            times = self.times
+            if times is not None and len(times) != n_rows:
+                raise ValueError(f'The folds of {n_rows} rows were given the times of {len(times)} rows.')
+            bounds = [self.snap(times, n_rows * k // (self.n_splits + 1)) for k in range(1, self.n_splits + 1)]
+            bounds.append(n_rows)
+            if bounds[0] <= 0 or any(start >= stop for start, stop in zip(bounds, bounds[1:])):
+                raise ValueError(f'The rows span too few times for {self.n_splits} rolling-origin folds.')
+            return [(slice(0, bounds[k]), slice(bounds[k], bounds[k + 1])) for k in range(self.n_splits)]
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to return the number of folds
+    def get_n_splits(self, X=None, y=None, groups=None):
+        '''
+        This method returns the number of cross-validation folds.
+        '''
+        return self.n_splits
+    
+    # Creating a method to generate the folds for the scikit-learn searches
+    def split(self, X, y=None, groups=None):
+        '''
+        This method generates the training and validation indices of each fold, as the
+        scikit-learn searches expect arrays of indices.
+        '''
+        for train_range, val_range in self.fold_ranges(len(X)):
+            yield (
+                np.arange(train_range.start, train_range.stop),
+                np.arange(val_range.start, val_range.stop)
+            )
@@ -0,0 +1,193 @@
+# Importing packages
+import sys
+import json
+import time
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+from src.logger import logging
+from src.components.config_entity import InstrumentationConfig
+
+# Reading the configuration of the instrumentation once, since the decorated functions
+# are called once per batch of rows
+instrumentation_config = InstrumentationConfig()
+
+# Creating the stack of the pipeline runs of each thread, which collect the records of
+# the stages run inside them. Stages are only measured inside a pipeline run, so the
+# helpers which are also called when serving a request are not measured there.
+_runs = threading.local()
+
+
+# Creating a function to check whether the stages of the thread are measured
+def is_recording():
+    '''
+    This function returns whether the instrumentation is enabled and a pipeline run is
+    active in the thread.
+    '''
+    return instrumentation_config.enabled and bool(getattr(_runs, 'stack', None))
+
+
+# Creating a function to read the peak resident memory of the process
+def get_peak_rss_mb():
+    '''
+    This function returns the peak resident memory of the process in megabytes.
+    '''
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+
+
+# Creating a function to count the rows of the input or output of a stage
+def count_rows(obj):
+    '''
+    This function returns the number of rows of a dataframe, series or array, the total
+    number of rows of a tuple or list of them, or None for any other object, such as a
+    path, a model or a generator of batches.
+    '''
+    shape = getattr(obj, 'shape', None)
+    if isinstance(shape, tuple) and len(shape) > 0:
+        return int(shape[0])
+    if isinstance(obj, (tuple, list)):
+        counts = [count_rows(item) for item in obj]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+# Creating a context manager to measure a stage
+@contextmanager
+def instrument_stage(stage, rows_in=None):
+    '''
+    This context manager measures the wall time, the CPU time and the growth of the peak
+    resident memory of a stage, and logs them as a JSON record along with the rows in
+    and out of the stage. The rows out can be set on the record it yields. The record
+    is added to the pipeline run of the thread, and is logged with the error if the
+    stage fails. Outside a pipeline run, the stage is not measured.
+    ===================================================================================
+    ----------------
+    Parameters:
+    ----------------
+    stage : str - The name of the stage.
+    rows_in : int - The number of rows the stage reads.
+    ===================================================================================
+    '''
+    if not is_recording():
+        yield {}
+        return
+    record = {'event': 'stage', 'stage': stage, 'rows_in': rows_in, 'rows_out': None}
+    start_peak_rss = get_peak_rss_mb()
+    start_cpu = time.process_time()
+    start_time = time.perf_counter()
+    try:
+        yield record
+        record['status'] = 'ok'
+    except BaseException as e:
+        record['status'] = 'error'
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['wall_s'] = round(time.perf_counter() - start_time, 6)
+        record['cpu_s'] = round(time.process_time() - start_cpu, 6)
+        peak_rss = get_peak_rss_mb()
+        record['peak_rss_delta_mb'] = round(peak_rss - start_peak_rss, 2)
+        record['peak_rss_mb'] = round(peak_rss, 2)
+        _runs.stack[-1].add(record)
+        logging.info(json.dumps(record))
+
+
+# Creating a decorator to measure every call to a function
+def instrument(stage=None):
+    '''
+    This decorator measures every call to a function with instrument_stage. The stage
+    is named after the qualified name of the function, the rows in are counted on the
+    first dataframe argument, and the rows out on the returned value. Outside a pipeline
+    run, such as on the serving path, the function is called without being measured.
+    '''
+    def decorator(func):
+        stage_name = stage or func.__qualname__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_recording():
+                return func(*args, **kwargs)
+            rows_in = next(
+                (count for count in map(count_rows, list(args) + list(kwargs.values())) if count is not None), None
+            )
+            with instrument_stage(stage_name, rows_in) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+# Creating a class to summarize the stages of a pipeline run
+class PipelineRun():
+    '''
+    This class collects the records of the stages measured while a pipeline runs, and
+    summarizes the number of calls, wall time and CPU time of each stage, the total time
+    of the run and the peak memory of the process.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, pipeline):
+        '''
+        This is the constructor for the PipelineRun class.
+        '''
+        self.pipeline = pipeline
+        self.stages = {}
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+    
+    # Creating a method to add the record of a stage
+    def add(self, record):
+        '''
+        This method adds the record of a stage to the totals of its stage.
+        '''
+        totals = self.stages.setdefault(record['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'errors': 0})
+        totals['calls'] += 1
+        totals['wall_s'] += record['wall_s']
+        totals['cpu_s'] += record['cpu_s']
+        totals['errors'] += record['status'] == 'error'
+    
+    # Creating a method to summarize the run
+    def summarize(self, status='ok'):
+        '''
+        This method returns the summary of the run, with the stages sorted by their total
+        wall time.
+        '''
+        stages = sorted(self.stages.items(), key=lambda item: item[1]['wall_s'], reverse=True)
+        return {
+            'event': 'run_summary',
+            'pipeline': self.pipeline,
+            'status': status,
+            'wall_s': round(time.perf_counter() - self.start_time, 6),
+            'cpu_s': round(time.process_time() - self.start_cpu, 6),
+            'peak_rss_mb': round(get_peak_rss_mb(), 2),
+            'stages': {
+                name: {**totals, 'wall_s': round(totals['wall_s'], 6), 'cpu_s': round(totals['cpu_s'], 6)}
+                for name, totals in stages
+            }
+        }
+
+
+# Creating a context manager to summarize a pipeline run
+@contextmanager
+def pipeline_run(pipeline):
+    '''
+    This context manager collects the records of the stages measured inside it, and
+    logs the summary of the run as a JSON record when it exits, also if the pipeline
+    fails. The summary of the nested stages counts their time in each of the stages
+    which contain them.
+    '''
+    run = PipelineRun(pipeline)
+    if not hasattr(_runs, 'stack'):
+        _runs.stack = []
+    _runs.stack.append(run)
+    status = 'error'
+    try:
+        yield run
+        status = 'ok'
+    finally:
+        _runs.stack.remove(run)
+        run.summary = run.summarize(status)
+        logging.info(json.dumps(run.summary))
@@ -0,0 +1,518 @@
+# Importing packages
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from src.exception import CustomException
+from src.logger import logging
+from src.components.config_entity import LagFeatureConfig
+from src.instrumentation import instrument
+
+
+# Creating a function to convert times into 20-minute time slots
+def get_time_slot(time, slot_minutes=20):
+    '''
+    This function converts times into integer time slots, which count the number of
+    slot_minutes periods since the epoch, so that consecutive slots differ by one.
+    ==============================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    time : datetime or array-like - The times to convert.
+    slot_minutes : int - The length of a time slot in minutes.
+    
+    ---------------------
+    Returns:
+    ---------------------
+    slot : int or np.ndarray - The time slot of each time.
+    ===============================================================================================
+    '''
+    try:
+        if np.ndim(time) == 0:
+            return int(pd.Timestamp(time).value // (slot_minutes * 60 * 10**9))
+        times = pd.to_datetime(pd.Series(time, copy=False)).to_numpy(dtype='datetime64[ns]')
+        return times.astype(np.int64) // (slot_minutes * 60 * 10**9)
+    
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Creating a function to list the names of the lag and rolling mean features
+def get_lag_feature_names(config=None):
+    '''
+    This function returns the names of the lag features followed by the names of the
+    rolling mean features.
+    '''
+    config = config or LagFeatureConfig()
+    return list(config.lags) + list(config.rolling_windows)
+
+
+# Creating a function to return the number of past time slots the features look at
+def get_history_length(config=None):
+    '''
+    This function returns the number of past time slots read by the longest lag or
+    rolling window.
+    '''
+    config = config or LagFeatureConfig()
+    return max(list(config.lags.values()) + list(config.rolling_windows.values()))
+
+
+# Creating a function to create the lag and rolling mean features of the congestion
+@instrument()
+def create_lag_features(df, config=None):
+    '''
+    This function creates, for each row, the congestion of the same roadway segment in
+    earlier time slots (the previous two slots, the same slot yesterday and the same slot
+    last week), and the mean congestion of the segment over the slots before the row.
+    The congestion of each segment is laid out on a dense (segment, time slot) grid, so
+    that a lag is a shift along the time slots. Unlike a shift of the rows, a slot with
+    no observation stays missing, instead of pulling in an older observation. Lags and
+    means without any observation are NaN.
+    ==============================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    df : pd.DataFrame - A dataset with the "time", "x", "y", "direction" and "congestion"
+    features.
+    config : LagFeatureConfig - The lags and rolling windows to create.
+    
+    ---------------------
+    Returns:
+    ---------------------
+    lag_df : pd.DataFrame - The lag and rolling mean features, with the index of df.
+    ===============================================================================================
+    '''
+    try:
+        config = config or LagFeatureConfig()
+        
+        # Giving each segment a row and each time slot a column of the grid. The grid
+        # is padded on the left, so that the lags of the first slots fall on NaN.
+        segments = df.groupby(['x', 'y', 'direction'], sort=False, observed=True).ngroup().to_numpy()
+        slots = get_time_slot(df['time'], config.slot_minutes)
+        padding = get_history_length(config)
+        columns = slots - slots.min() + padding
+        grid = np.full((segments.max() + 1, columns.max() + 1), np.nan)
+        grid[segments, columns] = df['congestion'].to_numpy(dtype=np.float64)
+        
+        # Shifting the grid by each lag
+        lag_features = {
+            name: grid[segments, columns - lag]
+            for name, lag in config.lags.items()
+        }
+        
+        # Summing the congestion and counting the observations of the slots before
+        # each row from the cumulative sums along the time slots
+        observed = ~np.isnan(grid)
+        cum_sums = np.zeros((grid.shape[0], grid.shape[1] + 1))
+        cum_counts = np.zeros((grid.shape[0], grid.shape[1] + 1))
+        np.cumsum(np.where(observed, grid, 0.0), axis=1, out=cum_sums[:, 1:])
+        np.cumsum(observed, axis=1, out=cum_counts[:, 1:])
+        for name, window in config.rolling_windows.items():
+            sums = cum_sums[segments, columns] - cum_sums[segments, columns - window]
+            counts = cum_counts[segments, columns] - cum_counts[segments, columns - window]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                lag_features[name] = np.where(counts > 0, sums / counts, np.nan)
+        
+        return pd.DataFrame(lag_features, index=df.index)[get_lag_feature_names(config)]
+    
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+# Creating a class to hold the recent congestion of each segment for serving
+class SegmentHistory():
+    '''
+    This class holds the congestion observed for each roadway segment over the most
+    recent time slots, in a ring buffer of one row per segment and one column per slot,
+    so that the serving path builds the same lag and rolling mean features as
+    create_lag_features without scanning the history. Each column also holds the slot it
+    was written for, so that a column left over from an older lap of the ring buffer is
+    read as missing.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, config=None):
+        '''
+        This is the constructor for the SegmentHistory class.
+        '''
+        self.config = config or LagFeatureConfig()
+        self.capacity = get_history_length(self.config) + 1
+        
+        # Listing the slot offsets read by the features: one per lag, then the slots of
+        # each rolling window, which start at window_starts
+        windows = list(self.config.rolling_windows.values())
+        self.offsets = np.concatenate(
+            [np.array(list(self.config.lags.values()), dtype=np.int64)]
+            + [np.arange(1, window + 1, dtype=np.int64) for window in windows]
+        )
+        self.window_starts = len(self.config.lags) + np.concatenate([[0], np.cumsum(windows)[:-1]]).astype(np.int64)
+        self.segment_index = {}
+        self.values = np.full((0, self.capacity), np.nan)
+        self.slots = np.full((0, self.capacity), -1, dtype=np.int64)
+        self._lock = threading.Lock()
+    
+    # Creating a method to find the rows of the segments, adding the new segments
+    def get_rows(self, x, y, direction, add=False):
+        '''
+        This method returns the row of each segment in the ring buffer, or -1 for the
+        segments without a row. If add is True, rows are added for the new segments.
+        '''
+        keys = [f'{int(x_)}_{int(y_)}_{direction_}' for x_, y_, direction_ in zip(x, y, direction)]
+        if add:
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self.segment_index]
+            if new_keys:
+                for key in new_keys:
+                    self.segment_index[key] = len(self.segment_index)
+                n_new = len(new_keys)
+                self.values = np.vstack([self.values, np.full((n_new, self.capacity), np.nan)])
+                self.slots = np.vstack([self.slots, np.full((n_new, self.capacity), -1, dtype=np.int64)])
+        return np.array([self.segment_index.get(key, -1) for key in keys], dtype=np.int64)
+    
+    # Creating a method to record observed congestion
+    def update(self, df):
+        '''
+        This method records the congestion observed for a batch of rows with the "time",
+        "x", "y", "direction" and "congestion" features. Observations older than the one
+        already held for their position in the ring buffer are ignored.
+        '''
+        try:
+            slots = np.asarray(get_time_slot(df['time'], self.config.slot_minutes), dtype=np.int64)
+            congestion = df['congestion'].to_numpy(dtype=np.float64)
+            
+            # Writing the rows in time order, so that the newest slot wins a position
+            order = np.argsort(slots, kind='stable')
+            with self._lock:
+                rows = self.get_rows(
+                    df['x'].to_numpy()[order], df['y'].to_numpy()[order], df['direction'].to_numpy()[order], add=True
+                )
+                slots = slots[order]
+                positions = slots % self.capacity
+                newer = slots >= self.slots[rows, positions]
+                self.values[rows[newer], positions[newer]] = congestion[order][newer]
+                self.slots[rows[newer], positions[newer]] = slots[newer]
+            return int(newer.sum())
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to record a single observation
+    def observe(self, x, y, direction, congestion, time=None):
+        '''
+        This method records the congestion observed for a single segment at a given
+        time, which defaults to the current time.
+        '''
+        time = pd.Timestamp.now() if time is None else time
+        return self.update(pd.DataFrame({
+            'time': [pd.Timestamp(time)], 'x': [x], 'y': [y], 'direction': [direction], 'congestion': [congestion]
+        }))
+    
+    # Creating a method to read the features of a batch of requests
+    def get_features_batch(self, x, y, direction, time):
+        '''
+        This method reads the lag and rolling mean features of a batch of requests from
+        the ring buffer. Each feature reads a fixed number of positions, so the cost does
+        not depend on the length of the history.
+        ==============================================================================================
+        ---------------------
+        Parameters:
+        ---------------------
+        x : array-like - The x coordinate of each roadway segment.
+        y : array-like - The y coordinate of each roadway segment.
+        direction : array-like - The direction of travel of each roadway segment.
+        time : array-like - The time of each request.
+        
+        ---------------------
+        Returns:
+        ---------------------
+        features : np.ndarray - A (n_requests, n_features) array, in the order of
+        get_lag_feature_names.
+        ===============================================================================================
+        '''
+        try:
+            slots = np.asarray(get_time_slot(time, self.config.slot_minutes), dtype=np.int64).reshape(-1)
+            with self._lock:
+                rows = self.get_rows(x, y, direction)
+                values = self.read_slots(rows, slots[:, None] - self.offsets)
+            return self.reduce_slots(values)
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read the features of a single request
+    def get_features(self, x, y, direction, time=None):
+        '''
+        This method returns the lag and rolling mean features of a single request as a
+        dictionary keyed by the feature names.
+        '''
+        try:
+            time = pd.Timestamp.now() if time is None else time
+            slot = get_time_slot(time, self.config.slot_minutes)
+            with self._lock:
+                row = self.segment_index.get(f'{int(x)}_{int(y)}_{direction}', -1)
+                values = self.read_slots(np.array([row]), (slot - self.offsets)[None, :])
+            return dict(zip(get_lag_feature_names(self.config), self.reduce_slots(values)[0]))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to gather the congestion of given slots from the ring buffer
+    def read_slots(self, rows, wanted):
+        '''
+        This method gathers, for each row, the congestion held for the wanted slots, and
+        NaN for the slots which are not held or the rows of unknown segments (-1).
+        '''
+        if len(self.values) == 0:
+            return np.full(wanted.shape, np.nan)
+        known = rows >= 0
+        rows = np.where(known, rows, 0)[:, None]
+        positions = wanted % self.capacity
+        found = (self.slots[rows, positions] == wanted) & known[:, None]
+        return np.where(found, self.values[rows, positions], np.nan)
+    
+    # Creating a method to reduce the gathered slots into the features
+    def reduce_slots(self, values):
+        '''
+        This method turns the congestion gathered for the offsets into the lag features,
+        which read a single slot, and the rolling mean features, which average the
+        observed slots of their window.
+        '''
+        n_lags = len(self.config.lags)
+        features = [values[:, :n_lags]]
+        observed = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(observed, values, 0.0), self.window_starts, axis=1)
+        counts = np.add.reduceat(observed, self.window_starts, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features.append(np.where(counts > 0, sums / counts, np.nan))
+        return np.hstack(features)
+    
+    # Creating a method to load the most recent observations of parquet files
+    def warm_start(self, data_paths):
+        '''
+        This method records the observations of the most recent slots of parquet files
+        with the raw data, so that the lags are available as soon as the server starts.
+        '''
+        try:
+            frames = [
+                pd.read_parquet(path, columns=['time', 'x', 'y', 'direction', 'congestion'])
+                for path in data_paths if os.path.exists(path)
+            ]
+            if not frames:
+                return 0
+            df = pd.concat(frames, ignore_index=True)
+            slots = get_time_slot(df['time'], self.config.slot_minutes)
+            n_rows = self.update(df[slots > slots.max() - self.capacity])
+            logging.info(f'Segment history warmed up with {n_rows} observations.')
+            return n_rows
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Creating a class to hold the recent congestion of each segment in redis
+class RedisSegmentHistory(SegmentHistory):
+    '''
+    This class holds the ring buffer of each roadway segment in a redis hash, so that the
+    observations are shared by every worker and server, and outlive the workers replaced
+    when the model is reloaded. The fields of the hash are the positions in the ring
+    buffer and the values are the slot and the congestion written at the position. The
+    redis client is only imported when this backend is used.
+    '''
+    # Creating the constructor for the class
+    def __init__(self, config=None, client=None):
+        '''
+        This is the constructor for the RedisSegmentHistory class.
+        '''
+        super().__init__(config)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError('The redis segment history backend requires the redis package.') from e
+            client = redis.Redis.from_url(self.config.redis_url)
+        self.client = client
+        self.key_prefix = self.config.key_prefix
+    
+    # Creating a method to build the key of the hash of a segment
+    def get_key(self, x, y, direction):
+        '''
+        This method returns the key of the hash holding the ring buffer of a segment.
+        '''
+        return f'{self.key_prefix}:{int(x)}_{int(y)}_{direction}'
+    
+    # Creating a method to record observed congestion
+    def update(self, df):
+        '''
+        This method records the congestion observed for a batch of rows with the "time",
+        "x", "y", "direction" and "congestion" features. As in the local history, an
+        observation older than the one already held for its position in the ring buffer
+        is ignored. The slots held are read and the newer observations are written with
+        one round trip to redis each, so two workers writing the same position of the
+        same segment at the same instant keep the last write.
+        '''
+        try:
+            slots = np.asarray(get_time_slot(df['time'], self.config.slot_minutes), dtype=np.int64)
+            keys = [self.get_key(*segment) for segment in zip(df['x'], df['y'], df['direction'])]
+            congestion = df['congestion'].to_numpy(dtype=np.float64)
+            
+            # Keeping the newest observation of each position of each segment in the batch
+            fields = {}
+            for i in np.argsort(slots, kind='stable'):
+                fields.setdefault(keys[i], {})[int(slots[i] % self.capacity)] = (int(slots[i]), float(congestion[i]))
+            
+            # Reading the slots held for the positions, and writing the newer observations
+            reads = self.client.pipeline(transaction=False)
+            for key, mapping in fields.items():
+                reads.hmget(key, list(mapping))
+            writes = self.client.pipeline(transaction=False)
+            n_rows = 0
+            for (key, mapping), entries in zip(fields.items(), reads.execute()):
+                newer = {
+                    position: f'{slot}:{value!r}'
+                    for (position, (slot, value)), entry in zip(mapping.items(), entries)
+                    if entry is None or slot >= self.parse_entry(entry)[0]
+                }
+                if newer:
+                    writes.hset(key, mapping=newer)
+                    n_rows += len(newer)
+            writes.execute()
+            return n_rows
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to parse an entry of a hash
+    @staticmethod
+    def parse_entry(entry):
+        '''
+        This method returns the slot and the congestion of an entry of a hash.
+        '''
+        slot, value = (entry.decode() if isinstance(entry, bytes) else entry).split(':')
+        return int(slot), float(value)
+    
+    # Creating a method to gather the congestion of given slots from redis
+    def read_keys(self, keys, wanted):
+        '''
+        This method gathers, for the hash of each key, the congestion held for the wanted
+        slots, and NaN for the slots which are not held, with one round trip to redis.
+        '''
+        positions = wanted % self.capacity
+        pipeline = self.client.pipeline(transaction=False)
+        for key, row_positions in zip(keys, positions):
+            pipeline.hmget(key, [int(position) for position in row_positions])
+        values = np.full(wanted.shape, np.nan)
+        for i, entries in enumerate(pipeline.execute()):
+            for j, entry in enumerate(entries):
+                if entry is not None:
+                    slot, value = self.parse_entry(entry)
+                    if slot == wanted[i, j]:
+                        values[i, j] = value
+        return values
+    
+    # Creating a method to read the features of a batch of requests
+    def get_features_batch(self, x, y, direction, time):
+        '''
+        This method reads the lag and rolling mean features of a batch of requests from
+        redis, in the order of get_lag_feature_names.
+        '''
+        try:
+            slots = np.asarray(get_time_slot(time, self.config.slot_minutes), dtype=np.int64).reshape(-1)
+            keys = [self.get_key(*segment) for segment in zip(x, y, direction)]
+            return self.reduce_slots(self.read_keys(keys, slots[:, None] - self.offsets))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to read the features of a single request
+    def get_features(self, x, y, direction, time=None):
+        '''
+        This method returns the lag and rolling mean features of a single request as a
+        dictionary keyed by the feature names.
+        '''
+        try:
+            time = pd.Timestamp.now() if time is None else time
+            slot = get_time_slot(time, self.config.slot_minutes)
+            values = self.read_keys([self.get_key(x, y, direction)], (slot - self.offsets)[None, :])
+            return dict(zip(get_lag_feature_names(self.config), self.reduce_slots(values)[0]))
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to load the most recent observations of parquet files once
+    def warm_start(self, data_paths):
+        '''
+        This method records the observations of the most recent slots of parquet files
+        with the raw data, unless another worker has already warmed up the shared history.
+        '''
+        if not self.client.set(f'{self.key_prefix}:warm_started', 1, nx=True):
+            return 0
+        return super().warm_start(data_paths)
+
+
+# Creating a function to create the segment history of the configuration
+def create_segment_history(config=None):
+    '''
+    This function creates the "local" or "redis" segment history of the configuration.
+    '''
+    config = config or LagFeatureConfig()
+    if config.history_backend == 'redis':
+        return RedisSegmentHistory(config)
+    if config.history_backend != 'local':
+        raise ValueError(f'Unknown segment history backend {config.history_backend}.')
+    return SegmentHistory(config)
+
+
+# Creating a function to check that the segment history is shared by the workers
+def check_segment_history(workers, lag_features=None, config=None):
+    '''
+    This function raises an error if the model uses the lag features and several
+    workers would each keep their own segment history, since the observations posted
+    to one worker would then be missing from the features built by the others. Whether
+    the model uses the lag features defaults to LagFeatureConfig.enabled.
+    '''
+    config = config or LagFeatureConfig()
+    lag_features = config.enabled if lag_features is None else bool(lag_features)
+    if lag_features and config.history_backend == 'local' and workers > 1:
+        raise ValueError(
+            'The lag features with several workers require a shared segment history. '
+            'Set SEGMENT_HISTORY_BACKEND=redis or run a single worker.'
+        )
+
+
+# Creating the segment history shared by the threads of the process
+_segment_history = None
+_segment_history_lock = threading.Lock()
+
+
+# Creating a function to fetch the segment history of the process
+def get_segment_history():
+    '''
+    This function returns the segment history shared by the threads of the process. On
+    the first call, the history of the configured backend is created and warmed up from
+    the raw data listed in LagFeatureConfig.warm_start_paths.
+    '''
+    global _segment_history
+    if _segment_history is None:
+        with _segment_history_lock:
+            if _segment_history is None:
+                history = create_segment_history()
+                history.warm_start(history.config.warm_start_paths)
+                _segment_history = history
+    return _segment_history
+
+
+# Creating a function to replace the locks of the segment history in a forked process
+def _reset_after_fork():
+    '''
+    This function replaces the locks of the segment history in a forked process, so that
+    a lock held by another thread at the time of the fork does not stay locked. The
+    observations recorded before the fork are kept.
+    '''
+    global _segment_history_lock
+    _segment_history_lock = threading.Lock()
+    if _segment_history is not None:
+        _segment_history._lock = threading.Lock()
+
+
+# Replacing the locks in the processes forked from this process
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -13,9 +13,11 @@ os.makedirs(logs_path, exist_ok=True)
 # Creating the full path to store the log files
 LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE)
 
-# Overriding the basicConfig of the logging module
+# Overriding the basicConfig of the logging module. The log file is only created when
+# the first message is logged, so that importing the package does not leave an empty
+# log file behind.
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
+    handlers=[logging.FileHandler(LOG_FILE_PATH, delay=True)],
     format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO
 )
\ No newline at end of file
@@ -1,4 +1,8 @@
 # Importing packages
+import os
+import argparse
+from src.logger import logging
+from src.instrumentation import pipeline_run
 from src.components.data_ingestion import DataIngestion
 from src.components.data_transformation import DataTransformation
 from src.components.store_features import FeatureStoreCreation
@@ -6,14 +10,60 @@ from src.components.store_features import FeatureStoreCreation
 # Running the feature creation pipeline
 if __name__ == '__main__':
     
-    # Creating the artifacts folder and ingesting the data
-    ingestion_obj = DataIngestion()
-    path_to_train_data, path_to_test_data = ingestion_obj.initiate_data_ingestion()
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Create the feature store.')
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='Read, transform and write the data one batch at a time to bound the memory used.'
+    )
+    parser.add_argument(
+        '--incremental',
+        nargs='+',
+        metavar='NEW_DATA_PATH',
+        help='Update the preprocessor object and append the new partitions of data to the feature store, keeping the most recent rows in the test set.'
+    )
+    args = parser.parse_args()
     
-    # Transforming the datasets
-    transformation_obj = DataTransformation()
-    train_dataset, test_dataset = transformation_obj.initiate_data_transformation(path_to_train_data, path_to_test_data)
-        
-    # Storing the transformed datasets
-    feature_store_obj = FeatureStoreCreation()
-    feature_store_obj.create_feature_store(train_dataset, test_dataset)
\ No newline at end of file
+    # Logging the time and memory of each stage, and a summary of the run
+    with pipeline_run('feature_pipeline'):
+        ingestion_obj = DataIngestion()
+        transformation_obj = DataTransformation()
+        feature_store_obj = FeatureStoreCreation()
+        if args.incremental:
+            # Appending each new partition that is not in the feature store yet
+            for new_data_path in args.incremental:
+                metadata = feature_store_obj.read_metadata()
+                if metadata is None:
+                    raise ValueError('The feature store has no metadata. Run a full rebuild first.')
+                applied_partitions = [partition['name'] for partition in metadata['partitions']]
+                partition_name = os.path.splitext(os.path.basename(new_data_path))[0]
+                if partition_name in applied_partitions:
+                    logging.info(f'Skipping the partition {partition_name}, which is already in the feature store.')
+                    continue
+                partition_name, new_batches, holdout_batches, holdout_cutoff = (
+                    transformation_obj.initiate_incremental_data_transformation(new_data_path, metadata)
+                )
+                feature_store_obj.append_feature_store_partition(
+                    partition_name,
+                    new_batches,
+                    commit_artifacts=transformation_obj.commit_artifacts,
+                    holdout_batches=holdout_batches,
+                    holdout_cutoff=holdout_cutoff
+                )
+        elif args.streaming:
+            # Creating the artifacts folder and ingesting the data one batch at a time
+            path_to_train_data, path_to_test_data = ingestion_obj.initiate_streaming_data_ingestion()
+            
+            # Transforming and storing the datasets one batch at a time
+            train_batches, test_batches = transformation_obj.initiate_streaming_data_transformation(path_to_train_data, path_to_test_data)
+            feature_store_obj.create_streaming_feature_store(train_batches, test_batches)
+        else:
+            # Creating the artifacts folder and ingesting the data
+            path_to_train_data, path_to_test_data = ingestion_obj.initiate_data_ingestion()
+            
+            # Transforming the datasets
+            train_dataset, test_dataset = transformation_obj.initiate_data_transformation(path_to_train_data, path_to_test_data)
+            
+            # Storing the transformed datasets
+            feature_store_obj.create_feature_store(train_dataset, test_dataset)
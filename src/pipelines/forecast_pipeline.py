@@ -0,0 +1,53 @@
+# Importing packages
+import argparse
+from src.logger import logging
+from src.instrumentation import instrument
+from src.instrumentation import pipeline_run
+from src.components.forecast import ForecastGenerator
+
+# Creating a function to forecast the congestion of every segment with the latest model
+@instrument()
+def run_forecast(date=None, output_path=None):
+    '''
+    This function forecasts the congestion of every roadway segment for every 20-minute
+    time slot of a day, or of the next 24 hours if no day is given, with the latest
+    model, and saves the forecast as a parquet file.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    date : str - The day to forecast, as YYYY-MM-DD.
+    output_path : str - The path of the saved forecast.
+
+    ---------------------
+    Returns:
+    ---------------------
+    output_path : str - The path to the saved forecast.
+    ========================================================================================
+    '''
+    generator = ForecastGenerator()
+    forecast = generator.forecast_day(date) if date else generator.forecast_next()
+    output_path = generator.save(forecast, output_path)
+    logging.info(
+        f'Forecast of {len(forecast.segments)} segments x {len(forecast.times)} slots '
+        f'with model {forecast.model_version} saved to {output_path}.'
+    )
+    return output_path
+
+# Running the forecast script
+if __name__ == '__main__':
+    
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Forecast the congestion of every segment.')
+    parser.add_argument(
+        '--date',
+        help='The day to forecast, as YYYY-MM-DD. Defaults to the next 24 hours.'
+    )
+    parser.add_argument(
+        '--output',
+        help='The path of the saved forecast. Defaults to a file in artifacts/forecasts.'
+    )
+    args = parser.parse_args()
+    
+    with pipeline_run('forecast_pipeline'):
+        print(run_forecast(args.date, args.output))
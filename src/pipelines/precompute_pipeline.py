@@ -0,0 +1,39 @@
+# Importing packages
+from src.logger import logging
+from src.instrumentation import instrument
+from src.instrumentation import pipeline_run
+from src.components.make_predictions import MakePredictions
+from src.components.prediction_table import PredictionTable
+
+# Creating a function to precompute the prediction table of the latest model
+@instrument()
+def precompute_prediction_table():
+    '''
+    This function scores every roadway segment, hour of the day and weekend flag with the
+    latest model, and saves the prediction table named after the model version and the
+    hash of the preprocessor object.
+    ========================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    table_path : str - The path to the saved prediction table, or None if the model uses
+    lag features, whose predictions depend on the recent congestion.
+    ========================================================================================
+    '''
+    # Loading the latest model and the inference plan of the preprocessor object
+    bundle, plan = MakePredictions().load_inference_plan()
+    if plan.lag_features:
+        logging.info(f'Model {bundle.model_version} uses lag features. No prediction table is precomputed.')
+        return None
+
+    # Scoring and saving the prediction table
+    table = PredictionTable.build(plan, bundle.model, bundle.model_version, bundle.preprocessor_sha256)
+    table_path = table.save()
+    logging.info(f'Prediction table for model {bundle.model_version} saved to {table_path}.')
+
+    return table_path
+
+# Running the precompute script
+if __name__ == '__main__':
+    with pipeline_run('precompute_pipeline'):
+        precompute_prediction_table()
@@ -1,35 +1,53 @@
 # Importing packages
-import dagshub
-import mlflow
-from mlflow import MlflowClient
-from src.utils import save_run_params
+import argparse
+from src.instrumentation import pipeline_run
+from src.run_utils import save_run_params
 from src.components.model_trainer import ModelTrainer
+from src.components.model_store import LocalModelStore
+from src.components.config_entity import ModelStoreConfig
+from src.pipelines.precompute_pipeline import precompute_prediction_table
+
+# Creating a function to sync the trained model to the remote model registry
+def sync_model_to_registry(best_model, best_params):
+    '''
+    This function logs the trained model and its parameters to the remote model registry.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    best_model : XGBRegressor - This is the trained model.
+    best_params : dict - These are the best hyperparameters for the model.
+
+    ---------------------
+    Returns:
+    ---------------------
+    run_params : dict - The model uri, run id, model name and latest version of the model
+    in the model registry.
+    ========================================================================================
+    '''
+    # Importing the model registry clients, which are only needed to sync the model
+    import dagshub
+    import mlflow
+    from mlflow import MlflowClient
 
-# Running the training script
-if __name__ == '__main__':
-    
     # Initiating the dagshub client
     dagshub.init(repo_owner='abbeymaj', repo_name='congestion_analysis', mlflow=True)
-    
+
     # Setting the tracking URI for the model
     model_uri = 'https://dagshub.com/abbeymaj/congestion_analysis.mlflow'
     mlflow.set_tracking_uri(model_uri)
-    
+
     # Instantiating the mlflow client
     client = MlflowClient()
-    
+
     # Creating the experiment
     experiment_id = client.create_experiment('ca_training_1')
-    
+
     # Starting the training run
     run_params = {}
     with mlflow.start_run(run_name='training_pipeline_1', experiment_id=experiment_id) as run:
         # Fetch the run id
         run_id = run.info.run_id
-        # Instantiating the model trainer
-        trainer = ModelTrainer()
-        # Fetching the best model and best parameters 
-        best_model, best_params = trainer.initiate_model_training(save_model=False, make_prediction=False)
         # Logging the best model and the best parameters
         mlflow.log_params(best_params)
         model_info = mlflow.xgboost.log_model(
@@ -37,18 +55,67 @@ if __name__ == '__main__':
             artifact_path='models/training_model_1',
             registered_model_name='training_model_1'
         )
-        
+
         # Fetch the latest version of the model and the model name
         latest_version_info = client.get_latest_versions('training_model_1', stages=['None'])[0]
         model_name = latest_version_info.name
         latest_version = latest_version_info.version
-        
+
         # Storing the model uri and run id into a dictionary
         run_params['model_uri'] = model_info.model_uri
         run_params['run_id'] = run_id
         run_params['model_name'] = model_name
         run_params['latest_version'] = latest_version
-    
-    # Saving the run parameters as a json file
-    save_run_params(run_params)
-        
\ No newline at end of file
+
+    return run_params
+
+# Running the training script
+if __name__ == '__main__':
+
+    # Parsing the command line arguments
+    parser = argparse.ArgumentParser(description='Train the congestion model.')
+    parser.add_argument(
+        '--sync-registry',
+        action='store_true',
+        default=ModelStoreConfig().sync_registry,
+        help='Also sync the model to the remote model registry. The model is always saved to the local model store.'
+    )
+    parser.add_argument(
+        '--memory-map',
+        action='store_true',
+        help='Read the training data from the memory-mapped Arrow copy of the feature store.'
+    )
+    parser.add_argument(
+        '--search-strategy',
+        choices=['grid', 'halving', 'random', 'early_stopping', 'dmatrix'],
+        default='grid',
+        help='The strategy used to search the hyperparameters.'
+    )
+    args = parser.parse_args()
+
+    # Logging the time and memory of each stage, and a summary of the run
+    with pipeline_run('training_pipeline'):
+        # Instantiating the model trainer
+        trainer = ModelTrainer()
+        trainer.model_trainer_config.use_memory_map = args.memory_map
+        trainer.model_trainer_config.search_strategy = args.search_strategy
+        # Fetching the best model and best parameters
+        best_model, best_params = trainer.initiate_model_training(save_model=False, make_prediction=False)
+
+        # Syncing the model to the model registry, if requested
+        run_params = {}
+        if args.sync_registry:
+            run_params = sync_model_to_registry(best_model, best_params)
+
+        # Saving the model to the local model store
+        manifest = LocalModelStore().save_model(best_model, run_params)
+        run_params['local_model_path'] = manifest['local_model_path']
+        run_params['model_sha256'] = manifest['model_sha256']
+        run_params.setdefault('model_uri', manifest['local_model_path'])
+        run_params['best_params'] = best_params
+
+        # Saving the run parameters as a json file
+        save_run_params(run_params)
+
+        # Precomputing the prediction table of the new model
+        precompute_prediction_table()
@@ -0,0 +1,97 @@
+# Importing packages
+import os
+import json
+import pathlib
+from datetime import datetime
+
+
+# Creating a function to save the run parameters as a json file
+def save_run_params(run_params):
+    '''
+    This function saves the run parameters as a json file in the run_config folder. 
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    run_params : dict - This is the dictionary containing the run parameters.
+    
+    ---------------------
+    Returns:
+    ---------------------
+    Saves the run parameters as a json file into the run_config folder.
+    ========================================================================================
+    '''
+    now = datetime.now().strftime('%Y%m%d')
+    file_path = pathlib.Path().cwd() / 'run_config' / f'run_params_{now}.json'
+    with open(file_path, 'w') as file_obj:
+        json.dump(run_params, file_obj)
+
+
+# Creating a function to load the run parameters json file.
+def load_run_params(directory='run_config'):
+    '''
+    This function loads the run parameters as a json file, which is present
+    in the run_config folder. 
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    directory : str - This is the name of the directory in which the run parameters json
+    file is stored.
+    
+    ---------------------
+    Returns:
+    ---------------------
+    run_parameters : json - This is the run parameters json file.
+    ========================================================================================
+    '''
+    dir_path = pathlib.Path().cwd() / directory
+    json_files = os.listdir(dir_path)
+    latest_file = None
+    latest_date = None
+    for file_name in json_files:
+        date_str = file_name.split('_')[2].split('.')[0]
+        file_date = datetime.strptime(date_str, '%Y%m%d')
+        if not latest_date or file_date > latest_date:
+            latest_date = file_date
+            latest_file = dir_path / file_name
+    return latest_file
+
+
+# Creating a function to read the JSON file
+def read_json_file(file_path):
+    '''
+    This function reads the run parameters JSON file and returns the contents of the file.
+    ========================================================================================
+    ---------------------
+    Parameters:
+    ---------------------
+    file_path : str - This is the path to the run parameters json file.
+    
+    ---------------------
+    Returns:
+    ---------------------
+    run_parameters : json - This is the run pararmeters json file.
+    =========================================================================================
+    '''
+    with open(file_path, 'r') as file_obj:
+        data = json.load(file_obj)
+    return data
+
+# Creating a function to capture the current time
+def get_current_time():
+    '''
+    This function captures the time when the user enters data on the website and returns 
+    it in the format of YYYY-MM-DD HH:MM:SS. The function also converts the time string 
+    into a datetime object.
+    ========================================================================================
+    ---------------------
+    Returns:
+    ---------------------
+    current_time : datetime - This is the time at which the user entered data on the
+    website.
+    ========================================================================================
+    '''
+    current_time = str(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    current_time_conv = datetime.strptime(current_time, '%Y-%m-%d %H:%M:%S')
+    return current_time_conv
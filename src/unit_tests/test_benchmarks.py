@@ -0,0 +1,24 @@
+# Importing packages
+import pandas as pd
+from src.benchmarks.synthetic_data import generate_congestion_data
+from src.benchmarks.suite import compare_results
+from src.components.config_entity import DataIngestionConfig
+
+# Verifying that the synthetic dataset has the schema of the raw data
+def test_synthetic_data_schema():
+    df = generate_congestion_data(5000)
+    raw_df = pd.read_parquet(DataIngestionConfig().train_data_path)
+    assert list(df.columns) == list(raw_df.columns)
+    assert len(df) == 5000
+    assert df['congestion'].between(0, 100).all()
+    assert set(df['direction']) <= set(raw_df['direction'])
+    assert pd.to_datetime(df['time']).dt.minute.isin([0, 20, 40]).all()
+    assert not df.duplicated(['time', 'x', 'y', 'direction']).any()
+    pd.testing.assert_frame_equal(df, generate_congestion_data(5000))
+
+# Verifying that the stages slower than the baseline are reported
+def test_compare_results():
+    baseline = {'results': {'10000': {'predict': {'seconds': 1.0}, 'find_best_model': {'seconds': 2.0}}}}
+    current = {'results': {'10000': {'predict': {'seconds': 1.5}, 'find_best_model': {'seconds': 2.1}, 'api_forecast_cold': {'seconds': 0.1}}}}
+    regressions = compare_results(baseline, current)
+    assert [(regression['stage'], regression['ratio']) for regression in regressions] == [('predict', 1.5)]
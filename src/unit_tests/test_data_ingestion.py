@@ -3,6 +3,7 @@ import os
 import pytest
 import pandas as pd
 from src.components.config_entity import DataIngestionConfig
+from src.components.data_ingestion import DataIngestion
 
 # Creating a function to get the path to the train dataset
 @pytest.fixture(scope='function')
@@ -44,4 +45,40 @@ def test_train_dataset_column_count(train_dataset_path):
 # Verify that the test dataset has 5 columns
 def test_test_dataset_column_count(dataset_test_path):
     df = pd.read_parquet(dataset_test_path)
-    assert len(list(df.columns)) == 5
\ No newline at end of file
+    assert len(list(df.columns)) == 5
+# Verifying that the streaming data ingestion splits every row into the train or
+# test dataset
+def test_initiate_streaming_data_ingestion(train_dataset_path, tmp_path, monkeypatch):
+    source_path = os.path.abspath(train_dataset_path)
+    monkeypatch.chdir(tmp_path)
+    ingestion = DataIngestion()
+    ingestion.streaming_config.batch_size = 100000
+    train_path, test_path = ingestion.initiate_streaming_data_ingestion(source_path)
+    train_df = pd.read_parquet(train_path)
+    test_df = pd.read_parquet(test_path)
+    assert len(train_df) + len(test_df) == len(pd.read_parquet(source_path))
+    assert len(list(train_df.columns)) == 5
+    assert 0.25 < len(test_df) / (len(train_df) + len(test_df)) < 0.35
+
+# Verifying that the streaming and in-memory ingestion put the same rows in the test set
+@pytest.mark.parametrize('strategy', ['chronological', 'random'])
+def test_streaming_matches_in_memory_split(train_dataset_path, tmp_path, monkeypatch, strategy):
+    source_df = pd.read_parquet(train_dataset_path).iloc[:50000]
+    source_df.insert(0, 'row_id', range(len(source_df)))
+    source_path = os.path.join(tmp_path, 'source.parquet')
+    source_df.to_parquet(source_path, index=False)
+    monkeypatch.chdir(tmp_path)
+    ingestion = DataIngestion()
+    ingestion.time_split_config.strategy = strategy
+    ingestion.streaming_config.batch_size = 7000
+    ingestion.data_path = source_path
+    
+    datasets = []
+    for ingest in (ingestion.initiate_data_ingestion, lambda: ingestion.initiate_streaming_data_ingestion(source_path)):
+        train_path, test_path = ingest()
+        datasets.append([
+            pd.read_parquet(path).astype({'direction': str}).sort_values(['time', 'x', 'y', 'direction']).reset_index(drop=True)
+            for path in (train_path, test_path)
+        ])
+    for in_memory, streamed in zip(*datasets):
+        pd.testing.assert_frame_equal(streamed, in_memory)
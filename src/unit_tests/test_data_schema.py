@@ -0,0 +1,59 @@
+# Importing packages
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from src.exception import CustomException
+from src.components.data_schema import DataSchema
+
+# Creating a raw dataset with the dtypes of the source data
+@pytest.fixture
+def raw_df():
+    return pd.DataFrame({
+        'time': ['1991-04-01 00:00:00', '1991-04-01 00:20:00', '1991-04-06 12:40:00'],
+        'x': [0, 1, 2],
+        'y': [3, 2, 1],
+        'direction': ['EB', 'NB', 'EB'],
+        'congestion': [45, 70, 12]
+    })
+
+# Verifying that the raw data is cast to the compact dtypes and the memory saved reported
+def test_enforce_raw(raw_df):
+    schema = DataSchema()
+    df = schema.enforce_raw(raw_df, 'raw_data')
+    assert df['time'].dtype == 'datetime64[ns]'
+    assert (df['x'].dtype, df['y'].dtype, df['congestion'].dtype) == (np.uint8, np.uint8, np.uint8)
+    assert isinstance(df['direction'].dtype, pd.CategoricalDtype)
+    assert df['congestion'].tolist() == [45, 70, 12]
+    totals = schema.memory_report['raw_data']
+    assert totals['after_bytes'] < totals['before_bytes']
+    record = schema.log_memory_report()[0]
+    assert (record['event'], record['stage'], record['rows']) == ('memory_report', 'raw_data', 3)
+    assert schema.memory_report == {}
+
+    # Verifying that the arrow tables of the streaming ingestion get the same dtypes
+    table = schema.enforce_raw_table(pa.Table.from_pandas(raw_df, preserve_index=False))
+    assert table.to_pandas().dtypes.to_dict() == df.dtypes.to_dict()
+
+# Verifying that a value which does not fit its dtype is rejected instead of wrapped
+def test_enforce_raw_out_of_range(raw_df):
+    raw_df.loc[0, 'congestion'] = 300
+    with pytest.raises(CustomException):
+        DataSchema().enforce_raw(raw_df)
+    with pytest.raises(CustomException):
+        DataSchema().enforce_raw_table(pa.Table.from_pandas(raw_df, preserve_index=False))
+
+# Verifying that the transformed data gets float32 features, a uint8 target and a
+# categorical segment, and keeps the month key
+def test_enforce_features():
+    df = pd.DataFrame({
+        'remainder__hour_sin': np.array([0.0, 0.5], dtype=np.float64),
+        'congestion': np.array([45.0, 70.0]),
+        'month': np.array([199104, 199104], dtype=np.int32),
+        'segment': ['0_0_EB', '0_1_NB']
+    })
+    df = DataSchema().enforce_features(df)
+    assert df['remainder__hour_sin'].dtype == np.float32
+    assert df['congestion'].dtype == np.uint8
+    assert df['month'].dtype == np.int32
+    assert isinstance(df['segment'].dtype, pd.CategoricalDtype)
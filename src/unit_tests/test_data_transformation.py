@@ -1,11 +1,18 @@
 # Importing packages
 import os
+import pathlib
+import joblib
 import pytest
 import pandas as pd
+from feature_engine.encoding import MeanEncoder
+from src.utils import StreamingMeanEncoder
 from src.components.config_entity import DataIngestionConfig
 from src.components.config_entity import DataTransformationConfig
 from src.components.config_entity import StoreFeatureConfig
 from src.components.data_transformation import DataTransformation
+from src.components.store_features import FeatureStoreCreation
+from src.components.time_split import TimeSplit
+from src.exception import CustomException
 
 # Reading the train dataset path
 @pytest.fixture(scope='function')
@@ -99,4 +106,168 @@ def test_target_column_present_in_testset(xform_test_dataset_path):
     df = pd.read_parquet(xform_test_dataset_path)
     col_list = list(df.columns)
     assert 'congestion' in col_list 
-    
\ No newline at end of file
+    
+# Verifying that the streaming mean encoder matches the mean encoder when it is
+# fitted one batch at a time
+def test_streaming_mean_encoder_matches_mean_encoder(train_dataset_path):
+    df = DataTransformation().generate_features(pd.read_parquet(train_dataset_path))
+    X = df[['x_y_direction']]
+    y = df['congestion']
+    mean_encoder = MeanEncoder().fit(X, y)
+    streaming_encoder = StreamingMeanEncoder().fit(X.iloc[:1000], y.iloc[:1000])
+    streaming_encoder.partial_fit(X.iloc[1000:], y.iloc[1000:])
+    expected = mean_encoder.encoder_dict_['x_y_direction']
+    actual = streaming_encoder.encoder_dict_['x_y_direction']
+    assert expected.keys() == actual.keys()
+    for category in expected:
+        assert actual[category] == pytest.approx(expected[category])
+
+# Verifying that the streaming data transformation gives the same result as the
+# data transformation
+def test_initiate_streaming_data_transformation(train_dataset_path, dataset_test_path):
+    transform = DataTransformation()
+    transform.streaming_config.batch_size = 100000
+    train_batches, test_batches = transform.initiate_streaming_data_transformation(
+        train_dataset_path, dataset_test_path, save_object=False
+    )
+    streamed_train_set = pd.concat(list(train_batches), ignore_index=True)
+    streamed_test_set = pd.concat(list(test_batches), ignore_index=True)
+    train_set, test_set = DataTransformation().initiate_data_transformation(train_dataset_path, dataset_test_path, save_object=False)
+    pd.testing.assert_frame_equal(streamed_train_set, train_set.reset_index(drop=True))
+    pd.testing.assert_frame_equal(streamed_test_set, test_set.reset_index(drop=True))
+
+# Verifying that a new partition updates the preprocessor object and is appended to
+# the feature store without rewriting it
+def test_initiate_incremental_data_transformation(train_dataset_path, dataset_test_path, tmp_path, monkeypatch):
+    train_df = pd.read_parquet(train_dataset_path)
+    test_df = pd.read_parquet(dataset_test_path)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('artifacts')
+    train_df.iloc[:400000].to_parquet(DataIngestionConfig().train_data_path, index=False)
+    test_df.to_parquet(DataIngestionConfig().test_data_path, index=False)
+    train_df.iloc[400000:].to_parquet(tmp_path / 'new_day.parquet', index=False)
+    
+    # Building the feature store from the first rows of the train dataset, which were
+    # split at random
+    transform = DataTransformation()
+    transform.time_split_config.strategy = 'random'
+    train_set, test_set = transform.initiate_data_transformation(
+        DataIngestionConfig().train_data_path, DataIngestionConfig().test_data_path
+    )
+    feature_store = FeatureStoreCreation()
+    feature_store.create_feature_store(train_set, test_set)
+    base_files = {
+        str(path): os.path.getmtime(path)
+        for path in pathlib.Path(StoreFeatureConfig().xform_train_path).rglob('part-*.parquet')
+    }
+    
+    # Verifying that a failed write leaves the saved artifacts and the feature store as
+    # they were, so that the partition can be appended again
+    saved_preprocessor = pathlib.Path(DataTransformationConfig().preprocessor_obj_path).read_bytes()
+    partition_name, new_batches, holdout_batches, holdout_cutoff = transform.initiate_incremental_data_transformation(
+        str(tmp_path / 'new_day.parquet'), feature_store.read_metadata()
+    )
+    assert holdout_batches is None and holdout_cutoff is None
+    def failing_batches():
+        yield next(new_batches)
+        raise OSError('The disk is full.')
+    with pytest.raises(CustomException):
+        feature_store.append_feature_store_partition(
+            partition_name, failing_batches(), commit_artifacts=transform.commit_artifacts
+        )
+    assert pathlib.Path(DataTransformationConfig().preprocessor_obj_path).read_bytes() == saved_preprocessor
+    assert not list(pathlib.Path(StoreFeatureConfig().xform_train_path).rglob(f'{partition_name}-*.parquet'))
+    assert feature_store.read_metadata()['partitions'] == []
+    
+    # Appending the remaining rows as a new partition
+    partition_name, new_batches, _, _ = transform.initiate_incremental_data_transformation(
+        str(tmp_path / 'new_day.parquet'), feature_store.read_metadata()
+    )
+    feature_store.append_feature_store_partition(partition_name, new_batches, commit_artifacts=transform.commit_artifacts)
+    assert {path: os.path.getmtime(path) for path in base_files} == base_files
+    assert [partition['name'] for partition in feature_store.read_metadata()['partitions']] == ['new_day']
+    assert len(feature_store.read_feature_store()) == len(train_df)
+    
+    # Verifying that the updated encoding matches an encoder fitted on all the rows
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    actual = preprocessor.named_transformers_['me_pipeline']['mean_encoder'].encoder_dict_['x_y_direction']
+    features = transform.generate_features(train_df.copy())
+    expected = MeanEncoder().fit(features[['x_y_direction']], features['congestion']).encoder_dict_['x_y_direction']
+    for category in expected:
+        assert actual[category] == pytest.approx(expected[category])
+    
+    # Verifying that the same partition cannot be applied twice
+    with pytest.raises(CustomException):
+        transform.initiate_incremental_data_transformation(
+            str(tmp_path / 'new_day.parquet'), feature_store.read_metadata()
+        )
+
+# Verifying that a new partition of more recent rows keeps the test dataset the most
+# recent rows, and that only the train rows update the mean encoder
+def test_incremental_data_transformation_keeps_chronological_holdout(train_dataset_path, dataset_test_path, tmp_path, monkeypatch):
+    raw_df = pd.concat([pd.read_parquet(train_dataset_path), pd.read_parquet(dataset_test_path)])
+    raw_df = raw_df.sort_values('time', kind='stable').iloc[:200000].reset_index(drop=True)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('artifacts')
+    base_df, new_df = raw_df.iloc[:150000], raw_df.iloc[150000:]
+    new_df = new_df[new_df['time'] > base_df['time'].max()]
+    train_df, test_df = TimeSplit(test_size=0.3).holdout_split(base_df)
+    train_df.to_parquet(DataIngestionConfig().train_data_path, index=False)
+    test_df.to_parquet(DataIngestionConfig().test_data_path, index=False)
+    new_df.to_parquet(tmp_path / 'new_day.parquet', index=False)
+    
+    # Building the feature store and appending the new partition
+    transform = DataTransformation()
+    transform.time_split_config.strategy = 'chronological'
+    train_set, test_set = transform.initiate_data_transformation(
+        DataIngestionConfig().train_data_path, DataIngestionConfig().test_data_path
+    )
+    feature_store = FeatureStoreCreation()
+    feature_store.create_feature_store(train_set, test_set)
+    partition_name, new_batches, holdout_batches, holdout_cutoff = transform.initiate_incremental_data_transformation(
+        str(tmp_path / 'new_day.parquet'), feature_store.read_metadata()
+    )
+    feature_store.append_feature_store_partition(
+        partition_name, new_batches, commit_artifacts=transform.commit_artifacts,
+        holdout_batches=holdout_batches, holdout_cutoff=holdout_cutoff
+    )
+    
+    # Verifying that the test dataset holds the most recent rows of all the data
+    all_df = pd.concat([base_df, new_df], ignore_index=True)
+    expected_train, expected_test = TimeSplit(test_size=0.3).holdout_split(all_df)
+    xform_train = feature_store.read_feature_store(StoreFeatureConfig().xform_train_path)
+    xform_test = feature_store.read_feature_store(StoreFeatureConfig().xform_test_path)
+    assert xform_train['time'].max() < xform_test['time'].min()
+    assert len(xform_train) == len(expected_train)
+    assert len(xform_test) == len(expected_test)
+    partition = feature_store.read_metadata()['partitions'][0]
+    assert partition['num_moved_rows'] > 0 and partition['num_holdout_rows'] > 0
+    
+    # Verifying that the mean encoder was updated with the train rows only
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    actual = preprocessor.named_transformers_['me_pipeline']['mean_encoder'].encoder_dict_['x_y_direction']
+    features = transform.generate_features(expected_train.copy())
+    expected = MeanEncoder().fit(features[['x_y_direction']], features['congestion']).encoder_dict_['x_y_direction']
+    for category in expected:
+        assert actual[category] == pytest.approx(expected[category])
+
+# Verifying that the feature store is partitioned by month and that the filters and
+# columns are pushed down when the feature store is read
+def test_read_feature_store(train_dataset_path, dataset_test_path, tmp_path, monkeypatch):
+    train_set, test_set = DataTransformation().initiate_data_transformation(
+        train_dataset_path, dataset_test_path, save_object=False
+    )
+    monkeypatch.chdir(tmp_path)
+    feature_store = FeatureStoreCreation()
+    feature_store.create_feature_store(train_set, test_set)
+    months = sorted(train_set['month'].unique())
+    assert sorted(os.listdir(StoreFeatureConfig().xform_train_path)) == [f'month={month}' for month in months]
+    
+    df = feature_store.read_feature_store(
+        columns=['congestion', 'segment'],
+        filters=[('month', '=', months[0]), ('segment', '=', '0_0_EB')]
+    )
+    expected = train_set[(train_set['month'] == months[0]) & (train_set['segment'] == '0_0_EB')]
+    assert list(df.columns) == ['congestion', 'segment']
+    assert len(df) == len(expected)
+    assert df['congestion'].sum() == expected['congestion'].sum()
@@ -0,0 +1,67 @@
+# Importing packages
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBRegressor
+from src.components.config_entity import DataTransformationConfig
+from src.components.forecast import ForecastGenerator
+from src.components.inference_plan import InferencePlan
+from src.components.make_predictions import MakePredictions
+
+# Creating a model which counts the rows it scores
+class CountingModel():
+    def __init__(self, model):
+        self.model = model
+        self.n_calls = 0
+    
+    def predict(self, features):
+        self.n_calls += 1
+        return self.model.predict(features)
+
+# Replacing the cached bundle and inference plan with a small model trained on random
+# features and the plan of the fitted preprocessor object
+@pytest.fixture(scope='function')
+def plan_and_model(monkeypatch):
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    rng = np.random.default_rng(42)
+    X = rng.random((2000, len(plan.feature_names))) * 60
+    y = X[:, plan.segment_index] + 10 * X[:, -1]
+    model = CountingModel(XGBRegressor(n_estimators=20, max_depth=4, random_state=42).fit(X, y))
+    bundle = type('Bundle', (), {'model': model, 'model_version': 'version-1', 'cache_key': ('uri', 'sha', 1, 2)})()
+    monkeypatch.setattr(MakePredictions, 'load_inference_plan', lambda self: (bundle, plan))
+    monkeypatch.setattr(ForecastGenerator, '_forecasts', type(ForecastGenerator._forecasts)())
+    return plan, model, bundle
+
+# Verifying that the forecast of a day matches the predictions of single requests and
+# is served from the cache on the next query
+def test_forecast_day_matches_single_predictions(plan_and_model):
+    plan, model, bundle = plan_and_model
+    forecast = ForecastGenerator().forecast_day('1991-09-28')
+    assert forecast.values.shape == (len(plan.segment_means), 72)
+    assert model.n_calls == 1
+    for row, segment in enumerate(forecast.segments[::9]):
+        x, y, direction = segment.split('_')
+        for slot in (0, 25, 71):
+            time = pd.Timestamp(forecast.times[slot]).to_pydatetime()
+            expected = model.model.predict(plan.build_features(x, y, direction, time))[0]
+            assert forecast.values[row * 9, slot] == pytest.approx(expected)
+    assert ForecastGenerator().forecast_day('1991-09-28') is forecast
+    assert model.n_calls == 1
+    
+    # Verifying that a new preprocessor object with the same model version is scored again
+    bundle.cache_key = ('uri', 'sha', 3, 2)
+    assert ForecastGenerator().forecast_day('1991-09-28') is not forecast
+    assert model.n_calls == 2
+
+# Verifying that the forecast of the next 24 hours starts at the current slot and spans
+# two days
+def test_forecast_next(plan_and_model):
+    forecast = ForecastGenerator().forecast_next('1991-09-28 13:30')
+    assert len(forecast.times) == 72
+    assert forecast.times[0] == np.datetime64('1991-09-28T13:20')
+    assert forecast.times[-1] == np.datetime64('1991-09-29T13:00')
+    frame = forecast.to_frame()
+    assert len(frame) == 72 * len(forecast.segments)
+    assert list(frame.columns) == ['time', 'x', 'y', 'direction', 'prediction']
@@ -0,0 +1,55 @@
+# Importing packages
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from src.components.config_entity import DataTransformationConfig
+from src.components.data_transformation import DataTransformation
+from src.components.inference_plan import InferencePlan
+
+# Loading the fitted preprocessor object
+@pytest.fixture(scope='module')
+def preprocessor():
+    preprocessor_config = DataTransformationConfig()
+    return joblib.load(preprocessor_config.preprocessor_obj_path)
+
+# Creating requests for every roadway segment at several times of the week
+@pytest.fixture(scope='module')
+def requests_df(preprocessor):
+    segments = preprocessor.named_transformers_['me_pipeline']['mean_encoder'].encoder_dict_['x_y_direction']
+    times = pd.date_range('1991-09-23 00:00:00', periods=7 * 24, freq='h')[::5]
+    rows = []
+    for segment in segments:
+        x, y, direction = segment.split('_')
+        for time in times:
+            rows.append({'time': time, 'x': int(x), 'y': int(y), 'direction': direction})
+    return pd.DataFrame(rows)
+
+# Verifying that the plan builds the same features as the pandas path
+def test_plan_matches_pandas_path(preprocessor, requests_df):
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    expected = preprocessor.transform(DataTransformation().generate_features(requests_df.copy()))
+    assert plan.feature_names == list(expected.columns)
+    actual = np.vstack([
+        plan.build_features(row.x, row.y, row.direction, row.time.to_pydatetime())
+        for row in requests_df.itertuples()
+    ])
+    np.testing.assert_array_equal(actual, expected.to_numpy())
+
+# Verifying that a saved plan builds the same features
+def test_plan_save_and_load(preprocessor, tmp_path):
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    plan.save(tmp_path / 'inference_plan.json')
+    loaded_plan = InferencePlan.load(tmp_path / 'inference_plan.json')
+    time = datetime(1991, 9, 28, 17, 40)
+    np.testing.assert_array_equal(
+        loaded_plan.build_features(1, 2, 'NB', time),
+        plan.build_features(1, 2, 'NB', time)
+    )
+
+# Verifying that an unseen segment is encoded as NaN
+def test_plan_unseen_segment(preprocessor):
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    features = plan.build_features(9, 9, 'NB', datetime(1991, 9, 28, 17, 40))
+    assert np.isnan(features[0, plan.segment_index])
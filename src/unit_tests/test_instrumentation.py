@@ -0,0 +1,56 @@
+# Importing packages
+import json
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from src.instrumentation import instrument
+from src.instrumentation import instrument_stage
+from src.instrumentation import pipeline_run
+
+# Creating a function which keeps the rows with a positive value
+@instrument()
+def keep_positive(df):
+    return df[df['value'] > 0]
+
+# Creating a function which fails
+@instrument(stage='failing_stage')
+def fail(df):
+    raise ValueError('failed')
+
+# Reading the JSON records logged by the instrumentation
+def read_records(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records if record.getMessage().startswith('{')]
+
+# Verifying that a stage logs its time, memory and rows as a JSON record inside a
+# pipeline run, and is not measured outside of one
+def test_stage_record(caplog):
+    caplog.set_level(logging.INFO)
+    df = pd.DataFrame({'value': [1, -1, 2, -2, 3]})
+    assert len(keep_positive(df)) == 3
+    assert read_records(caplog) == []
+    with pipeline_run('test_pipeline'):
+        assert len(keep_positive(df)) == 3
+    record = read_records(caplog)[-2]
+    assert record['stage'] == 'keep_positive'
+    assert (record['rows_in'], record['rows_out'], record['status']) == (5, 3, 'ok')
+    assert record['wall_s'] >= 0 and record['cpu_s'] >= 0 and record['peak_rss_delta_mb'] >= 0
+
+# Verifying that the run summary adds up the stages, including the failed ones
+def test_pipeline_run_summary(caplog):
+    caplog.set_level(logging.INFO)
+    df = pd.DataFrame({'value': np.arange(-5, 5)})
+    with pytest.raises(ValueError):
+        with pipeline_run('test_pipeline') as run:
+            keep_positive(df)
+            keep_positive(df)
+            with instrument_stage('manual_stage', rows_in=10) as record:
+                record['rows_out'] = 4
+            fail(df)
+    summary = read_records(caplog)[-1]
+    assert summary == run.summary
+    assert (summary['event'], summary['pipeline'], summary['status']) == ('run_summary', 'test_pipeline', 'error')
+    assert summary['stages']['keep_positive']['calls'] == 2
+    assert summary['stages']['manual_stage']['calls'] == 1
+    assert summary['stages']['failing_stage']['errors'] == 1
+    assert read_records(caplog)[-2]['error'] == 'ValueError'
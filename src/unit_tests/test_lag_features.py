@@ -0,0 +1,136 @@
+# Importing packages
+import numpy as np
+import pandas as pd
+import pytest
+from src.components.config_entity import DataIngestionConfig
+from src.components.config_entity import LagFeatureConfig
+from src.components.data_transformation import DataTransformation
+from src.components.inference_plan import InferencePlan
+from src.lag_features import SegmentHistory
+from src.lag_features import RedisSegmentHistory
+from src.lag_features import check_segment_history
+from src.lag_features import create_lag_features
+from src.lag_features import get_lag_feature_names
+from src.lag_features import get_time_slot
+
+# Reading the train and test datasets as one history of the congestion
+@pytest.fixture(scope='module')
+def raw_df():
+    data_ingestion_config = DataIngestionConfig()
+    return pd.concat([
+        pd.read_parquet(data_ingestion_config.train_data_path),
+        pd.read_parquet(data_ingestion_config.test_data_path)
+    ], ignore_index=True)
+
+# Verifying that the features read from the ring buffer match the offline features
+def test_segment_history_matches_offline_features(raw_df):
+    offline = create_lag_features(raw_df)
+    slots = get_time_slot(raw_df['time'])
+    slot = np.quantile(slots, 0.8).astype(np.int64)
+    history = SegmentHistory()
+    history.update(raw_df[slots < slot])
+    requests = raw_df[slots == slot]
+    online = history.get_features_batch(requests['x'], requests['y'], requests['direction'], requests['time'])
+    np.testing.assert_allclose(online, offline.loc[requests.index].to_numpy())
+    row = requests.iloc[0]
+    single = history.get_features(row['x'], row['y'], row['direction'], pd.Timestamp(row['time']))
+    assert list(single) == get_lag_feature_names()
+    np.testing.assert_allclose(list(single.values()), offline.loc[requests.index[0]].to_numpy())
+
+# Verifying that a missing time slot is not filled with an older observation
+def test_missing_slots_stay_missing():
+    df = pd.DataFrame({
+        'time': pd.to_datetime(['1991-04-01 00:00', '1991-04-01 00:20', '1991-04-01 01:20']),
+        'x': 0, 'y': 0, 'direction': 'EB', 'congestion': [10, 20, 40]
+    })
+    offline = create_lag_features(df)
+    assert offline['lag_1'].isna().tolist() == [True, False, True]
+    assert offline.loc[1, 'lag_1'] == 10
+    assert offline.loc[2, 'rolling_mean_1h'] == 20
+    assert np.isnan(offline.loc[0, 'rolling_mean_1h'])
+    history = SegmentHistory()
+    history.update(df.iloc[:2])
+    assert np.isnan(history.get_features(0, 0, 'EB', df.loc[2, 'time'])['lag_1'])
+    assert np.isnan(history.get_features(1, 1, 'EB', df.loc[2, 'time'])['lag_1'])
+
+# Creating a client with the hash and pipeline commands of redis, kept in a dictionary
+class FakeRedis():
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+    
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({str(field).encode(): str(value).encode() for field, value in mapping.items()})
+    
+    def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(str(field).encode()) for field in fields]
+    
+    def set(self, key, value, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+    
+    def pipeline(self, transaction=True):
+        client, calls = self, []
+        class Pipeline():
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: calls.append((name, args, kwargs))
+            def execute(self):
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in calls]
+        return Pipeline()
+
+# Verifying that the workers sharing a redis segment history read the observations
+# posted to each other, with the same features as the local history
+def test_redis_segment_history_is_shared(raw_df):
+    slots = get_time_slot(raw_df['time'])
+    slot = np.quantile(slots, 0.8).astype(np.int64)
+    past = raw_df[slots < slot]
+    client = FakeRedis()
+    worker_1 = RedisSegmentHistory(client=client)
+    worker_2 = RedisSegmentHistory(client=client)
+    worker_1.update(past.iloc[::2])
+    worker_2.update(past.iloc[1::2])
+    history = SegmentHistory()
+    history.update(past)
+    requests = raw_df[slots == slot]
+    expected = history.get_features_batch(requests['x'], requests['y'], requests['direction'], requests['time'])
+    np.testing.assert_allclose(
+        worker_2.get_features_batch(requests['x'], requests['y'], requests['direction'], requests['time']), expected
+    )
+    row = requests.iloc[0]
+    single = worker_1.get_features(row['x'], row['y'], row['direction'], pd.Timestamp(row['time']))
+    np.testing.assert_allclose(list(single.values()), expected[0])
+    
+    # Verifying that only the first worker warms up the shared history
+    assert worker_2.warm_start([]) == 0
+    assert worker_1.warm_start([]) == 0
+    assert len(client.strings) == 1
+
+# Verifying that several workers with their own segment history are refused
+def test_check_segment_history():
+    config = LagFeatureConfig(history_backend='local')
+    check_segment_history(1, True, config)
+    check_segment_history(4, False, config)
+    with pytest.raises(ValueError):
+        check_segment_history(4, True, config)
+    check_segment_history(4, True, LagFeatureConfig(history_backend='redis'))
+
+# Verifying that the inference plan fills in the lag features of a request
+def test_plan_with_lag_features(raw_df):
+    train_df = raw_df.iloc[:50000].copy()
+    lag_features = create_lag_features(train_df)
+    transform = DataTransformation()
+    features = transform.generate_features(train_df.join(lag_features))
+    target = features.pop('congestion')
+    preprocessor = transform.create_preprocessor_obj().fit(features, target)
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    assert sorted(plan.lag_features) == sorted(get_lag_feature_names())
+    expected = preprocessor.transform(features.iloc[:20]).to_numpy()
+    actual = np.vstack([
+        plan.build_features(
+            row.x, row.y, row.direction, pd.Timestamp(row.time).to_pydatetime(), lag_features.loc[index].to_dict()
+        )
+        for index, row in raw_df.iloc[:20].iterrows()
+    ])
+    np.testing.assert_allclose(actual, expected)
@@ -1,9 +1,16 @@
 # Import packages
 import os
+import sys
+import subprocess
+import joblib
 import pytest
 import pandas as pd
+from src.exception import CustomException
 from src.components.create_custom_data import CreateCustomData
+from src.components.create_custom_data import CreateBatchData
 from src.components.make_predictions import MakePredictions
+from src.components.config_entity import DataTransformationConfig
+from src.components.inference_plan import InferencePlan
 
 # Verifying that the create_dataframe method works as expected
 def test_create_dataframe():
@@ -17,6 +24,24 @@ def test_create_dataframe():
     assert 'direction' in list(df.columns)
     assert len(df) == 1
 
+# Verifying that the batch create_dataframe method keeps the order of the records
+def test_create_batch_dataframe():
+    records = [
+        {'x': 1, 'y': 2, 'direction': 'NB'},
+        {'x': 0, 'y': 3, 'direction': 'SW', 'time': '1991-09-28 08:20:00'}
+    ]
+    df = CreateBatchData(records).create_dataframe()
+    assert len(df) == 2
+    assert list(df['direction']) == ['NB', 'SW']
+    assert df.loc[1, 'time'] == pd.Timestamp('1991-09-28 08:20:00')
+
+# Verifying that the batch create_dataframe method rejects invalid records
+def test_create_batch_dataframe_invalid_records():
+    with pytest.raises(CustomException):
+        CreateBatchData([{'x': 1, 'y': 2}]).create_dataframe()
+    with pytest.raises(CustomException):
+        CreateBatchData([]).create_dataframe()
+
 # Verifying that the system can retrieve the model parameters
 def test_retrieve_model_params():
     prediction_class = MakePredictions()
@@ -46,4 +71,25 @@ def test_make_prediction():
     prediction_class = MakePredictions()
     preds = prediction_class.predict(df)
     assert preds is not None
-    
\ No newline at end of file
+    
+
+# Verifying that predicting does not change the features of the caller
+def test_predict_does_not_change_features(monkeypatch):
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    bundle = type('Bundle', (), {'preprocessor': preprocessor, 'model': None, 'model_version': 'version-1'})()
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    monkeypatch.setattr(MakePredictions, 'load_inference_plan', lambda self: (bundle, plan))
+    df = CreateBatchData([{'x': 1, 'y': 2, 'direction': 'N'}, {'x': 0, 'y': 0, 'direction': 'EB'}]).create_dataframe()
+    expected = df.copy()
+    MakePredictions().predict(df, test_transformed_features=True)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+# Verifying that the serving path does not import the model registry clients or sklearn
+def test_serving_imports_are_slim():
+    script = (
+        'import sys, src.components.make_predictions, src.components.forecast; '
+        'print(sorted({"mlflow", "dagshub", "sklearn", "xgboost"} & set(sys.modules)))'
+    )
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,98 @@
+# Importing packages
+import os
+import pytest
+from src.components.metrics import Counter
+from src.components.metrics import Gauge
+from src.components.metrics import Histogram
+from src.components.metrics import MetricsRegistry
+from src.components.metrics import ERRORS
+from src.components.metrics import STAGE_LATENCY
+from src.components.metrics import REQUEST_LATENCY
+from src.components.metrics import record_stage
+from src.components.metrics import start_request
+from src.components.metrics import finish_request
+
+# Verifying that the metrics are rendered in the Prometheus text format
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.register(Histogram('test_latency_seconds', 'Latency.', ('route',), (0.1, 1.0)))
+    hits = registry.register(Counter('test_hits_total', 'Hits.', ('cache',)))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, '/api/predict')
+    hits.inc('say "hi"', amount=2)
+    registry.add_collector(lambda: hits.set(7, 'mirrored'))
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP test_latency_seconds Latency.', '# TYPE test_latency_seconds histogram']
+    assert 'test_latency_seconds_bucket{route="/api/predict",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/api/predict",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{route="/api/predict",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{route="/api/predict"} 6.05' in lines
+    assert 'test_latency_seconds_count{route="/api/predict"} 4' in lines
+    assert 'test_hits_total{cache="say \\"hi\\""} 2' in lines
+    assert 'test_hits_total{cache="mirrored"} 7' in lines
+
+# Verifying that a request records its latency, its stages and its error
+def test_request_trace():
+    route = '/test/trace'
+    with record_stage('parse'):
+        pass
+    assert STAGE_LATENCY.get(route, 'parse') == (0, 0.0)
+    start_request()
+    for stage in ('parse', 'predict', 'predict'):
+        with record_stage(stage):
+            pass
+    finish_request(route, 'POST', 500, 'ValueError')
+    assert REQUEST_LATENCY.get(route, 'POST', 500)[0] == 1
+    assert STAGE_LATENCY.get(route, 'parse')[0] == 1
+    assert STAGE_LATENCY.get(route, 'predict')[0] == 1
+    assert ERRORS.get(route, 'ValueError') == 1
+
+    # Verifying that a finished trace is not recorded twice
+    finish_request(route, 'POST', 404)
+    assert REQUEST_LATENCY.get(route, 'POST', 404) == (0, 0.0)
+
+
+# Verifying that a process forked while a metric lock is held can record metrics
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'), reason='os.fork is not available')
+def test_locks_reset_after_fork():
+    with ERRORS._lock:
+        pid = os.fork()
+        if pid == 0:
+            ERRORS.inc('/test/fork', 'ValueError')
+            os._exit(0 if ERRORS.get('/test/fork', 'ValueError') == 1 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+# Verifying that the metrics of several processes sharing a folder of snapshots are
+# combined, and that the gauges of an exited process are dropped
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='os.fork is not available')
+def test_multiprocess_metrics(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    requests = registry.register(Counter('test_requests_total', 'Requests.', ('route',)))
+    loaded = registry.register(Gauge('test_loaded_seconds', 'Load time.'))
+    latency = registry.register(Histogram('test_latency_seconds', 'Latency.', (), (0.1, 1.0)))
+    pid = os.fork()
+    if pid == 0:
+        requests.inc('/a', amount=2)
+        loaded.set(200.0)
+        latency.observe(0.5)
+        registry.write_snapshot()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    requests.inc('/a')
+    loaded.set(100.0)
+    latency.observe(0.05)
+    lines = registry.render().splitlines()
+    assert 'test_requests_total{route="/a"} 3' in lines
+    assert 'test_loaded_seconds 200.0' in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_count 2' in lines
+    
+    # Verifying that the counters of the exited process are kept and its gauges dropped
+    registry.mark_process_dead(pid)
+    assert not os.path.exists(registry.get_snapshot_path(pid))
+    lines = registry.render().splitlines()
+    assert 'test_requests_total{route="/a"} 3' in lines
+    assert 'test_loaded_seconds 100.0' in lines
+    assert 'test_latency_seconds_count 2' in lines
@@ -0,0 +1,77 @@
+# Importing packages
+import time
+import joblib
+import pytest
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from src.components.config_entity import DataTransformationConfig
+from src.components.inference_plan import InferencePlan
+from src.components.make_predictions import MakePredictions
+from src.components.micro_batch import MicroBatchPredictor
+
+# Creating a model which returns the mean encoding of the segment and records the
+# size of each batch it scores
+class SegmentMeanModel():
+    def __init__(self, segment_index):
+        self.segment_index = segment_index
+        self.batch_sizes = []
+    
+    def predict(self, features):
+        self.batch_sizes.append(len(features))
+        time.sleep(0.01)
+        return features[:, self.segment_index]
+
+# Replacing the cached bundle and inference plan with the fake model and the plan of
+# the fitted preprocessor object
+@pytest.fixture(scope='function')
+def plan_and_model(monkeypatch):
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    plan = InferencePlan.from_preprocessor(preprocessor)
+    model = SegmentMeanModel(plan.segment_index)
+    bundle = type('Bundle', (), {'model': model})()
+    monkeypatch.setattr(MakePredictions, 'load_inference_plan', lambda self: (bundle, plan))
+    return plan, model
+
+# Verifying that concurrent requests are scored in batches and that each request gets
+# its own prediction
+def test_concurrent_requests_are_batched(plan_and_model):
+    plan, model = plan_and_model
+    segments = sorted(plan.segment_means)[:32]
+    predictor = MicroBatchPredictor(max_batch_size=8, max_linger_ms=50)
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        preds = list(executor.map(
+            lambda segment: predictor.predict(*segment.split('_'), time=datetime(1991, 9, 23, 8)),
+            segments
+        ))
+    assert preds == pytest.approx([plan.segment_means[segment] for segment in segments])
+    assert max(model.batch_sizes) <= 8
+    assert len(model.batch_sizes) < len(segments)
+    metrics = predictor.get_metrics()
+    assert metrics['requests'] == len(segments)
+    assert metrics['batches'] == len(model.batch_sizes)
+
+# Verifying that a single request is flushed after the linger time
+def test_single_request_is_flushed_after_linger_time(plan_and_model):
+    plan, model = plan_and_model
+    predictor = MicroBatchPredictor(max_batch_size=64, max_linger_ms=5)
+    pred = predictor.predict(0, 0, 'EB')
+    assert pred == pytest.approx(plan.segment_means['0_0_EB'])
+    assert model.batch_sizes == [1]
+    assert predictor.get_metrics()['batch_sizes'] == {1: 1}
+
+# Verifying that a request which fails does not fail the other requests of its batch
+def test_failed_request_does_not_fail_batch(plan_and_model):
+    plan, model = plan_and_model
+    plan.unseen = 'raise'
+    segments = sorted(plan.segment_means)[:4] + ['99999_99999_EB']
+    predictor = MicroBatchPredictor(max_batch_size=len(segments), max_linger_ms=200)
+    with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+        futures = [
+            executor.submit(predictor.predict, *segment.split('_'), time=datetime(1991, 9, 23, 8))
+            for segment in segments
+        ]
+        preds = [future.result() for future in futures[:-1]]
+        with pytest.raises(Exception):
+            futures[-1].result()
+    assert preds == pytest.approx([plan.segment_means[segment] for segment in segments[:-1]])
+    assert model.batch_sizes == [len(segments) - 1]
@@ -0,0 +1,89 @@
+# Importing packages
+import os
+import json
+import joblib
+import pytest
+from src.components.model_cache import ModelCache
+
+# Creating a temporary working directory with a run parameters file and a
+# preprocessor object
+@pytest.fixture(scope='function')
+def artifacts_dir(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'run_config')
+    os.makedirs(tmp_path / 'artifacts')
+    with open(tmp_path / 'run_config' / 'run_params_20250101.json', 'w') as file_obj:
+        json.dump({'model_uri': 'runs:/1/model'}, file_obj)
+    joblib.dump({'name': 'preprocessor'}, tmp_path / 'artifacts' / 'preprocessor.joblib')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+# Creating a model loader that counts the number of times it is called
+@pytest.fixture(scope='function')
+def model_loader():
+    calls = []
+    def load(run_params):
+        calls.append(run_params['model_uri'])
+        return f"model for {run_params['model_uri']}"
+    load.calls = calls
+    return load
+
+# Verifying that the model is only loaded once
+def test_bundle_is_cached(artifacts_dir, model_loader):
+    cache = ModelCache()
+    first = cache.get_bundle(model_loader)
+    second = cache.get_bundle(model_loader)
+    assert first is second
+    assert first.preprocessor == {'name': 'preprocessor'}
+    assert model_loader.calls == ['runs:/1/model']
+
+# Verifying that a new model uri in the run parameters reloads the bundle
+def test_bundle_reloads_on_new_model_uri(artifacts_dir, model_loader):
+    cache = ModelCache()
+    cache.cache_config.check_interval = 0
+    cache.get_bundle(model_loader)
+    with open(artifacts_dir / 'run_config' / 'run_params_20250202.json', 'w') as file_obj:
+        json.dump({'model_uri': 'runs:/2/model'}, file_obj)
+    bundle = cache.get_bundle(model_loader)
+    assert bundle.model_uri == 'runs:/2/model'
+    assert model_loader.calls == ['runs:/1/model', 'runs:/2/model']
+
+# Verifying that a changed preprocessor object reloads the bundle
+def test_bundle_reloads_on_new_preprocessor(artifacts_dir, model_loader):
+    cache = ModelCache()
+    cache.cache_config.check_interval = 0
+    cache.get_bundle(model_loader)
+    joblib.dump({'name': 'new preprocessor'}, artifacts_dir / 'artifacts' / 'preprocessor.joblib')
+    bundle = cache.get_bundle(model_loader)
+    assert bundle.preprocessor == {'name': 'new preprocessor'}
+    assert len(model_loader.calls) == 2
+
+# Verifying that touching the preprocessor object reloads the bundle but keeps the hash
+# of its content, which keys the prediction table
+def test_preprocessor_hash_ignores_touch(artifacts_dir, model_loader):
+    cache = ModelCache()
+    cache.cache_config.check_interval = 0
+    first = cache.get_bundle(model_loader)
+    preprocessor_path = artifacts_dir / 'artifacts' / 'preprocessor.joblib'
+    os.utime(preprocessor_path, ns=(0, 0))
+    second = cache.get_bundle(model_loader)
+    assert second is not first
+    assert second.preprocessor_sha256 == first.preprocessor_sha256
+    joblib.dump({'name': 'new preprocessor'}, preprocessor_path)
+    assert cache.get_bundle(model_loader).preprocessor_sha256 != first.preprocessor_sha256
+
+# Verifying that a forked process can reload the bundle even if the lock was held by
+# another thread at the time of the fork
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='os.fork is not available')
+def test_bundle_reloads_after_fork_with_held_lock(artifacts_dir, model_loader):
+    cache = ModelCache()
+    cache._lock.acquire()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            cache.reset_lock()
+            cache.clear()
+            os._exit(0 if cache.get_bundle(model_loader).model_uri == 'runs:/1/model' else 1)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        cache._lock.release()
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,62 @@
+# Importing packages
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBRegressor
+from src.components.model_store import LocalModelStore
+from src.exception import CustomException
+
+# Creating a small trained model
+@pytest.fixture(scope='function')
+def trained_model():
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.random((200, 3)), columns=['a', 'b', 'c'])
+    y = X['a'] * 10 + rng.random(200)
+    model = XGBRegressor(n_estimators=10, max_depth=3)
+    model.fit(X, y)
+    return model, X
+
+# Changing into a temporary working directory
+@pytest.fixture(scope='function')
+def model_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return LocalModelStore()
+
+# Verifying that a saved model can be loaded and makes the same predictions
+def test_save_and_load_model(model_store, trained_model):
+    model, X = trained_model
+    manifest = model_store.save_model(model, {'run_id': 'abc'})
+    assert os.path.exists(manifest['local_model_path'])
+    assert manifest['run_id'] == 'abc'
+    assert model_store.read_manifest()['model_sha256'] == manifest['model_sha256']
+    loaded_model = model_store.load_model()
+    np.testing.assert_allclose(loaded_model.predict(X), model.predict(X))
+
+# Verifying that a model with a wrong hash is not loaded
+def test_load_model_with_wrong_hash(model_store, trained_model):
+    model, _ = trained_model
+    manifest = model_store.save_model(model)
+    with pytest.raises(CustomException):
+        model_store.load_model(manifest['local_model_path'], '0' * 64)
+
+# Verifying that loading from an empty model store fails
+def test_load_model_from_empty_store(model_store):
+    assert model_store.read_manifest() is None
+    with pytest.raises(CustomException):
+        model_store.load_model()
+
+# Verifying that the native booster makes the same predictions as the regressor, also
+# for a model trained with early stopping
+def test_load_booster(model_store, trained_model):
+    model, X = trained_model
+    model_store.save_model(model)
+    booster = model_store.load_booster()
+    np.testing.assert_allclose(booster.predict(X), model.predict(X), rtol=1e-6)
+    np.testing.assert_allclose(booster.predict(X.to_numpy()[0]), model.predict(X.iloc[:1]), rtol=1e-6)
+    early_stopped = XGBRegressor(n_estimators=200, max_depth=3, early_stopping_rounds=2)
+    early_stopped.fit(X.iloc[:150], X['a'].iloc[:150], eval_set=[(X.iloc[150:], X['a'].iloc[150:])], verbose=False)
+    model_store.save_model(early_stopped)
+    booster = model_store.load_booster()
+    assert booster.iteration_range == (0, early_stopped.best_iteration + 1)
+    np.testing.assert_allclose(booster.predict(X), early_stopped.predict(X), rtol=1e-6)
@@ -1,6 +1,7 @@
 # Importing packages
 import os
 import pytest
+import numpy as np
 import pandas as pd
 import dagshub
 import mlflow
@@ -10,6 +11,8 @@ from xgboost import XGBRegressor
 from src.components.config_entity import StoreFeatureConfig
 from src.components.model_trainer import ModelTrainer
 from src.components.find_best_model import FindBestModel
+from src.components.store_features import FeatureStoreCreation
+from src.components.time_split import TimeSplit
 
 # Reading the transformed train dataset path
 @pytest.fixture(scope='function')
@@ -42,6 +45,31 @@ def test_find_best_model():
     best_model = bst.find_best_model(xgb, params, X_train, y_train)
     assert best_model is not None
 
+# Verifying that each search strategy finds a model and reports its wall-clock time
+# and number of fits
+@pytest.mark.parametrize('search_strategy', ['grid', 'halving', 'random', 'early_stopping', 'dmatrix'])
+def test_find_best_model_search_strategy(search_strategy):
+    trainer = ModelTrainer()
+    X_train, y_train, _, _ = trainer.create_feature_target_datasets()
+    X_train = X_train.iloc[:20000]
+    y_train = y_train.iloc[:20000]
+    bst = FindBestModel()
+    xgb = XGBRegressor(random_state=42)
+    params = {'learning_rate': [0.05, 0.1], 'n_estimators': [20, 40], 'max_depth': [3, 5]}
+    best_model, best_params = bst.find_best_model(
+        xgb, params, X_train, y_train, search_strategy=search_strategy, n_iter=4
+    )
+    assert best_model is not None
+    assert set(best_params) == set(params)
+    assert bst.search_report_['search_strategy'] == search_strategy
+    assert bst.search_report_['wall_time'] > 0
+    assert bst.search_report_['n_fits'] > 0
+    if search_strategy == 'dmatrix':
+        assert bst.search_report_['n_fits'] == 4 * 3 + 1
+    if search_strategy == 'early_stopping':
+        assert bst.search_report_['n_fits'] == 5
+        assert 1 <= best_params['n_estimators'] <= 40
+
 # Verifying that the model trainer works as expected when the make_prediction flag
 # is set to True
 def test_initiate_model_training_with_prediction():
@@ -74,4 +102,61 @@ def test_get_model_data():
     my_model_uri = run_data['model_uri']
     model = mlflow.pyfunc.load_model(my_model_uri)
     assert latest_versions_metadata is not None
-    assert model is not None
\ No newline at end of file
+    assert model is not None
+
+# Verifying that the memory-mapped feature and target datasets match the parquet ones
+# and are read-only views of the mapped files
+def test_create_feature_target_datasets_memory_map(tmp_path, monkeypatch):
+    xform_train_set = pd.read_parquet(StoreFeatureConfig().xform_train_path)
+    xform_test_set = pd.read_parquet(StoreFeatureConfig().xform_test_path)
+    monkeypatch.chdir(tmp_path)
+    for df in (xform_train_set, xform_test_set):
+        df['month'] = 199104
+        df['segment'] = '0_0_EB'
+    FeatureStoreCreation().create_feature_store(xform_train_set, xform_test_set)
+    
+    trainer = ModelTrainer()
+    expected = trainer.create_feature_target_datasets()
+    actual = trainer.create_feature_target_datasets(use_memory_map=True)
+    assert not FeatureStoreCreation().is_arrow_stale()
+    pd.testing.assert_frame_equal(actual[0], expected[0])
+    pd.testing.assert_series_equal(actual[1], expected[1])
+    pd.testing.assert_frame_equal(actual[2], expected[2])
+    pd.testing.assert_series_equal(actual[3], expected[3])
+    assert not actual[0].iloc[:, 0].to_numpy().flags.writeable
+
+# Verifying that the chronological split keeps the memory-mapped training rows as views
+# of the mapped file when the segments of the feature store are out of time order
+def test_create_feature_target_datasets_memory_map_chronological(tmp_path, monkeypatch):
+    xform_train_set = pd.read_parquet(StoreFeatureConfig().xform_train_path).iloc[:20000]
+    xform_test_set = pd.read_parquet(StoreFeatureConfig().xform_test_path).iloc[:5000]
+    monkeypatch.chdir(tmp_path)
+    for df in (xform_train_set, xform_test_set):
+        df['month'] = 199104
+        df['segment'] = np.where(np.arange(len(df)) % 2 == 0, '1_1_WB', '0_0_EB')
+        df['time'] = pd.Timestamp('1991-04-01') + pd.to_timedelta(np.arange(len(df)) // 4 * 20, unit='min')
+    FeatureStoreCreation().create_feature_store(xform_train_set, xform_test_set)
+    assert TimeSplit.sort_order(pd.read_parquet(StoreFeatureConfig().xform_train_path)['time'].to_numpy()) is not None
+    
+    trainer = ModelTrainer()
+    expected = trainer.create_feature_target_datasets()
+    actual = trainer.create_feature_target_datasets(use_memory_map=True)
+    pd.testing.assert_frame_equal(actual[0], expected[0].reset_index(drop=True))
+    pd.testing.assert_series_equal(actual[1], expected[1].reset_index(drop=True))
+    assert trainer.train_times_ is not None
+    assert (trainer.train_times_[1:] >= trainer.train_times_[:-1]).all()
+    assert not actual[0].iloc[:, 0].to_numpy().flags.writeable
+    assert not actual[1].to_numpy().flags.writeable
+
+# Verifying that the search with one quantile matrix per fold finds the same best
+# parameters as the grid search
+def test_find_best_model_dmatrix_matches_grid():
+    trainer = ModelTrainer()
+    X_train, y_train, _, _ = trainer.create_feature_target_datasets()
+    X_train = X_train.iloc[:30000]
+    y_train = y_train.iloc[:30000]
+    xgb = XGBRegressor(random_state=42)
+    params = {'learning_rate': [0.01, 0.1], 'n_estimators': [10, 50], 'max_depth': [3, 5]}
+    _, grid_params = FindBestModel().find_best_model(xgb, params, X_train, y_train, search_strategy='grid')
+    _, dmatrix_params = FindBestModel().find_best_model(xgb, params, X_train, y_train, search_strategy='dmatrix')
+    assert dmatrix_params == grid_params
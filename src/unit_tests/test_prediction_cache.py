@@ -0,0 +1,105 @@
+# Importing packages
+import pytest
+from datetime import datetime, timedelta
+from src.components.prediction_cache import LocalCacheBackend
+from src.components.prediction_cache import PredictionCache
+from src.components.prediction_cache import RedisCacheBackend
+
+# Creating a clock which is moved forward by the tests
+class FakeClock():
+    def __init__(self, now):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+# Creating a model which counts the predictions it makes
+class CountingModel():
+    def __init__(self):
+        self.n_calls = 0
+    
+    def predict(self):
+        self.n_calls += 1
+        return [float(self.n_calls)]
+
+# Verifying that identical requests in the same hour are served from the cache
+def test_hits_and_misses():
+    clock = FakeClock(datetime(1991, 9, 23, 8, 5))
+    cache = PredictionCache(LocalCacheBackend(), clock)
+    model = CountingModel()
+    assert cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict) == [1.0]
+    clock.now += timedelta(minutes=30)
+    assert cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict) == [1.0]
+    assert cache.get_or_compute(('v1',), 1, 2, 'SB', model.predict) == [2.0]
+    assert model.n_calls == 2
+    metrics = cache.get_metrics()
+    assert (metrics['hits'], metrics['misses'], metrics['size']) == (1, 2, 2)
+    assert metrics['hit_rate'] == pytest.approx(1 / 3)
+
+# Verifying that the entries expire at the end of the hour
+def test_entries_expire_at_hour_boundary():
+    clock = FakeClock(datetime(1991, 9, 23, 8, 59))
+    backend = LocalCacheBackend()
+    cache = PredictionCache(backend, clock)
+    model = CountingModel()
+    cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict, time=datetime(1991, 9, 30, 8, 0))
+    clock.now = datetime(1991, 9, 23, 9, 0)
+    assert cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict, time=datetime(1991, 9, 30, 8, 0)) == [2.0]
+    assert cache.get_metrics()['misses'] == 2
+
+# Verifying that the cache is cleared when the model changes
+def test_cache_cleared_on_model_change():
+    cache = PredictionCache(LocalCacheBackend(), FakeClock(datetime(1991, 9, 23, 8, 5)))
+    model = CountingModel()
+    cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict)
+    cache.get_or_compute(('v2',), 1, 2, 'NB', model.predict)
+    assert model.n_calls == 2
+    metrics = cache.get_metrics()
+    assert (metrics['clears'], metrics['size']) == (1, 1)
+
+# Creating a client with the string and scan commands of redis, kept in a dictionary
+class FakeRedis():
+    def __init__(self):
+        self.entries = {}
+        self.unlinks = []
+    
+    def get(self, key):
+        return self.entries.get(key)
+    
+    def psetex(self, key, ttl_ms, value):
+        self.entries[key] = value
+    
+    def scan_iter(self, match, count=None):
+        return [key for key in list(self.entries) if key.startswith(match.rstrip('*'))]
+    
+    def unlink(self, *keys):
+        self.unlinks.append(len(keys))
+        for key in keys:
+            self.entries.pop(key, None)
+
+# Verifying that a shared cache is not cleared when the model changes, and that
+# clearing it unlinks the keys in batches
+def test_shared_cache_not_cleared_on_model_change():
+    client = FakeRedis()
+    backend = RedisCacheBackend('redis://localhost', client=client, batch_size=2)
+    cache = PredictionCache(backend, FakeClock(datetime(1991, 9, 23, 8, 5)))
+    model = CountingModel()
+    cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict)
+    cache.get_or_compute(('v2',), 1, 2, 'NB', model.predict)
+    cache.get_or_compute(('v2',), 1, 2, 'SB', model.predict)
+    metrics = cache.get_metrics()
+    assert (metrics['clears'], metrics['size']) == (0, None)
+    assert len(client.entries) == 3
+    backend.clear()
+    assert client.entries == {}
+    assert client.unlinks == [2, 1]
+
+# Verifying that the least recently used entries are evicted
+def test_least_recently_used_entries_are_evicted():
+    cache = PredictionCache(LocalCacheBackend(max_size=2), FakeClock(datetime(1991, 9, 23, 8, 5)))
+    model = CountingModel()
+    for direction in ('NB', 'SB', 'NB', 'EB'):
+        cache.get_or_compute(('v1',), 1, 2, direction, model.predict)
+    assert cache.get_metrics()['evictions'] == 1
+    assert cache.get_or_compute(('v1',), 1, 2, 'NB', model.predict) == [1.0]
+    assert cache.get_or_compute(('v1',), 1, 2, 'SB', model.predict) == [4.0]
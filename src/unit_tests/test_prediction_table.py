@@ -0,0 +1,59 @@
+# Importing packages
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBRegressor
+from src.components.config_entity import DataTransformationConfig
+from src.components.inference_plan import InferencePlan
+from src.components.prediction_table import PredictionTable
+
+# Compiling the inference plan of the fitted preprocessor object
+@pytest.fixture(scope='module')
+def plan():
+    preprocessor = joblib.load(DataTransformationConfig().preprocessor_obj_path)
+    return InferencePlan.from_preprocessor(preprocessor)
+
+# Training a small model on random features
+@pytest.fixture(scope='module')
+def model(plan):
+    rng = np.random.default_rng(42)
+    X = rng.random((2000, len(plan.feature_names))) * 60
+    y = X[:, plan.segment_index] + 10 * X[:, -1]
+    return XGBRegressor(n_estimators=20, max_depth=4, random_state=42).fit(X, y)
+
+# Verifying that the table holds the same predictions as the live model
+def test_table_matches_live_model(plan, model):
+    table = PredictionTable.build(plan, model, 'version-1')
+    assert table.values.shape == (len(plan.segment_means), 24, 2)
+    times = pd.date_range('1991-09-23 00:00:00', periods=7 * 24, freq='h')[::7]
+    for segment in plan.segment_means:
+        x, y, direction = segment.split('_')
+        for time in times:
+            time = time.to_pydatetime()
+            expected = model.predict(plan.build_features(x, y, direction, time))[0]
+            assert table.lookup(x, y, direction, time) == expected
+
+# Verifying that a saved table is keyed by the model version and the hashes of the model
+# and the preprocessor object, and loads the same predictions
+def test_save_and_load(plan, model, tmp_path):
+    table = PredictionTable.build(plan, model, 'abc123', 'def456')
+    table_key = PredictionTable.get_table_key('abc123', 'def456')
+    table_path = table.save(PredictionTable.get_table_path('abc123', table_key, tmp_path))
+    assert table_path.endswith(f'prediction_table_abc123_{table_key}.npz')
+    
+    # Verifying that a new preprocessor object gives the table another path
+    new_key = PredictionTable.get_table_key('abc123', 'def457')
+    assert new_key != table_key
+    assert PredictionTable.get_table_path('abc123', new_key, tmp_path) != table_path
+    
+    loaded = PredictionTable.load(table_path)
+    assert loaded.model_version == 'abc123'
+    assert loaded.table_key == table_key
+    assert loaded.segments == table.segments
+    np.testing.assert_array_equal(loaded.values, table.values)
+
+# Verifying that an unseen segment is not in the table
+def test_unseen_segment(plan, model):
+    table = PredictionTable.build(plan, model, 'version-1')
+    assert table.lookup(9, 9, 'EB') is None
@@ -0,0 +1,87 @@
+# Importing packages
+import os
+import time
+import threading
+import pytest
+from joblib import Parallel, delayed
+from src.components.resource_scheduler import ResourceScheduler
+
+# Verifying that a large dataset on a large box never oversubscribes the cores
+def test_plan_does_not_oversubscribe():
+    plan = ResourceScheduler(n_cores=64).plan(n_rows=594184, n_candidates=27, cv=3)
+    assert plan['outer_jobs'] * plan['inner_threads'] <= 64
+    assert plan['outer_jobs'] > 1
+    assert plan['inner_threads'] > 1
+
+# Verifying that a small dataset gives the cores to the search workers, and a small
+# search gives the cores back to XGBoost
+@pytest.mark.parametrize('n_rows, n_candidates, outer_jobs, inner_threads', [
+    (10000, 27, 64, 1),
+    (10000, 2, 6, 10),
+    (10000000, 27, 1, 64)
+])
+def test_plan_split(n_rows, n_candidates, outer_jobs, inner_threads):
+    plan = ResourceScheduler(n_cores=64).plan(n_rows=n_rows, n_candidates=n_candidates, cv=3)
+    assert plan['outer_jobs'] == outer_jobs
+    assert plan['inner_threads'] == inner_threads
+
+# Verifying that the sequential search strategies give every core to XGBoost
+@pytest.mark.parametrize('search_strategy', ['early_stopping', 'dmatrix'])
+def test_plan_sequential_search(search_strategy):
+    plan = ResourceScheduler(n_cores=16).plan(n_rows=10000, n_candidates=27, search_strategy=search_strategy)
+    assert plan['outer_jobs'] == 1
+    assert plan['inner_threads'] == 16
+
+# Verifying that the search workers get disjoint cores
+def test_get_worker_places():
+    scheduler = ResourceScheduler(n_cores=16)
+    plan = scheduler.plan(n_rows=400000, n_candidates=27, cv=3)
+    places = scheduler.get_worker_places(plan, cores=list(range(16)))
+    assert len(places) == plan['outer_jobs'] > 1
+    assert all(len(cores) == plan['inner_threads'] for cores in places)
+    assert len({core for cores in places for core in cores}) == plan['outer_jobs'] * plan['inner_threads']
+
+# Creating a task which reports the OpenMP places of the worker it runs in
+def get_worker_places():
+    time.sleep(0.5)
+    return os.getpid(), os.environ.get('OMP_PLACES')
+
+# Verifying that each search worker is pinned to a different list of places
+def test_pin_threads_workers():
+    scheduler = ResourceScheduler(n_cores=4)
+    plan = {'n_cores': 4, 'outer_jobs': 2, 'inner_threads': 2, 'n_tasks': 4}
+    with scheduler.pin_threads(plan, cores=[0, 1, 2, 3]), scheduler.track_utilization(plan):
+        results = Parallel(n_jobs=plan['outer_jobs'])(delayed(get_worker_places)() for _ in range(4))
+    places = dict(results)
+    assert len(places) == 2
+    assert None not in places.values()
+    assert sorted(places.values()) == ['{0},{1}', '{2},{3}']
+
+# Creating a thread which runs until it is stopped, like an OpenMP thread
+def wait_for(event):
+    event.wait(10)
+
+# Verifying that a single worker binds the running threads of the process to its cores,
+# restores their binding afterwards, and reports the utilization
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason='The threads cannot be bound to cores.')
+def test_track_utilization():
+    original_affinity = os.sched_getaffinity(0)
+    core = min(original_affinity)
+    stop = threading.Event()
+    thread = threading.Thread(target=wait_for, args=(stop,))
+    thread.start()
+    environ = dict(os.environ)
+    scheduler = ResourceScheduler(n_cores=1)
+    plan = scheduler.plan(n_rows=1000, n_candidates=1, cv=1)
+    try:
+        with scheduler.pin_threads(plan, cores=[core]), scheduler.track_utilization(plan) as report:
+            assert os.sched_getaffinity(0) == {core}
+            assert os.sched_getaffinity(thread.native_id) == {core}
+            sum(i * i for i in range(2000000))
+    finally:
+        stop.set()
+        thread.join()
+    assert os.sched_getaffinity(0) == original_affinity
+    assert dict(os.environ) == environ
+    assert report['wall_time'] > 0
+    assert 0 < report['cpu_utilization'] <= 1.5
@@ -0,0 +1,64 @@
+# Importing packages
+import numpy as np
+import pandas as pd
+import pytest
+from feature_engine.encoding import MeanEncoder
+from src.utils import StreamingMeanEncoder
+from src.utils import create_direction_feature
+from src.components.config_entity import DataIngestionConfig
+from src.components.segment_dictionary import SegmentDictionary
+
+# Reading the train dataset
+@pytest.fixture(scope='module')
+def train_df():
+    return pd.read_parquet(DataIngestionConfig().train_data_path)
+
+# Verifying that the codes decode to the same labels as the string concatenation
+def test_encode_matches_string_labels(train_df):
+    dictionary = SegmentDictionary().fit(train_df)
+    segments = pd.Series(dictionary.encode(train_df['x'], train_df['y'], train_df['direction']))
+    labels = train_df['x'].astype(str) + '_' + train_df['y'].astype(str) + '_' + train_df['direction']
+    assert isinstance(segments.dtype, pd.CategoricalDtype)
+    assert list(segments.cat.categories) == sorted(labels.unique())
+    assert (segments.astype(str) == labels).all()
+
+# Verifying that unknown segments get the unknown code and a missing label
+def test_unknown_segments():
+    dictionary = SegmentDictionary([(0, 0, 'EB'), (1, 2, 'NB')])
+    codes = dictionary.encode_codes([1, 0, 5, 0], [2, 0, 0, 0], ['NB', 'EB', 'NB', 'SW'])
+    assert list(codes) == [1, 0, SegmentDictionary.UNKNOWN, SegmentDictionary.UNKNOWN]
+    assert pd.isna(dictionary.encode([5], [0], ['NB'])[0])
+    assert dictionary.lookup(1, 2, 'NB') == 1
+    assert dictionary.lookup(1, 2, 'SB') == SegmentDictionary.UNKNOWN
+
+# Verifying that new segments are appended without changing the known codes, and that
+# a saved dictionary loads the same codes
+def test_partial_fit_and_save(tmp_path):
+    dictionary = SegmentDictionary([(0, 0, 'EB'), (1, 2, 'NB')])
+    dictionary.partial_fit(pd.DataFrame({'x': [3, 0], 'y': [1, 0], 'direction': ['WB', 'EB']}))
+    assert dictionary.segments == [(0, 0, 'EB'), (1, 2, 'NB'), (3, 1, 'WB')]
+    file_path = str(tmp_path / 'segment_dictionary.json')
+    dictionary.save(file_path)
+    loaded = SegmentDictionary.load(file_path)
+    assert loaded.segments == dictionary.segments
+    assert SegmentDictionary.load(file_path) is loaded
+
+# Verifying that the streaming mean encoder gives the same encoding from the codes as
+# the mean encoder from the strings
+def test_streaming_mean_encoder_on_codes(train_df):
+    dictionary = SegmentDictionary().fit(train_df)
+    y = train_df['congestion']
+    X_codes = create_direction_feature(train_df.copy(), dictionary)[['x_y_direction']]
+    X_strings = create_direction_feature(train_df.copy())[['x_y_direction']]
+    streaming_encoder = StreamingMeanEncoder().fit(X_codes.iloc[:1000], y.iloc[:1000])
+    streaming_encoder.partial_fit(X_codes.iloc[1000:], y.iloc[1000:])
+    mean_encoder = MeanEncoder().fit(X_strings, y)
+    expected = mean_encoder.encoder_dict_['x_y_direction']
+    actual = streaming_encoder.encoder_dict_['x_y_direction']
+    assert expected.keys() == actual.keys()
+    for category in expected:
+        assert actual[category] == pytest.approx(expected[category])
+    np.testing.assert_allclose(
+        streaming_encoder.transform(X_codes)['x_y_direction'].to_numpy(),
+        mean_encoder.transform(X_strings)['x_y_direction'].to_numpy()
+    )
@@ -0,0 +1,58 @@
+# Importing packages
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV
+from src.exception import CustomException
+from src.components.time_split import TimeSplit
+
+# Creating a dataset with four rows per time slot, shuffled out of time order
+@pytest.fixture
+def df():
+    times = np.repeat(pd.date_range('1991-04-01', periods=25, freq='20min'), 4)
+    df = pd.DataFrame({'time': times, 'feature': np.arange(100, dtype=np.float32), 'congestion': np.arange(100) % 7})
+    return df.sample(frac=1, random_state=42)
+
+# Verifying that the holdout holds the most recent rows and is the same in the
+# in-memory and streaming ingestion
+def test_holdout_split(df):
+    train_set, test_set = TimeSplit(test_size=0.3).holdout_split(df)
+    assert len(train_set) + len(test_set) == len(df)
+    assert train_set['time'].max() < test_set['time'].min()
+    assert train_set['time'].is_monotonic_increasing and test_set['time'].is_monotonic_increasing
+    assert (df['time'] >= TimeSplit(test_size=0.3).holdout_cutoff(df['time'].to_numpy())).sum() == len(test_set)
+    
+    # Verifying that the holdout of sorted rows is a view of them
+    sorted_df = train_set
+    train_view, _ = TimeSplit(test_size=0.3).holdout_split(sorted_df)
+    assert np.shares_memory(train_view['feature'].to_numpy(), sorted_df['feature'].to_numpy())
+
+# Verifying that the rolling-origin folds never validate on rows older than the training
+# rows, never split a time slot, and select views of the rows
+def test_fold_ranges(df):
+    df = TimeSplit().sort_by_time(df)
+    times = df['time'].to_numpy()
+    folds = TimeSplit(n_splits=3, times=times).fold_ranges(len(df))
+    assert len(folds) == 3
+    assert [fold[0].stop for fold in folds] == [fold[1].start for fold in folds]
+    assert [fold[1].stop for fold in folds][-1] == len(df)
+    for train_range, val_range in folds:
+        assert train_range.start == 0
+        assert times[train_range.stop - 1] < times[val_range.start]
+        view = TimeSplit.select(df, val_range)
+        assert np.shares_memory(view['feature'].to_numpy(), df['feature'].to_numpy())
+    
+    # Verifying that the scikit-learn searches get the same folds as arrays of indices
+    search = GridSearchCV(Ridge(), {'alpha': [0.1, 1.0]}, cv=TimeSplit(n_splits=3, times=times))
+    search.fit(df[['feature']], df['congestion'])
+    assert search.n_splits_ == 3
+    for (train_index, val_index), (train_range, val_range) in zip(TimeSplit(n_splits=3, times=times).split(df), folds):
+        assert list(train_index) == list(range(train_range.stop))
+        assert list(val_index) == list(range(val_range.start, val_range.stop))
+
+# Verifying that folds which cannot be moved to the boundaries between times are rejected
+def test_fold_ranges_too_few_times():
+    times = np.repeat(pd.date_range('1991-04-01', periods=2, freq='20min').to_numpy(), 10)
+    with pytest.raises(CustomException):
+        TimeSplit(n_splits=3, times=times).fold_ranges(len(times))
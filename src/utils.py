@@ -1,14 +1,17 @@
 # Importing packages
 import sys
-import os
-import json
-from datetime import datetime
 import numpy as np
 import pandas as pd
-import pathlib
 from src.exception import CustomException
 from sklearn.base import BaseEstimator, TransformerMixin
 from feature_engine.encoding import MeanEncoder
+from src.instrumentation import instrument
+# The run parameter helpers live in src.run_utils, which the serving path imports
+# without loading sklearn. They are imported here for the existing callers.
+from src.run_utils import save_run_params
+from src.run_utils import load_run_params
+from src.run_utils import read_json_file
+from src.run_utils import get_current_time
 
 
 # Creating a class to mean encode the categorical features
@@ -68,12 +71,165 @@ class MeanEncode(BaseEstimator, TransformerMixin):
             return self.mean_encoder.transform(X)
         else:
             return self.mean_encoder.transform(X)
+
+
+# Creating a class to mean encode categorical features from running sums and counts
+class StreamingMeanEncoder(BaseEstimator, TransformerMixin):
+    '''
+    This class mean encodes categorical features, in the same way as the MeanEncoder from
+    the feature_engine library, but it only keeps the sum and the count of the target for
+    each category. This allows the encoder to be fitted one chunk of data at a time with
+    the partial_fit method, so that the data never needs to fit in memory at once. Unseen
+    categories are encoded as NaN, which matches the default of the MeanEncoder. Categorical
+    columns are encoded from their integer codes, with np.bincount when fitting and a gather
+    when transforming, while the encoding stays keyed by the category labels.
+    '''
+    # Creating the constructor method for the class
+    def __init__(self, variables=None):
+        '''
+        This is the constructor method for the StreamingMeanEncoder class.
+        This method takes a list of columns to encode as inputs. If no list is provided,
+        all the object, string and categorical columns are encoded.
+        '''
+        self.variables = variables
     
+    # Creating the fit method for the class
+    def fit(self, X, y):
+        '''
+        This method resets the running sums and counts and fits the encoder on the data.
+        ========================================================================================
+        ---------------------
+        Parameters:
+        ---------------------
+        X : This is the feature dataset containing the categorical variables.
+        y : This is the target dataset.
+        
+        ---------------------
+        Returns:
+        ---------------------
+        The fitted encoder.
+        =========================================================================================
+        '''
+        for attr in ('sums_', 'counts_'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+        return self.partial_fit(X, y)
     
+    # Creating the partial_fit method for the class
+    def partial_fit(self, X, y):
+        '''
+        This method adds the sum and the count of the target for each category in the data
+        to the running totals, and updates the mean encoding.
+        ========================================================================================
+        ---------------------
+        Parameters:
+        ---------------------
+        X : This is the feature dataset containing the categorical variables.
+        y : This is the target dataset.
+        
+        ---------------------
+        Returns:
+        ---------------------
+        The fitted encoder.
+        =========================================================================================
+        '''
+        try:
+            if not hasattr(self, 'sums_'):
+                if self.variables is None:
+                    self.variables_ = list(X.select_dtypes(include=['object', 'string', 'category']).columns)
+                else:
+                    self.variables_ = list(self.variables)
+                self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+                self.n_features_in_ = len(self.feature_names_in_)
+                self.sums_ = {var: {} for var in self.variables_}
+                self.counts_ = {var: {} for var in self.variables_}
+            
+            y = pd.Series(np.asarray(y), index=X.index)
+            for var in self.variables_:
+                if isinstance(X[var].dtype, pd.CategoricalDtype):
+                    # Summing the target per category code, without hashing the rows
+                    codes = X[var].cat.codes.to_numpy()
+                    known = codes >= 0
+                    n_categories = len(X[var].cat.categories)
+                    totals = np.bincount(
+                        codes[known], weights=y.to_numpy(dtype=np.float64)[known], minlength=n_categories
+                    )
+                    category_counts = np.bincount(codes[known], minlength=n_categories)
+                    observed = np.flatnonzero(category_counts)
+                    stats = pd.DataFrame(
+                        {'sum': totals[observed], 'count': category_counts[observed]},
+                        index=X[var].cat.categories[observed]
+                    )
+                else:
+                    stats = y.groupby(X[var], observed=True).agg(['sum', 'count'])
+                sums = self.sums_[var]
+                counts = self.counts_[var]
+                for category, total, count in zip(stats.index, stats['sum'], stats['count']):
+                    sums[category] = sums.get(category, 0.0) + float(total)
+                    counts[category] = counts.get(category, 0) + int(count)
+            
+            self.encoder_dict_ = {
+                var: {
+                    category: self.sums_[var][category] / self.counts_[var][category]
+                    for category in self.sums_[var]
+                }
+                for var in self.variables_
+            }
+            self.unseen = 'ignore'
+            return self
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating the transform method for the class
+    def transform(self, X, y=None):
+        '''
+        This method replaces the categories with their mean encoding.
+        ========================================================================================
+        ---------------------
+        Parameters:
+        ---------------------
+        X : This is the feature dataset containing the categorical variables.
+        
+        ---------------------
+        Returns:
+        ---------------------
+        The dataset after being transformed.
+        =========================================================================================
+        '''
+        try:
+            X = X.copy()
+            for var in self.variables_:
+                if isinstance(X[var].dtype, pd.CategoricalDtype):
+                    # Gathering the mean encoding of each row from the category codes. The
+                    # missing values have the code -1, which gathers the trailing NaN.
+                    means = np.array(
+                        [self.encoder_dict_[var].get(category, np.nan) for category in X[var].cat.categories] + [np.nan],
+                        dtype=np.float64
+                    )
+                    X[var] = means[X[var].cat.codes.to_numpy()]
+                else:
+                    X[var] = X[var].map(self.encoder_dict_[var]).astype('float64')
+            return X
+        
+        except Exception as e:
+            raise CustomException(e, sys)
+    
+    # Creating a method to return the names of the output features
+    def get_feature_names_out(self, input_features=None):
+        '''
+        This method returns the names of the output features, which are the same as the
+        names of the input features.
+        '''
+        return np.asarray(self.feature_names_in_, dtype=object)
+
+
 # Creating a function to generate an hour feature
+@instrument()
 def create_hour_feature(df):
     '''
-    This function creates a new feature called 'hour' from the 'time' feature.
+    This function creates a new feature called 'hour' from the 'time' feature, as uint8,
+    and its sine and cosine, as float32.
     ==============================================================================================
     ---------------------
     Parameters:
@@ -87,9 +243,9 @@ def create_hour_feature(df):
     ===============================================================================================
     '''
     try:
-        df.loc[:, 'hour'] = df.loc[:, 'time'].dt.hour
-        df['hour_sin'] =  np.sin(2 * np.pi * df['hour'] / 24)
-        df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+        df['hour'] = df['time'].dt.hour.astype(np.uint8)
+        df['hour_sin'] = np.sin(2 * np.pi * df['hour'].to_numpy(dtype=np.float64) / 24).astype(np.float32)
+        df['hour_cos'] = np.cos(2 * np.pi * df['hour'].to_numpy(dtype=np.float64) / 24).astype(np.float32)
         return df
     
     except Exception as e:
@@ -97,10 +253,11 @@ def create_hour_feature(df):
 
 
 # Creating a function to generate an AM/PM feature
+@instrument()
 def create_am_pm_feature(df):
     '''
     This function creates a new feature called 'AM_PM' from the 'hour' feature. The "hour" feature
-    itself was created from the "time" feature.
+    itself was created from the "time" feature. The feature is a categorical of "AM" and "PM".
     ==============================================================================================
     ---------------------
     Parameters:
@@ -118,7 +275,7 @@ def create_am_pm_feature(df):
             (df['hour'] >= 12) & (df['hour'] <= 23)
         ]
         selection = ['PM']
-        df.loc[:, 'am_pm'] = np.select(condition, selection, default='AM')
+        df['am_pm'] = pd.Categorical(np.select(condition, selection, default='AM'), categories=['AM', 'PM'])
         return df
     
     except Exception as e:
@@ -126,6 +283,7 @@ def create_am_pm_feature(df):
 
 
 # Creating a function to generate an "is_weekend" feature
+@instrument()
 def create_is_weekend_feature(df):
     '''
     This function creates a new feature called 'is_weekend' from the 'time' feature.
@@ -150,15 +308,18 @@ def create_is_weekend_feature(df):
 
 
 # Creating a function to create the direction feature
-def create_direction_feature(df):
+@instrument()
+def create_direction_feature(df, segment_dictionary=None):
     '''
     This function creates a new feature called 'direction'. The feature is created from the 'x', 
-    'y' and 'direction' features. 
+    'y' and 'direction' features. When a segment dictionary is provided, the feature is a
+    categorical of the integer codes of the segments, and unknown segments are missing values.
     ==============================================================================================
     ---------------------
     Parameters:
     ---------------------
     df : pd.DataFrame - This is the original dataset.
+    segment_dictionary : SegmentDictionary - The dictionary used to encode the segments.
     
     ---------------------
     Returns:
@@ -167,7 +328,10 @@ def create_direction_feature(df):
     ===============================================================================================
     '''
     try:
-        df.loc[:, 'x_y_direction'] = df['x'].astype(str) + '_' + df['y'].astype(str) + '_' + df['direction']
+        if segment_dictionary is not None:
+            df['x_y_direction'] = segment_dictionary.encode(df['x'], df['y'], df['direction'])
+        else:
+            df.loc[:, 'x_y_direction'] = df['x'].astype(str) + '_' + df['y'].astype(str) + '_' + df['direction'].astype(str)
         return df
     
     except Exception as e:
@@ -197,94 +361,3 @@ def drop_non_essential_features(df):
     
     except Exception as e:
         raise CustomException(e, sys)
-
-# Creating a function to save the run parameters as a json file
-def save_run_params(run_params):
-    '''
-    This function saves the run parameters as a json file in the run_config folder. 
-    ========================================================================================
-    ---------------------
-    Parameters:
-    ---------------------
-    run_params : dict - This is the dictionary containing the run parameters.
-    
-    ---------------------
-    Returns:
-    ---------------------
-    Saves the run parameters as a json file into the run_config folder.
-    ========================================================================================
-    '''
-    now = datetime.now().strftime('%Y%m%d')
-    file_path = pathlib.Path().cwd() / 'run_config' / f'run_params_{now}.json'
-    with open(file_path, 'w') as file_obj:
-        json.dump(run_params, file_obj)
-        
-
-# Creating a function to load the run parameters json file.
-def load_run_params(directory='run_config'):
-    '''
-    This function loads the run parameters as a json file, which is present
-    in the run_config folder. 
-    ========================================================================================
-    ---------------------
-    Parameters:
-    ---------------------
-    directory : str - This is the name of the directory in which the run parameters json
-    file is stored.
-    
-    ---------------------
-    Returns:
-    ---------------------
-    run_parameters : json - This is the run parameters json file.
-    ========================================================================================
-    '''
-    dir_path = pathlib.Path().cwd() / directory
-    json_files = os.listdir(dir_path)
-    latest_file = None
-    latest_date = None
-    for file_name in json_files:
-        date_str = file_name.split('_')[2].split('.')[0]
-        file_date = datetime.strptime(date_str, '%Y%m%d')
-        if not latest_date or file_date > latest_date:
-            latest_date = file_date
-            latest_file = dir_path / file_name
-    return latest_file
-
-
-# Creating a function to read the JSON file
-def read_json_file(file_path):
-    '''
-    This function reads the run parameters JSON file and returns the contents of the file.
-    ========================================================================================
-    ---------------------
-    Parameters:
-    ---------------------
-    file_path : str - This is the path to the run parameters json file.
-    
-    ---------------------
-    Returns:
-    ---------------------
-    run_parameters : json - This is the run pararmeters json file.
-    =========================================================================================
-    '''
-    with open(file_path, 'r') as file_obj:
-        data = json.load(file_obj)
-    return data
-
-# Creating a function to capture the current time
-def get_current_time():
-    '''
-    This function captures the time when the user enters data on the website and returns 
-    it in the format of YYYY-MM-DD HH:MM:SS. The function also converts the time string 
-    into a datetime object.
-    ========================================================================================
-    ---------------------
-    Returns:
-    ---------------------
-    current_time : datetime - This is the time at which the user entered data on the
-    website.
-    ========================================================================================
-    '''
-    current_time = str(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    current_time_conv = datetime.strptime(current_time, '%Y-%m-%d %H:%M:%S')
-    return current_time_conv
\ No newline at end of file